@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+"""Нагрузка на базу бота
+
+Имитирует пользователей, которые одновременно листают вакансии: на каждое
+нажатие открывается сессия, читаются пользователь, фильтры и токены, после
+чего сохраняется курсор. Сравнивает прежний способ (отдельные запросы,
+настройки SQLite по умолчанию) с get_user_bundle и WAL. База создается во
+временном каталоге и заранее заполняется пользователями, чтобы было видно,
+растет ли задержка вместе с таблицей.
+
+    python benchmarks/bot_db.py
+    python benchmarks/bot_db.py --rows 100000 --users 200 --clicks 20
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import random
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Awaitable, Callable
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from sqlalchemy import insert, select  # noqa: E402
+from sqlalchemy.ext.asyncio import (  # noqa: E402
+    AsyncSession,
+    async_sessionmaker,
+    create_async_engine,
+)
+
+from hh_applicant_tool.bot.db import (  # noqa: E402
+    Base,
+    HHTokens,
+    User,
+    UserPreference,
+    create_database,
+    get_or_create_user,
+    get_user_bundle,
+)
+
+Click = Callable[[AsyncSession, int], Awaitable[None]]
+
+
+async def legacy_click(session: AsyncSession, telegram_user_id: int) -> None:
+    # Как обработчики работали раньше
+    user = await get_or_create_user(session, telegram_user_id)
+    pref = (
+        await session.execute(
+            select(UserPreference).where(UserPreference.user_id == user.id)
+        )
+    ).scalar_one()
+    (
+        await session.execute(select(HHTokens).where(HHTokens.user_id == user.id))
+    ).scalar_one_or_none()
+    pref.browse_page += 1
+    await session.commit()
+
+
+async def bundle_click(session: AsyncSession, telegram_user_id: int) -> None:
+    user = await get_user_bundle(session, telegram_user_id)
+    user.preferences.browse_page += 1
+    await session.commit()
+
+
+async def populate(
+    session_factory: async_sessionmaker[AsyncSession], rows: int
+) -> None:
+    async with session_factory() as session:
+        for start in range(0, rows, 10000):
+            ids = range(start + 1, min(start + 10000, rows) + 1)
+            await session.execute(
+                insert(User), [{"id": i, "telegram_user_id": i} for i in ids]
+            )
+            await session.execute(
+                insert(UserPreference), [{"user_id": i} for i in ids]
+            )
+            await session.execute(
+                insert(HHTokens),
+                [{"user_id": i, "access_token": f"token{i}"} for i in ids],
+            )
+        await session.commit()
+
+
+async def simulate(
+    session_factory: async_sessionmaker[AsyncSession],
+    click: Click,
+    telegram_user_ids: list[int],
+    clicks: int,
+) -> tuple[float, list[float]]:
+    latencies: list[float] = []
+
+    async def user(telegram_user_id: int) -> None:
+        for _ in range(clicks):
+            started_at = time.perf_counter()
+            async with session_factory() as session:
+                await click(session, telegram_user_id)
+            latencies.append(time.perf_counter() - started_at)
+
+    started_at = time.perf_counter()
+    await asyncio.gather(*(user(i) for i in telegram_user_ids))
+    return time.perf_counter() - started_at, latencies
+
+
+def report(name: str, elapsed: float, latencies: list[float]) -> None:
+    latencies.sort()
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(
+        f"{name:<24} {len(latencies) / elapsed:8.0f} нажатий/с"
+        f"  p50 {statistics.median(latencies) * 1000:7.2f} ms"
+        f"  p95 {p95 * 1000:7.2f} ms"
+    )
+
+
+async def run(args: argparse.Namespace) -> None:
+    rng = random.Random(args.seed)
+    telegram_user_ids = rng.sample(range(1, args.rows + 1), args.users)
+    with tempfile.TemporaryDirectory() as tmp:
+        # Прежние настройки: только create_all
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp}/legacy.db")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        legacy = async_sessionmaker(engine, expire_on_commit=False)
+        db = await create_database(f"sqlite+aiosqlite:///{tmp}/tuned.db")
+        for session_factory in (legacy, db.session_factory):
+            await populate(session_factory, args.rows)
+        print(
+            f"пользователей в базе: {args.rows}, одновременно: {args.users},"
+            f" нажатий каждым: {args.clicks}"
+        )
+        for name, session_factory, click in (
+            ("legacy queries", legacy, legacy_click),
+            ("bundle + WAL", db.session_factory, bundle_click),
+        ):
+            report(
+                name,
+                *await simulate(
+                    session_factory, click, telegram_user_ids, args.clicks
+                ),
+            )
+        await engine.dispose()
+        await db.engine.dispose()
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--rows", type=int, default=20000, help="Пользователей в базе"
+    )
+    parser.add_argument(
+        "--users", type=int, default=50, help="Одновременно нажимающих"
+    )
+    parser.add_argument(
+        "--clicks", type=int, default=20, help="Нажатий каждого пользователя"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if args.users > args.rows:
+        parser.error("--users больше --rows")
+    asyncio.run(run(args))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+"""Время импорта при холодном старте CLI
+
+Запускает утилиту в отдельном процессе с `python -X importtime` и выводит
+модули, которые импортируются дольше всего. С --max-ms завершается с ошибкой,
+если общее время импорта превышает порог, что удобно для проверки в CI.
+
+    python benchmarks/importtime.py refresh-token --help
+    python benchmarks/importtime.py --max-ms 300 -- whoami --help
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+LINE_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+# importlib.import_module не попадает в вывод -X importtime, поэтому
+# загруженные модули операций выводим сами
+RUNNER = """
+import sys
+from hh_applicant_tool.main import main
+try:
+    main(sys.argv[1:])
+except SystemExit:
+    pass
+finally:
+    for name in sys.modules:
+        if ".operations." in name:
+            print("operation:", name, file=sys.stderr)
+"""
+
+
+def measure(
+    argv: list[str],
+) -> tuple[list[tuple[int, int, int, str]], list[str], float]:
+    started_at = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", RUNNER, *argv],
+        cwd=ROOT,
+        env={**os.environ, "PYTHONDONTWRITEBYTECODE": "1"},
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    elapsed = time.perf_counter() - started_at
+    entries, operations = [], []
+    for line in proc.stderr.splitlines():
+        if m := LINE_RE.match(line):
+            self_us, cumulative_us, indent, name = m.groups()
+            entries.append((int(self_us), int(cumulative_us), len(indent) // 2, name))
+        elif line.startswith("operation: "):
+            operations.append(line.split(" ", 1)[1])
+    return entries, operations, elapsed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--top", type=int, default=15, help="Сколько модулей вывести")
+    parser.add_argument("--max-ms", type=float, help="Допустимое общее время, мс")
+    parser.add_argument(
+        "--runs", type=int, default=3, help="Количество запусков, берется лучший"
+    )
+    parser.add_argument(
+        "argv", nargs="*", default=["refresh-token", "--help"], help="Аргументы CLI"
+    )
+    args = parser.parse_args()
+
+    best = None
+    for _ in range(max(1, args.runs)):
+        entries, operations, elapsed = measure(args.argv)
+        # Верхний уровень дерева импортов — сумма по всем модулям
+        total = sum(c for _, c, depth, _ in entries if depth == 0)
+        if best is None or total < best[0]:
+            best = (total, entries, operations, elapsed)
+    total, entries, operations, elapsed = best
+
+    print(f"{'self, ms':>10} {'cumulative, ms':>15}  module")
+    for self_us, cumulative_us, depth, name in sorted(
+        entries, key=lambda x: x[1], reverse=True
+    )[: args.top]:
+        print(f"{self_us / 1000:10.1f} {cumulative_us / 1000:15.1f}  {name}")
+    print(f"\nИмпортировано операций: {len(operations)} {sorted(operations)}")
+    print(f"Всего: {total / 1000:.1f} мс, запуск процесса: {elapsed * 1000:.1f} мс")
+
+    if args.max_ms is not None and total / 1000 > args.max_ms:
+        print(f"Превышен порог {args.max_ms} мс", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,120 @@
+#!/usr/bin/env python
+"""Скорость фильтрации вакансий
+
+Сравнивает прежнюю проверку исключающих слов (как в боте: список слов и
+lower() на каждую вакансию) с VacancyMatcher по одной вакансии и страницами.
+Вакансии генерируются случайно, результаты всех способов должны совпадать.
+
+    python benchmarks/vacancy_filters.py
+    python benchmarks/vacancy_filters.py -n 5000 --terms "ux ui стажер 1с junior"
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Callable
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from hh_applicant_tool.vacancy_filters import FilterSpec  # noqa: E402
+
+WORDS = (
+    "дизайнер графический веб интерфейсов разработчик python backend middle "
+    "senior опыт работы figma photoshop иллюстратор маркетплейс баннеры "
+    "бухгалтер аналитик продукт команда офис удаленно задачи проекты "
+    "клиенты макеты брендбук презентации соцсети типографика верстка"
+).split()
+# Слова, которые обычно исключают, встречаются в части вакансий
+RARE_WORDS = "ux ui стажер 1с junior".split()
+
+
+def make_vacancy(rng: random.Random, i: int) -> dict:
+    def text(n: int) -> str:
+        words = [rng.choice(WORDS) for _ in range(n)]
+        if rng.random() < 0.1:
+            words[rng.randrange(n)] = rng.choice(RARE_WORDS)
+        return " ".join(words).capitalize()
+
+    return {
+        "id": str(i),
+        "name": text(3),
+        "snippet": {"requirement": text(25), "responsibility": text(25)},
+        "salary": {"from": rng.randrange(30, 300) * 1000, "currency": "RUR"},
+        "area": {"id": rng.choice(["1", "2", "113"])},
+        "schedule": {"id": rng.choice(["remote", "flexible", "fullDay"])},
+        "has_test": rng.random() < 0.05,
+        "archived": False,
+        "relations": [],
+    }
+
+
+def naive_match(vacancies: list[dict], exclude_text: str) -> list[bool]:
+    rv = []
+    for v in vacancies:
+        exclude_terms = [t.strip().lower() for t in exclude_text.split() if t.strip()]
+        text_blobs = []
+        snippet = v.get("snippet") or {}
+        for k in ("responsibility", "requirement"):
+            if val := snippet.get(k):
+                text_blobs.append(val.lower())
+        text_blobs.append((v.get("name") or "").lower())
+        rv.append(not any(term in "\n".join(text_blobs) for term in exclude_terms))
+    return rv
+
+
+def bench(name: str, func: Callable[[], list[bool]], runs: int) -> list[bool]:
+    best = float("inf")
+    for _ in range(runs):
+        started_at = time.perf_counter()
+        rv = func()
+        best = min(best, time.perf_counter() - started_at)
+    print(f"{name:<32} {best * 1000:8.2f} ms  принято: {sum(rv)}")
+    return rv
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", type=int, default=3000, help="Количество вакансий")
+    parser.add_argument("--terms", default="ux ui стажер 1с", help="Исключающие слова")
+    parser.add_argument("--runs", type=int, default=5, help="Повторов, берется лучший")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vacancies = [make_vacancy(rng, i) for i in range(args.n)]
+    pages = [vacancies[i : i + 100] for i in range(0, len(vacancies), 100)]
+    matcher = FilterSpec(exclude_terms=FilterSpec.split_terms(args.terms)).compile()
+
+    expected = bench("naive (per vacancy)", lambda: naive_match(vacancies, args.terms), args.runs)
+    results = [
+        bench("matcher.match (per vacancy)", lambda: [matcher.match(v) for v in vacancies], args.runs),
+        bench(
+            "matcher.match_many (pages of 100)",
+            lambda: [ok for page in pages for ok in matcher.match_many(page)],
+            args.runs,
+        ),
+    ]
+    full = FilterSpec(
+        exclude_terms=FilterSpec.split_terms(args.terms),
+        salary_from=100000,
+        areas=frozenset({"1", "2"}),
+        schedules=frozenset({"remote", "flexible"}),
+        skip_has_test=True,
+    ).compile()
+    bench(
+        "all rules, match_many",
+        lambda: [ok for page in pages for ok in full.match_many(page)],
+        args.runs,
+    )
+    if any(rv != expected for rv in results):
+        print("❗ Результаты отличаются", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,267 @@
+"""Асинхронный клиент API на aiohttp
+
+Запросы ограничиваются тем же RateLimiter, что и у синхронного клиента, поэтому
+из одного event loop можно обслуживать сколько угодно запросов параллельно.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import dataclasses
+import json
+import logging
+import time
+from dataclasses import dataclass
+from functools import cached_property
+from typing import Any
+from urllib.parse import urlencode
+
+import aiohttp
+
+from ..constants import ANDROID_CLIENT_ID, ANDROID_CLIENT_SECRET
+from ..types import AccessToken
+from . import errors
+from .client import (
+    ALLOWED_METHODS,
+    ApiClient,
+    BaseClient,
+    OAuthClient,
+    raise_for_status,
+)
+from .rate_limit import RateLimiter
+from .throttle import AdaptiveThrottle
+
+__all__ = (
+    "AsyncApiClient",
+    "AsyncOAuthClient",
+    "close_shared_session",
+    "get_shared_session",
+)
+
+logger = logging.getLogger(__package__)
+
+# Одна сессия (и пул соединений) на процесс
+_shared_session: aiohttp.ClientSession | None = None
+
+
+def get_shared_session() -> aiohttp.ClientSession:
+    # Сессия должна создаваться внутри запущенного event loop
+    global _shared_session
+    if _shared_session is None or _shared_session.closed:
+        _shared_session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=100, ttl_dns_cache=300),
+        )
+    return _shared_session
+
+
+async def close_shared_session() -> None:
+    global _shared_session
+    if _shared_session is not None and not _shared_session.closed:
+        await _shared_session.close()
+    _shared_session = None
+
+
+def encode_params(params: dict[str, Any]) -> list[tuple[str, str]]:
+    # aiohttp, в отличие от requests, не умеет в списки и bool
+    rv = []
+    for key, value in params.items():
+        for item in value if isinstance(value, (list, tuple)) else [value]:
+            if item is None:
+                continue
+            if isinstance(item, bool):
+                item = str(item).lower()
+            rv.append((key, str(item)))
+    return rv
+
+
+@dataclass
+class AsyncBaseClient:
+    base_url: str
+    _: dataclasses.KW_ONLY
+    user_agent: str | None = None
+    # aiohttp поддерживает только один http-прокси на запрос
+    proxy: str | None = None
+    session: aiohttp.ClientSession | None = None
+    delay: float = 0.334
+    rate_limiter: RateLimiter | None = None
+    throttle: AdaptiveThrottle | None = None
+
+    def __post_init__(self) -> None:
+        if not self.rate_limiter:
+            self.rate_limiter = RateLimiter.from_delay(self.delay)
+        self.default_headers = {
+            "user-agent": self.user_agent or self.default_user_agent(),
+            "x-hh-app-active": "true",
+        }
+
+    default_user_agent = BaseClient.default_user_agent
+    resolve_url = BaseClient.resolve_url
+
+    def additional_headers(
+        self,
+    ) -> dict[str, str]:
+        return {}
+
+    async def request(
+        self,
+        method: ALLOWED_METHODS,
+        endpoint: str,
+        params: dict[str, Any] | None = None,
+        delay: float | None = None,
+        **kwargs: Any,
+    ) -> dict:
+        assert method in ALLOWED_METHODS.__args__
+        params = dict(params or {})
+        params.update(kwargs)
+        url = self.resolve_url(endpoint)
+        if delay:
+            await asyncio.sleep(delay)
+        # На серваке какая-то анти-DDOS система
+        if wait := await self.rate_limiter.acquire_async(method, url):
+            logger.debug("wait %fs before request", wait)
+        has_body = method in ["POST", "PUT"]
+        payload = {"data" if has_body else "params": encode_params(params)}
+        session = self.session or get_shared_session()
+        async with session.request(
+            method,
+            url,
+            **payload,
+            headers={**self.default_headers, **self.additional_headers()},
+            proxy=self.proxy,
+            allow_redirects=False,
+        ) as response:
+            try:
+                # Пустые ответы без Content-Length, см. BaseClient.request
+                try:
+                    rv = await response.json(content_type=None) or {}
+                except json.decoder.JSONDecodeError:
+                    rv = {}
+            finally:
+                logger.debug(
+                    "%d %-6s %s",
+                    response.status,
+                    method,
+                    url + ("?" + urlencode(params) if not has_body and params else ""),
+                )
+        if self.throttle:
+            self.throttle.feedback(response.status, rv, response.headers)
+        raise_for_status(response.status, response, rv)
+        assert 300 > response.status >= 200
+        return rv
+
+    async def get(self, *args, **kwargs):
+        return await self.request("GET", *args, **kwargs)
+
+    async def post(self, *args, **kwargs):
+        return await self.request("POST", *args, **kwargs)
+
+    async def put(self, *args, **kwargs):
+        return await self.request("PUT", *args, **kwargs)
+
+    async def delete(self, *args, **kwargs):
+        return await self.request("DELETE", *args, **kwargs)
+
+
+@dataclass
+class AsyncOAuthClient(AsyncBaseClient):
+    client_id: str
+    client_secret: str
+    _: dataclasses.KW_ONLY
+    base_url: str = "https://hh.ru/oauth"
+    state: str = ""
+    scope: str = ""
+    redirect_uri: str = ""
+
+    authorize_url = OAuthClient.authorize_url
+
+    async def request_access_token(
+        self, endpoint: str, params: dict[str, Any] | None = None, **kw: Any
+    ) -> AccessToken:
+        tok = await self.post(endpoint, params, **kw)
+        return {
+            "access_token": tok.get("access_token"),
+            "refresh_token": tok.get("refresh_token"),
+            "access_expires_at": int(time.time()) + tok.pop("expires_in", 0),
+        }
+
+    async def authenticate(self, code: str) -> AccessToken:
+        params = {
+            "client_id": self.client_id,
+            "client_secret": self.client_secret,
+            "code": code,
+            "grant_type": "authorization_code",
+        }
+        if self.redirect_uri:
+            params["redirect_uri"] = self.redirect_uri
+        return await self.request_access_token("/token", params)
+
+    async def refresh_access_token(self, refresh_token: str) -> AccessToken:
+        return await self.request_access_token(
+            "/token", grant_type="refresh_token", refresh_token=refresh_token
+        )
+
+
+@dataclass
+class AsyncApiClient(AsyncBaseClient):
+    access_token: str | None = None
+    refresh_token: str | None = None
+    access_expires_at: int = 0
+    client_id: str = ANDROID_CLIENT_ID
+    client_secret: str = ANDROID_CLIENT_SECRET
+    _: dataclasses.KW_ONLY
+    base_url: str = "https://api.hh.ru/"
+
+    is_access_expired = ApiClient.is_access_expired
+    handle_access_token = ApiClient.handle_access_token
+    get_access_token = ApiClient.get_access_token
+
+    @cached_property
+    def oauth_client(self) -> AsyncOAuthClient:
+        return AsyncOAuthClient(
+            client_id=self.client_id,
+            client_secret=self.client_secret,
+            user_agent=self.default_headers["user-agent"],
+            proxy=self.proxy,
+            session=self.session,
+            rate_limiter=self.rate_limiter,
+            throttle=self.throttle,
+        )
+
+    def additional_headers(
+        self,
+    ) -> dict[str, str]:
+        # Заголовок считается на каждый запрос, так как токен может обновиться
+        return (
+            {"authorization": f"Bearer {self.access_token}"}
+            if self.access_token
+            else {}
+        )
+
+    # Реализовано автоматическое обновление токена
+    async def request(
+        self,
+        method: ALLOWED_METHODS,
+        endpoint: str,
+        params: dict[str, Any] | None = None,
+        delay: float | None = None,
+        **kwargs: Any,
+    ) -> dict:
+        def do_request():
+            return AsyncBaseClient.request(
+                self, method, endpoint, params, delay, **kwargs
+            )
+
+        try:
+            return await do_request()
+        except errors.Forbidden as ex:
+            if not self.is_access_expired or not self.refresh_token:
+                raise ex
+            logger.info("try refresh access_token")
+            await self.refresh_access_token()
+            return await do_request()
+
+    async def refresh_access_token(self) -> None:
+        if not self.refresh_token:
+            raise ValueError("Refresh token required.")
+        token = await self.oauth_client.refresh_access_token(self.refresh_token)
+        self.handle_access_token(token)
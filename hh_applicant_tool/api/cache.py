@@ -0,0 +1,225 @@
+"""Дисковый кеш ответов API
+
+Кешируются только GET-запросы к эндпоинтам из правил. Пока запись свежая,
+запрос к серверу не отправляется вовсе, а по истечении TTL отправляется условный
+запрос с If-None-Match/If-Modified-Since. Хранилище — SQLite-файл рядом с
+config.json, размер ограничен, вытесняются давно не использованные записи.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import re
+import sqlite3
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from threading import Lock
+from typing import Any, Mapping
+from urllib.parse import urlencode, urlsplit
+
+__all__ = ("DEFAULT_CACHE_RULES", "CacheRule", "CachedResponse", "ResponseCache")
+
+logger = logging.getLogger(__package__)
+
+
+@dataclass(frozen=True)
+class CacheRule:
+    # Регулярка для пути запроса
+    pattern: str
+    # Время жизни записи в секундах
+    ttl: float
+
+
+DEFAULT_CACHE_RULES: tuple[CacheRule, ...] = (
+    CacheRule(r"^/me/?$", 3600),
+    CacheRule(r"^/resumes/mine/?$", 3600),
+    CacheRule(r"^/employers/blacklisted/?$", 3600),
+)
+
+
+@dataclass
+class CachedResponse:
+    key: str
+    data: dict
+    etag: str | None
+    last_modified: str | None
+    expires_at: float
+
+    @property
+    def is_fresh(self) -> bool:
+        return time.time() < self.expires_at
+
+    def conditional_headers(self) -> dict[str, str]:
+        headers = {}
+        if self.etag:
+            headers["if-none-match"] = self.etag
+        if self.last_modified:
+            headers["if-modified-since"] = self.last_modified
+        return headers
+
+
+def get_path(url: str) -> str:
+    return "/" + urlsplit(url).path.lstrip("/")
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        db_path: str | Path,
+        *,
+        # Позволяет нескольким аккаунтам использовать один файл
+        namespace: str = "",
+        rules: tuple[CacheRule, ...] = DEFAULT_CACHE_RULES,
+        max_size: int = 32 * 1024 * 1024,
+    ) -> None:
+        self.db_path = Path(db_path)
+        self.namespace = namespace
+        self.rules = [(re.compile(rule.pattern), rule.ttl) for rule in rules]
+        self.max_size = max_size
+        self.lock = Lock()
+        self.db_path.parent.mkdir(exist_ok=True, parents=True)
+        self.conn = sqlite3.connect(
+            self.db_path, check_same_thread=False, timeout=30
+        )
+        # Файл может одновременно использовать несколько процессов (cron)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        columns = [
+            row[1] for row in self.conn.execute("PRAGMA table_info(responses)")
+        ]
+        if columns and "namespace" not in columns:
+            # Кеш старого формата проще выбросить, чем переносить
+            self.conn.execute("DROP TABLE responses")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                namespace TEXT NOT NULL,
+                path TEXT NOT NULL,
+                body TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                expires_at REAL NOT NULL,
+                accessed_at REAL NOT NULL,
+                size INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at);
+            CREATE INDEX IF NOT EXISTS responses_path ON responses (namespace, path);
+            """
+        )
+
+    def get_ttl(self, url: str) -> float | None:
+        path = get_path(url)
+        for pattern, ttl in self.rules:
+            if pattern.search(path):
+                return ttl
+        return None
+
+    def make_key(
+        self,
+        url: str,
+        params: Mapping[str, Any],
+        # Токен аккаунта: после входа в другой аккаунт его ответы не пересекаются
+        # с закешированными для прежнего
+        identity: str = "",
+    ) -> str:
+        query = urlencode(sorted(params.items()), doseq=True)
+        return hashlib.sha256(
+            f"{self.namespace}\n{identity}\n{url}?{query}".encode()
+        ).hexdigest()
+
+    def get(self, key: str) -> CachedResponse | None:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT body, etag, last_modified, expires_at FROM responses WHERE key = ?",
+                (key,),
+            ).fetchone()
+            if not row:
+                return None
+            self.conn.execute(
+                "UPDATE responses SET accessed_at = ? WHERE key = ?",
+                (time.time(), key),
+            )
+            self.conn.commit()
+        body, etag, last_modified, expires_at = row
+        return CachedResponse(key, json.loads(body), etag, last_modified, expires_at)
+
+    def set(
+        self,
+        key: str,
+        url: str,
+        data: dict,
+        headers: Mapping[str, str],
+        ttl: float,
+    ) -> None:
+        body = json.dumps(data, ensure_ascii=False)
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    key,
+                    self.namespace,
+                    get_path(url),
+                    body,
+                    headers.get("etag"),
+                    headers.get("last-modified"),
+                    now + ttl,
+                    now,
+                    len(body),
+                ),
+            )
+            self.evict()
+            self.conn.commit()
+
+    def touch(self, key: str, ttl: float) -> None:
+        """Продлевает запись после ответа 304 Not Modified."""
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "UPDATE responses SET expires_at = ?, accessed_at = ? WHERE key = ?",
+                (now + ttl, now, key),
+            )
+            self.conn.commit()
+
+    def evict(self) -> None:
+        # Удаляем самые старые по времени доступа записи, не влезающие в max_size
+        cur = self.conn.execute(
+            """
+            DELETE FROM responses WHERE key IN (
+                SELECT key FROM (
+                    SELECT key, SUM(size) OVER (ORDER BY accessed_at DESC) AS total
+                    FROM responses
+                ) WHERE total > ?
+            )
+            """,
+            (self.max_size,),
+        )
+        if cur.rowcount > 0:
+            logger.debug("evicted %d cached responses", cur.rowcount)
+
+    def invalidate(self, url: str) -> None:
+        """Сбрасывает кеш для ресурса после изменяющего запроса.
+
+        Изменение может затронуть любое представление того же ресурса, например,
+        POST /resumes/123/publish меняет /resumes/mine, поэтому сбрасывается
+        все, что закешировано под тем же префиксом (/resumes).
+        """
+        prefix = "/" + get_path(url).strip("/").split("/")[0]
+        with self.lock:
+            self.conn.execute(
+                "DELETE FROM responses WHERE namespace = ?"
+                " AND (path = ? OR substr(path, 1, ?) = ?)",
+                (self.namespace, prefix, len(prefix) + 1, prefix + "/"),
+            )
+            self.conn.commit()
+
+    def clear(self) -> None:
+        with self.lock:
+            self.conn.execute(
+                "DELETE FROM responses WHERE namespace = ?", (self.namespace,)
+            )
+            self.conn.commit()
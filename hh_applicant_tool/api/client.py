@@ -7,7 +7,6 @@ import uuid
 import time
 from dataclasses import dataclass
 from functools import partialmethod
-from threading import Lock
 from typing import Any, Literal
 from urllib.parse import urlencode
 from functools import cached_property
@@ -21,6 +20,10 @@ from ..constants import (
 )
 from ..types import AccessToken
 from . import errors
+from .cache import ResponseCache
+from .rate_limit import RateLimiter
+from .retry import RetryPolicy, is_apply_request
+from .throttle import AdaptiveThrottle
 
 __all__ = ("ApiClient", "OAuthClient")
 
@@ -39,11 +42,18 @@ class BaseClient:
     user_agent: str | None = None
     proxies: dict | None = None
     session: Session | None = None
-    previous_request_time: float = 0.0
+    # Используется, если rate_limiter не передан
     delay: float = 0.334
+    # Может быть общим для нескольких клиентов
+    rate_limiter: RateLimiter | None = None
+    # Подстраивает частоту запросов rate_limiter'а под ответы сервера
+    throttle: AdaptiveThrottle | None = None
+    retry_policy: RetryPolicy | None = None
+    cache: ResponseCache | None = None
 
     def __post_init__(self) -> None:
-        self.lock = Lock()
+        if not self.rate_limiter:
+            self.rate_limiter = RateLimiter.from_delay(self.delay)
         if not self.session:
             self.session = session = requests.session()
             session.headers.update(
@@ -83,45 +93,101 @@ class BaseClient:
         params = dict(params or {})
         params.update(kwargs)
         url = self.resolve_url(endpoint)
-        with self.lock:
-            # На серваке какая-то анти-DDOS система
-            if (
-                delay := (self.delay if delay is None else delay)
-                - time.monotonic()
-                + self.previous_request_time
-            ) > 0:
-                logger.debug("wait %fs before request", delay)
-                time.sleep(delay)
-            has_body = method in ["POST", "PUT"]
-            payload = {"data" if has_body else "params": params}
-            response = self.session.request(
-                method,
-                url,
-                **payload,
-                proxies=self.proxies,
-                allow_redirects=False,
-            )
+        attempt = 0
+        while True:
             try:
-                # У этих лошков сервер не отдает Content-Length, а кривое API отдает пустые ответы, например, при отклике на вакансии, и мы не можем узнать содержит ли ответ тело
-                # 'Server': 'ddos-guard'
-                # ...
-                # 'Transfer-Encoding': 'chunked'
-                try:
-                    rv = response.json()
-                except json.decoder.JSONDecodeError:
-                    # if response.status_code not in [201, 204]:
-                    #     raise
-                    rv = {}
-            finally:
-                logger.debug(
-                    "%d %-6s %s",
-                    response.status_code,
-                    method,
-                    url + ("?" + urlencode(params) if not has_body and params else ""),
+                return self.send_request(method, url, params, delay)
+            except (errors.ApiError, requests.RequestException) as ex:
+                if not (
+                    self.retry_policy
+                    and self.retry_policy.should_retry(method, url, ex, attempt)
+                ):
+                    raise
+                wait = self.retry_policy.get_delay(attempt, ex)
+                logger.warning(
+                    "Ошибка %s %s: %s. Повтор через %.1fс", method, url, ex, wait
                 )
-                self.previous_request_time = time.monotonic()
+                time.sleep(wait)
+                attempt += 1
+                if (rv := self.before_retry(method, url, params)) is not None:
+                    return rv
+
+    def before_retry(
+        self, method: ALLOWED_METHODS, url: str, params: dict[str, Any]
+    ) -> dict | None:
+        """Если вернет не None, то запрос не повторяется, а результат считается ответом."""
+        return None
+
+    def cache_identity(self) -> str:
+        """Ответы, закешированные для одного аккаунта, не отдаются другому."""
+        return ""
+
+    def send_request(
+        self,
+        method: ALLOWED_METHODS,
+        url: str,
+        params: dict[str, Any],
+        delay: float | None = None,
+    ) -> dict:
+        cache_key = cached = None
+        headers = {}
+        if (
+            self.cache
+            and method == "GET"
+            and (ttl := self.cache.get_ttl(url)) is not None
+        ):
+            cache_key = self.cache.make_key(url, params, self.cache_identity())
+            if cached := self.cache.get(cache_key):
+                # Свежий кеш не расходует лимит запросов
+                if cached.is_fresh:
+                    logger.debug("cache hit: %s", url)
+                    return cached.data
+                headers = cached.conditional_headers()
+        # Дополнительная задержка перед конкретным запросом
+        if delay:
+            time.sleep(delay)
+        # На серваке какая-то анти-DDOS система
+        if wait := self.rate_limiter.acquire(method, url):
+            logger.debug("wait %fs before request", wait)
+        has_body = method in ["POST", "PUT"]
+        payload = {"data" if has_body else "params": params}
+        response = self.session.request(
+            method,
+            url,
+            **payload,
+            headers=headers,
+            proxies=self.proxies,
+            allow_redirects=False,
+        )
+        try:
+            # У этих лошков сервер не отдает Content-Length, а кривое API отдает пустые ответы, например, при отклике на вакансии, и мы не можем узнать содержит ли ответ тело
+            # 'Server': 'ddos-guard'
+            # ...
+            # 'Transfer-Encoding': 'chunked'
+            try:
+                rv = response.json()
+            except json.decoder.JSONDecodeError:
+                # if response.status_code not in [201, 204]:
+                #     raise
+                rv = {}
+        finally:
+            logger.debug(
+                "%d %-6s %s",
+                response.status_code,
+                method,
+                url + ("?" + urlencode(params) if not has_body and params else ""),
+            )
+        if response.status_code == 304 and cached:
+            self.cache.touch(cache_key, ttl)
+            return cached.data
+        if self.throttle:
+            self.throttle.feedback(response.status_code, rv, response.headers)
         self.raise_for_status(response, rv)
         assert 300 > response.status_code >= 200
+        if cache_key:
+            self.cache.set(cache_key, url, rv, response.headers, ttl)
+        elif self.cache and method != "GET":
+            self.cache.invalidate(url)
         return rv
 
     def get(self, *args, **kwargs):
@@ -141,23 +207,30 @@ class BaseClient:
 
     @staticmethod
     def raise_for_status(response: Response, data: dict) -> None:
-        match response.status_code:
-            case 301 | 302:
-                raise errors.Redirect(response, data)
-            case 400:
-                if errors.ApiError.is_limit_exceeded(data):
-                    raise errors.LimitExceeded(response=response, data=data)
-                raise errors.BadRequest(response, data)
-            case 403:
-                raise errors.Forbidden(response, data)
-            case 404:
-                raise errors.ResourceNotFound(response, data)
-            case status if 500 > status >= 400:
-                raise errors.ClientError(response, data)
-            case 502:
-                raise errors.BadGateway(response, data)
-            case status if status >= 500:
-                raise errors.InternalServerError(response, data)
+        raise_for_status(response.status_code, response, data)
+
+
+def raise_for_status(status_code: int, response: Any, data: dict) -> None:
+    # Используется и асинхронным клиентом, у aiohttp статус хранится в `status`
+    match status_code:
+        case 301 | 302:
+            raise errors.Redirect(response, data)
+        case 400:
+            if errors.ApiError.is_limit_exceeded(data):
+                raise errors.LimitExceeded(response=response, data=data)
+            raise errors.BadRequest(response, data)
+        case 403:
+            raise errors.Forbidden(response, data)
+        case 404:
+            raise errors.ResourceNotFound(response, data)
+        case 429:
+            raise errors.TooManyRequests(response, data)
+        case status if 500 > status >= 400:
+            raise errors.ClientError(response, data)
+        case 502:
+            raise errors.BadGateway(response, data)
+        case status if status >= 500:
+            raise errors.InternalServerError(response, data)
 
 
 @dataclass
@@ -229,8 +302,14 @@ class ApiClient(BaseClient):
             client_id=self.client_id,
             client_secret=self.client_secret,
             session=self.session,
+            rate_limiter=self.rate_limiter,
+            throttle=self.throttle,
         )
 
+    def cache_identity(self) -> str:
+        # refresh_token не меняется при обновлении access_token
+        return self.refresh_token or self.access_token or ""
+
     def additional_headers(
         self,
     ) -> dict[str, str]:
@@ -264,10 +343,31 @@ class ApiClient(BaseClient):
             # И повторно отправляем запрос
             return do_request()
 
+    def before_retry(
+        self, method: ALLOWED_METHODS, url: str, params: dict[str, Any]
+    ) -> dict | None:
+        # Отклик мог дойти до сервера, несмотря на ошибку. Повторный отклик
+        # создаст дубль, поэтому сначала смотрим отношения с вакансией.
+        if not is_apply_request(method, url):
+            return None
+        vacancy = BaseClient.request(self, "GET", f"/vacancies/{params['vacancy_id']}")
+        if vacancy.get("relations"):
+            logger.info("Отклик на вакансию %s уже отправлен", params["vacancy_id"])
+            return {}
+        return None
+
     def handle_access_token(self, token: AccessToken) -> None:
         for field in ["access_token", "refresh_token", "access_expires_at"]:
             if field in token and hasattr(self, field):
                 setattr(self, field, token[field])
+        # Заголовок сессии выставляется один раз при создании клиента.
+        # Метод используется и асинхронным клиентом, у которого свои заголовки
+        if not isinstance(self.session, Session):
+            return
+        if self.access_token:
+            self.session.headers["authorization"] = f"Bearer {self.access_token}"
+        else:
+            self.session.headers.pop("authorization", None)
 
     def refresh_access_token(self) -> None:
         if not self.refresh_token:
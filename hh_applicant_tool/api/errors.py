@@ -13,6 +13,7 @@ __all__ = (
     "InternalServerError",
     "Redirect",
     "ResourceNotFound",
+    "TooManyRequests",
 )
 
 
@@ -25,13 +26,15 @@ class ApiError(Exception):
     def data(self) -> dict:
         return self._raw
 
+    # _response может быть как requests.Response, так и aiohttp.ClientResponse
+
     @property
     def request(self) -> Request:
-        return self._response.request
+        return getattr(self._response, "request", None) or self._response.request_info
 
     @property
     def status_code(self) -> int:
-        return self._response.status_code
+        return getattr(self._response, "status_code", None) or self._response.status
 
     @property
     def response_headers(self) -> CaseInsensitiveDict:
@@ -75,6 +78,10 @@ class ResourceNotFound(ClientError):
     pass
 
 
+class TooManyRequests(ClientError):
+    pass
+
+
 class InternalServerError(ApiError):
     pass
 
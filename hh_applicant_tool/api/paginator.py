@@ -0,0 +1,82 @@
+"""Постраничный обход списков API (ApiListResponse)
+
+Первая страница запрашивается сразу, из нее узнается количество страниц, а
+остальные скачиваются параллельно (в пределах RateLimiter клиента). Элементы
+отдаются потоком в порядке страниц, так что обработка начинается до того, как
+скачан весь список.
+"""
+
+from __future__ import annotations
+
+import logging
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import Event
+from typing import Any, Callable, Iterator
+
+from ..types import ApiListResponse
+from .client import BaseClient
+
+__all__ = ("Paginator",)
+
+logger = logging.getLogger(__package__)
+
+
+class Paginator:
+    def __init__(
+        self,
+        api_client: BaseClient,
+        endpoint: str,
+        params: dict[str, Any] | None = None,
+        *,
+        max_pages: int | None = None,
+        concurrency: int = 4,
+        # Возвращает задержку перед запросом очередной страницы
+        page_delay: Callable[[], float] | None = None,
+    ) -> None:
+        self.api_client = api_client
+        self.endpoint = endpoint
+        self.params = dict(params or {})
+        self.max_pages = max_pages
+        self.concurrency = max(1, concurrency)
+        self.page_delay = page_delay
+        # Известны после получения первой страницы
+        self.pages: int | None = None
+        self.found: int | None = None
+        self.stopped = Event()
+
+    def stop(self) -> None:
+        """Прекращает обход после текущей страницы, можно вызывать из другого потока."""
+        self.stopped.set()
+
+    def fetch_page(self, page: int) -> ApiListResponse:
+        delay = self.page_delay() if self.page_delay and page > 0 else None
+        return self.api_client.get(
+            self.endpoint, {**self.params, "page": page}, delay=delay
+        )
+
+    def __iter__(self) -> Iterator[dict]:
+        first = self.fetch_page(0)
+        self.found = first.get("found")
+        self.pages = first.get("pages", 1)
+        if self.max_pages is not None:
+            self.pages = min(self.pages, self.max_pages)
+        logger.debug("%s: pages=%s, found=%s", self.endpoint, self.pages, self.found)
+        yield from first["items"]
+        if self.pages <= 1 or self.stopped.is_set():
+            return
+        executor = ThreadPoolExecutor(
+            max_workers=self.concurrency, thread_name_prefix="paginator"
+        )
+        pending: deque[Future[ApiListResponse]] = deque()
+        next_page = 1
+        try:
+            while not self.stopped.is_set() and (pending or next_page < self.pages):
+                while next_page < self.pages and len(pending) < self.concurrency:
+                    pending.append(executor.submit(self.fetch_page, next_page))
+                    next_page += 1
+                res = pending.popleft().result()
+                yield from res["items"]
+        finally:
+            # Если обход прервали, то не докачиваем оставшиеся страницы
+            executor.shutdown(wait=False, cancel_futures=True)
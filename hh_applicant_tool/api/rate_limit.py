@@ -0,0 +1,181 @@
+"""Ограничение частоты запросов по алгоритму token bucket
+
+Лок удерживается только на время расчета задержки, а ждут потоки уже без него,
+поэтому запросы, укладывающиеся в бюджет, уходят параллельно.
+"""
+
+from __future__ import annotations
+
+import re
+import time
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Any
+from urllib.parse import urlsplit
+
+__all__ = (
+    "DEFAULT_RULES",
+    "RateLimitRule",
+    "RateLimiter",
+    "TokenBucket",
+)
+
+
+@dataclass
+class TokenBucket:
+    # Токенов в секунду
+    rate: float
+    # Сколько запросов можно отправить разом после простоя
+    burst: float = 1.0
+    tokens: float = field(init=False)
+    updated_at: float = field(init=False)
+
+    def __post_init__(self) -> None:
+        self.tokens = self.burst
+        self.updated_at = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        elapsed = now - self.updated_at
+        self.tokens = (
+            self.burst
+            if self.rate == float("inf")
+            else min(self.burst, self.tokens + elapsed * self.rate)
+        )
+        self.updated_at = now
+
+    def reserve(self, now: float) -> float:
+        """Забирает токен и возвращает время, которое нужно подождать."""
+        self.refill(now)
+        self.tokens -= 1
+        return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    def set_rate(self, rate: float) -> None:
+        # Накопленные токены считаем по старой скорости
+        self.refill(time.monotonic())
+        self.rate = rate
+
+
+@dataclass(frozen=True)
+class RateLimitRule:
+    """Отдельный бюджет для класса эндпоинтов.
+
+    Запрос, подпадающий под правило, расходует токены и из общего бюджета, и из
+    бюджета правила.
+    """
+
+    name: str
+    # Регулярка для пути запроса
+    pattern: str
+    rate: float
+    burst: float = 1.0
+    # None — любой метод
+    method: str | None = None
+
+    def matches(self, method: str, path: str) -> bool:
+        return (self.method is None or self.method == method) and bool(
+            re.search(self.pattern, path)
+        )
+
+
+# Отклики и сообщения работодателям HH ограничивает сильнее, чем чтение
+DEFAULT_RULES: tuple[RateLimitRule, ...] = (
+    RateLimitRule("apply", r"^/negotiations/?$", rate=0.5, method="POST"),
+    RateLimitRule(
+        "messages", r"^/negotiations/[^/]+/messages/?$", rate=0.5, method="POST"
+    ),
+    RateLimitRule("negotiations", r"^/negotiations", rate=2.0, burst=3.0, method="GET"),
+)
+
+
+@dataclass
+class WaitStats:
+    requests: int = 0
+    delayed: int = 0
+    total_wait: float = 0.0
+    max_wait: float = 0.0
+
+    def add(self, wait: float) -> None:
+        self.requests += 1
+        if wait > 0:
+            self.delayed += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+
+
+class RateLimiter:
+    def __init__(
+        self,
+        rate: float = 3.0,
+        burst: float = 1.0,
+        rules: tuple[RateLimitRule, ...] | list[RateLimitRule] = DEFAULT_RULES,
+    ) -> None:
+        self.bucket = TokenBucket(rate, burst)
+        self.rules = [(rule, TokenBucket(rule.rate, rule.burst)) for rule in rules]
+        self.lock = Lock()
+        self._stats: dict[str, WaitStats] = {}
+
+    @classmethod
+    def from_delay(cls, delay: float, **kwargs: Any) -> RateLimiter:
+        # Старый --delay задает интервал между запросами
+        return cls(rate=1 / delay if delay > 0 else float("inf"), **kwargs)
+
+    @classmethod
+    def from_config(cls, config: dict, delay: float, burst: float) -> RateLimiter:
+        """Правила можно переопределить в конфиге:
+
+        "rate_limit": {"rules": [{"name": "apply", "pattern": "^/negotiations/?$", "method": "POST", "rate": 0.2}]}
+        """
+        rules = DEFAULT_RULES
+        if (data := config.get("rate_limit") or {}).get("rules") is not None:
+            rules = tuple(RateLimitRule(**rule) for rule in data["rules"])
+        return cls.from_delay(delay, burst=burst, rules=rules)
+
+    @property
+    def rate(self) -> float:
+        return self.bucket.rate
+
+    def reserve(self, method: str, endpoint: str) -> float:
+        path = urlsplit(endpoint).path
+        path = "/" + path.lstrip("/")
+        with self.lock:
+            now = time.monotonic()
+            wait = self.bucket.reserve(now)
+            name = "default"
+            for rule, bucket in self.rules:
+                if rule.matches(method, path):
+                    wait = max(wait, bucket.reserve(now))
+                    name = rule.name
+                    break
+            self._stats.setdefault(name, WaitStats()).add(wait)
+        return wait
+
+    def acquire(self, method: str, endpoint: str) -> float:
+        if (wait := self.reserve(method, endpoint)) > 0:
+            time.sleep(wait)
+        return wait
+
+    async def acquire_async(self, method: str, endpoint: str) -> float:
+        # asyncio нужен только боту, CLI его не импортирует
+        import asyncio
+
+        if (wait := self.reserve(method, endpoint)) > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def set_rate(self, rate: float) -> None:
+        with self.lock:
+            self.bucket.set_rate(rate)
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        """Статистика ожиданий по классам эндпоинтов."""
+        with self.lock:
+            return {
+                name: {
+                    "requests": s.requests,
+                    "delayed": s.delayed,
+                    "total_wait": round(s.total_wait, 3),
+                    "avg_wait": round(s.total_wait / s.requests, 3),
+                    "max_wait": round(s.max_wait, 3),
+                }
+                for name, s in self._stats.items()
+            }
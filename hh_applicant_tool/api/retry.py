@@ -0,0 +1,122 @@
+"""Повтор запросов при временных ошибках
+
+Автоматически повторяются только идемпотентные методы. Отклик на вакансию
+(POST /negotiations) повторяется только если это явно разрешено, а перед
+повтором клиент проверяет, не дошел ли предыдущий отклик (см.
+ApiClient.before_retry).
+"""
+
+from __future__ import annotations
+
+import logging
+import random
+import re
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from threading import Lock
+
+import requests
+
+from . import errors
+
+__all__ = ("RetryBudget", "RetryPolicy", "is_apply_request")
+
+logger = logging.getLogger(__package__)
+
+APPLY_RE = re.compile(r"/negotiations/?$")
+
+
+def is_apply_request(method: str, url: str) -> bool:
+    return method == "POST" and bool(APPLY_RE.search(url.split("?", 1)[0]))
+
+
+@dataclass
+class RetryBudget:
+    """Общее на весь запуск количество повторов."""
+
+    total: int
+    used: int = field(default=0, init=False)
+
+    def __post_init__(self) -> None:
+        self.lock = Lock()
+
+    @property
+    def remaining(self) -> int:
+        return max(0, self.total - self.used)
+
+    def take(self) -> bool:
+        with self.lock:
+            if self.used >= self.total:
+                return False
+            self.used += 1
+            return True
+
+
+@dataclass
+class RetryPolicy:
+    max_retries: int = 3
+    backoff_base: float = 1.0
+    backoff_max: float = 60.0
+    # Retry-After больше этого значения не ждем
+    max_retry_after: float = 300.0
+    retry_methods: frozenset[str] = frozenset({"GET", "PUT", "DELETE"})
+    # Повторять ли отклики на вакансии
+    retry_apply: bool = False
+    budget: RetryBudget | None = None
+
+    @staticmethod
+    def is_transient(ex: Exception) -> bool:
+        return isinstance(
+            ex,
+            (
+                errors.InternalServerError,
+                errors.TooManyRequests,
+                requests.ConnectionError,
+                requests.Timeout,
+            ),
+        )
+
+    def can_retry(self, method: str, url: str) -> bool:
+        return method in self.retry_methods or (
+            self.retry_apply and is_apply_request(method, url)
+        )
+
+    def should_retry(
+        self, method: str, url: str, ex: Exception, attempt: int
+    ) -> bool:
+        if (
+            attempt >= self.max_retries
+            or not self.is_transient(ex)
+            or not self.can_retry(method, url)
+        ):
+            return False
+        if self.budget and not self.budget.take():
+            logger.warning("Исчерпан лимит повторов запросов")
+            return False
+        return True
+
+    def get_delay(self, attempt: int, ex: Exception) -> float:
+        if (retry_after := self.parse_retry_after(ex)) is not None:
+            return min(retry_after, self.max_retry_after)
+        # Экспоненциальная задержка с full jitter
+        return random.uniform(
+            0, min(self.backoff_max, self.backoff_base * 2**attempt)
+        )
+
+    @staticmethod
+    def parse_retry_after(ex: Exception) -> float | None:
+        if not isinstance(ex, errors.ApiError):
+            return None
+        value = ex.response_headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            dt = parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        return max(0.0, (dt - datetime.now(timezone.utc)).total_seconds())
@@ -0,0 +1,95 @@
+"""Адаптивная частота запросов (AIMD)
+
+Пока сервер отвечает 2xx, частота растет на фиксированную величину, а при
+ответах анти-DDOS защиты (502, 5xx, 429, 403 с капчей) уменьшается в разы.
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from dataclasses import dataclass, field
+from threading import Lock
+from typing import Any, Mapping
+
+from .rate_limit import RateLimiter
+
+__all__ = ("AdaptiveThrottle", "is_throttled")
+
+logger = logging.getLogger(__package__)
+
+
+def is_throttled(status_code: int, data: dict, headers: Mapping[str, Any]) -> bool:
+    if status_code == 429 or status_code >= 500:
+        return True
+    if status_code == 403:
+        # ddos-guard отдает html-страницу с капчей, а API — ошибку captcha_required
+        if "ddos-guard" in str(headers.get("server", "")).lower() and not data:
+            return True
+        return any(
+            "captcha" in f"{err.get('type')} {err.get('value')}"
+            for err in data.get("errors", [])
+        )
+    return False
+
+
+@dataclass
+class AdaptiveThrottle:
+    limiter: RateLimiter
+    min_rate: float = 0.5
+    max_rate: float = 6.0
+    # На сколько запросов в секунду увеличиваем частоту
+    increase: float = 0.1
+    # Во сколько раз уменьшаем частоту при ошибке
+    decrease_factor: float = 0.5
+    # Количество успешных ответов подряд, после которых увеличиваем частоту
+    window: int = 10
+    # Ошибки от запросов, отправленных до последнего снижения, игнорируем
+    cooldown: float = 5.0
+    successes: int = field(default=0, init=False)
+    decreased_at: float = field(default=0.0, init=False)
+
+    def __post_init__(self) -> None:
+        self.lock = Lock()
+        self.limiter.set_rate(self.clamp(self.limiter.rate))
+
+    @property
+    def rate(self) -> float:
+        return self.limiter.rate
+
+    def clamp(self, rate: float) -> float:
+        return max(self.min_rate, min(self.max_rate, rate))
+
+    def feedback(
+        self, status_code: int, data: dict, headers: Mapping[str, Any]
+    ) -> None:
+        if is_throttled(status_code, data, headers):
+            self.on_throttled(status_code)
+        elif 300 > status_code >= 200:
+            self.on_success()
+
+    def on_success(self) -> None:
+        with self.lock:
+            self.successes += 1
+            if self.successes < self.window:
+                return
+            self.successes = 0
+            rate = self.clamp(self.rate + self.increase)
+            if rate != self.rate:
+                logger.debug("increase request rate: %.2f req/s", rate)
+                self.limiter.set_rate(rate)
+
+    def on_throttled(self, status_code: int) -> None:
+        with self.lock:
+            self.successes = 0
+            now = time.monotonic()
+            if now - self.decreased_at < self.cooldown:
+                return
+            self.decreased_at = now
+            rate = self.clamp(self.rate * self.decrease_factor)
+            logger.warning(
+                "Сервер вернул %d, снижаем частоту запросов до %.2f в секунду",
+                status_code,
+                rate,
+            )
+            self.limiter.set_rate(rate)
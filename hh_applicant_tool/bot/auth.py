@@ -4,10 +4,9 @@ import json
 from aiogram import Router
 from aiogram.filters import Command
 from aiogram.types import Message
-from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from .db import User, HHTokens, get_or_create_user
+from .db import User, HHTokens, get_user_bundle
 
 router = Router()
 
@@ -35,12 +34,10 @@ async def paste_token(message: Message, session: AsyncSession):
         if not access_token or not refresh_token:
             await message.answer("Неверный формат токена")
             return
-        user = await get_or_create_user(session, message.from_user.id)
-        result = await session.execute(select(HHTokens).where(HHTokens.user_id == user.id))
-        row = result.scalar_one_or_none()
+        user = await get_user_bundle(session, message.from_user.id)
+        row = user.tokens
         if not row:
-            row = HHTokens(user_id=user.id)
-            session.add(row)
+            row = user.tokens = HHTokens()
         row.access_token = access_token
         row.refresh_token = refresh_token
         # Normalize expires
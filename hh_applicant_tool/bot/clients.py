@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+import aiohttp
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from hh_applicant_tool.api import ApiError
+from hh_applicant_tool.api.async_client import AsyncApiClient
+from hh_applicant_tool.types import AccessToken
+
+from .config import BotSettings
+from .db import HHTokens, User
+from .hh_async import AsyncHH
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class _Entry:
+    hh: AsyncHH
+    # Refresh token is single-use, so refreshes must not overlap
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+
+
+class ClientRegistry:
+    """Bounded LRU of warm per-user HH clients keyed by telegram user id.
+
+    A cached client keeps its User-Agent and tokens between button presses,
+    so the DB is only queried on a miss. Entries must be invalidated when
+    tokens are changed outside of the client (e.g. by /auth).
+    """
+
+    def __init__(self, settings: BotSettings, maxsize: int = 1000) -> None:
+        self._settings = settings
+        self._maxsize = maxsize
+        self._entries: OrderedDict[int, _Entry] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    async def get(self, session: AsyncSession, telegram_user_id: int) -> AsyncHH | None:
+        entry = self._entries.get(telegram_user_id)
+        if entry is None:
+            res = await session.execute(
+                select(HHTokens)
+                .join(User, User.id == HHTokens.user_id)
+                .where(User.telegram_user_id == telegram_user_id)
+            )
+            row = res.scalar_one_or_none()
+            if not row or not row.access_token:
+                return None
+            entry = self._put(telegram_user_id, row)
+        else:
+            self._entries.move_to_end(telegram_user_id)
+        await self._ensure_fresh(session, telegram_user_id, entry)
+        return entry.hh
+
+    def invalidate(self, telegram_user_id: int) -> None:
+        self._entries.pop(telegram_user_id, None)
+
+    async def save_tokens(
+        self, session: AsyncSession, telegram_user_id: int, hh: AsyncHH
+    ) -> None:
+        """Write tokens refreshed by the client back to HHTokens."""
+        token: AccessToken = hh.client.get_access_token()
+        await session.execute(
+            update(HHTokens)
+            .where(
+                HHTokens.user_id
+                == select(User.id)
+                .where(User.telegram_user_id == telegram_user_id)
+                .scalar_subquery()
+            )
+            .values(**token)
+        )
+        await session.commit()
+
+    def _put(self, telegram_user_id: int, row: HHTokens) -> _Entry:
+        client = AsyncApiClient(
+            access_token=row.access_token,
+            refresh_token=row.refresh_token,
+            access_expires_at=row.access_expires_at or 0,
+            client_id=self._settings.hh_client_id,
+            client_secret=self._settings.hh_client_secret,
+        )
+        entry = _Entry(hh=AsyncHH(client))
+        self._entries[telegram_user_id] = entry
+        while len(self._entries) > self._maxsize:
+            self._entries.popitem(last=False)
+        return entry
+
+    async def _ensure_fresh(
+        self, session: AsyncSession, telegram_user_id: int, entry: _Entry
+    ) -> None:
+        client = entry.hh.client
+        if not client.is_access_expired or not client.refresh_token:
+            return
+        async with entry.lock:
+            # Another event of the same user may have refreshed it already
+            if not client.is_access_expired:
+                return
+            try:
+                await client.refresh_access_token()
+            except (ApiError, aiohttp.ClientError) as ex:
+                logger.warning("token refresh failed for %s: %s", telegram_user_id, ex)
+                return
+            await self.save_tokens(session, telegram_user_id, entry.hh)
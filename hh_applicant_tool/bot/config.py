@@ -14,6 +14,12 @@ class BotSettings:
     hh_client_id: str = ""
     hh_client_secret: str = ""
     hh_scope: str = "applicant"
+    # How many warm per-user HH clients to keep
+    client_cache_size: int = 1000
+    # Delay between HH requests of the notifier, shared by all users
+    notify_delay: float = 0.5
+    # How often to look for users due for notifications, seconds
+    notify_tick: float = 60.0
 
     @classmethod
     def from_env(cls) -> "BotSettings":
@@ -27,6 +33,9 @@ class BotSettings:
         hh_id = os.getenv("HH_CLIENT_ID", "")
         hh_secret = os.getenv("HH_CLIENT_SECRET", "")
         hh_scope = os.getenv("HH_SCOPE", cls.hh_scope)
+        client_cache_size = int(os.getenv("BOT_CLIENT_CACHE_SIZE", str(cls.client_cache_size)))
+        notify_delay = float(os.getenv("BOT_NOTIFY_DELAY", str(cls.notify_delay)))
+        notify_tick = float(os.getenv("BOT_NOTIFY_TICK", str(cls.notify_tick)))
         if not hh_id or not hh_secret:
             raise RuntimeError("HH_CLIENT_ID and HH_CLIENT_SECRET must be set for OAuth")
         return cls(
@@ -38,4 +47,7 @@ class BotSettings:
             hh_client_id=hh_id,
             hh_client_secret=hh_secret,
             hh_scope=hh_scope,
+            client_cache_size=client_cache_size,
+            notify_delay=notify_delay,
+            notify_tick=notify_tick,
         )
\ No newline at end of file
@@ -3,9 +3,12 @@ from __future__ import annotations
 from dataclasses import dataclass
 from typing import Optional
 
-from sqlalchemy import BigInteger, Integer, String, ForeignKey, select, func
-from sqlalchemy.ext.asyncio import AsyncAttrs, AsyncSession, async_sessionmaker, create_async_engine
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
+from sqlalchemy import BigInteger, Index, Integer, String, ForeignKey, event, select, func
+from sqlalchemy.ext.asyncio import AsyncAttrs, AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import DeclarativeBase, Mapped, joinedload, mapped_column, relationship
+
+# Wait for a concurrent writer (the notifier) instead of failing with "database is locked"
+BUSY_TIMEOUT_MS = 5000
 
 
 class Base(AsyncAttrs, DeclarativeBase):
@@ -21,6 +24,7 @@ class User(Base):
 
     preferences: Mapped["UserPreference"] = relationship(back_populates="user", uselist=False)
     tokens: Mapped["HHTokens"] = relationship(back_populates="user", uselist=False)
+    notification: Mapped[Optional["NotificationSetting"]] = relationship(uselist=False)
 
 
 class UserPreference(Base):
@@ -52,16 +56,58 @@ class HHTokens(Base):
     user: Mapped[User] = relationship(back_populates="tokens")
 
 
+class NotificationSetting(Base):
+    __tablename__ = "notification_settings"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    # 0 means disabled
+    interval_minutes: Mapped[int] = mapped_column(Integer, default=0)
+    last_checked_at: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
+
+    # Due subscribers lookup of the notifier
+    __table_args__ = (Index("ix_notification_settings_due", "interval_minutes", "last_checked_at"),)
+
+
+class SeenVacancy(Base):
+    """Vacancies already sent to (or skipped for) the user by notifications."""
+
+    __tablename__ = "seen_vacancies"
+
+    user_id: Mapped[int] = mapped_column(ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    vacancy_id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    seen_at: Mapped[int] = mapped_column(Integer, index=True)
+
+
 @dataclass
 class Database:
-    engine
+    engine: AsyncEngine
     session_factory: async_sessionmaker[AsyncSession]
 
 
+def _set_sqlite_pragmas(dbapi_connection, connection_record) -> None:
+    cursor = dbapi_connection.cursor()
+    # Readers don't block the writer and vice versa
+    cursor.execute("PRAGMA journal_mode=WAL")
+    # Safe with WAL, fsync only on checkpoints
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+
+def _create_indexes(conn) -> None:
+    # create_all skips existing tables, indexes added later must be created separately
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+
 async def create_database(database_url: str) -> Database:
     engine = create_async_engine(database_url, echo=False, future=True)
+    if engine.dialect.name == "sqlite":
+        event.listen(engine.sync_engine, "connect", _set_sqlite_pragmas)
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(_create_indexes)
     session_factory = async_sessionmaker(engine, expire_on_commit=False)
     return Database(engine=engine, session_factory=session_factory)
 
@@ -71,20 +117,38 @@ async def get_or_create_user(session: AsyncSession, telegram_user_id: int) -> Us
     user = q.scalar_one_or_none()
     if user:
         return user
-    user = User(telegram_user_id=telegram_user_id)
+    return await _create_user(session, telegram_user_id)
+
+
+async def get_user_bundle(session: AsyncSession, telegram_user_id: int) -> User:
+    """User with preferences, tokens and notification settings loaded in one query.
+
+    The user is created with defaults if it doesn't exist yet.
+    """
+    q = await session.execute(
+        select(User)
+        .options(
+            joinedload(User.preferences),
+            joinedload(User.tokens),
+            joinedload(User.notification),
+        )
+        .where(User.telegram_user_id == telegram_user_id)
+    )
+    user = q.scalar_one_or_none()
+    if user:
+        return user
+    return await _create_user(session, telegram_user_id)
+
+
+async def _create_user(session: AsyncSession, telegram_user_id: int) -> User:
+    # init defaults, inserted in one flush
+    user = User(
+        telegram_user_id=telegram_user_id,
+        preferences=UserPreference(),
+        tokens=HHTokens(),
+        # Mark as loaded, lazy loading isn't available with asyncio
+        notification=None,
+    )
     session.add(user)
-    await session.flush()
-    # init defaults
-    prefs = UserPreference(user_id=user.id)
-    session.add(prefs)
-    tok = HHTokens(user_id=user.id)
-    session.add(tok)
     await session.commit()
     return user
-
-
-async def get_user_bundle(session: AsyncSession, telegram_user_id: int):
-    q = await session.execute(select(User).where(User.telegram_user_id == telegram_user_id))
-    user = q.scalar_one()
-    await session.refresh(user)
-    return user
\ No newline at end of file
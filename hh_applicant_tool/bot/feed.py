@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+from collections import OrderedDict, deque
+
+from .filters import VacancyFilters
+from .hh_async import AsyncHH
+
+logger = logging.getLogger(__name__)
+
+# HH returns at most 100 vacancies per page
+PAGE_SIZE = 100
+
+
+class VacancyFeed:
+    """Buffer of vacancies accepted by the user's filters.
+
+    Vacancies are fetched by whole pages and filtered locally, so "next"
+    is answered from memory. The cursor is the absolute position in the
+    similar vacancies list right after the last shown one, it is stored
+    as ``UserPreference.browse_page``.
+    """
+
+    def __init__(
+        self,
+        hh: AsyncHH,
+        resume_id: str,
+        filters: VacancyFilters,
+        cursor: int = 0,
+        size: int = 10,
+        low_water: int = 3,
+    ) -> None:
+        self.hh = hh
+        self.resume_id = resume_id
+        self.filters = filters
+        self.cursor = cursor
+        self.size = size
+        self.low_water = low_water
+        # (position, vacancy)
+        self.buffer: deque[tuple[int, dict]] = deque()
+        # Position of the first vacancy that wasn't fetched yet
+        self.fetched = cursor
+        self.exhausted = False
+        self._lock = asyncio.Lock()
+        self._task: asyncio.Task | None = None
+
+    async def next(self) -> tuple[int, dict] | None:
+        if not self.buffer:
+            await self._fill()
+        if not self.buffer:
+            return None
+        position, vacancy = self.buffer.popleft()
+        self.cursor = position + 1
+        if len(self.buffer) < self.low_water and not self.exhausted:
+            self._refill_in_background()
+        return position, vacancy
+
+    def close(self) -> None:
+        if self._task and not self._task.done():
+            self._task.cancel()
+
+    def _refill_in_background(self) -> None:
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._fill())
+        self._task.add_done_callback(self._log_error)
+
+    @staticmethod
+    def _log_error(task: asyncio.Task) -> None:
+        if not task.cancelled() and (ex := task.exception()):
+            logger.warning("vacancy feed refill failed: %s", ex)
+
+    async def _fill(self) -> None:
+        async with self._lock:
+            while len(self.buffer) < self.size and not self.exhausted:
+                await self._fetch_page(self.fetched // PAGE_SIZE)
+
+    async def _fetch_page(self, page: int) -> None:
+        res = await self.hh.get(
+            f"/resumes/{self.resume_id}/similar_vacancies",
+            order_by="publication_time",
+            professional_role=self.filters.professional_roles,
+            salary_from=self.filters.salary_from,
+            per_page=PAGE_SIZE,
+            page=page,
+        )
+        items = res.get("items", [])
+        start = page * PAGE_SIZE
+        # Part of the page before the cursor was already shown
+        skip = self.fetched - start
+        page_items = items[skip:]
+        for offset, accepted in enumerate(self.filters.match_many(page_items)):
+            if accepted:
+                self.buffer.append((self.fetched + offset, page_items[offset]))
+        self.fetched = start + PAGE_SIZE
+        if not items or page + 1 >= res.get("pages", 0):
+            self.exhausted = True
+
+
+class FeedRegistry:
+    """Bounded LRU of vacancy feeds keyed by telegram user id."""
+
+    def __init__(self, maxsize: int = 1000) -> None:
+        self._maxsize = maxsize
+        self._feeds: OrderedDict[int, VacancyFeed] = OrderedDict()
+
+    async def get(
+        self,
+        telegram_user_id: int,
+        hh: AsyncHH,
+        filters: VacancyFilters,
+        cursor: int,
+    ) -> VacancyFeed | None:
+        """Feed positioned at cursor or None if the user has no resumes."""
+        feed = self._feeds.get(telegram_user_id)
+        if feed and feed.hh is hh:
+            if feed.filters == filters and feed.cursor == cursor:
+                self._feeds.move_to_end(telegram_user_id)
+                return feed
+            # The same client, the resume id is still valid
+            resume_id = feed.resume_id
+        else:
+            resumes = await hh.get("/resumes/mine")
+            items = resumes.get("items", [])
+            if not items:
+                return None
+            resume_id = items[0]["id"]
+        if feed:
+            feed.close()
+        feed = VacancyFeed(hh, resume_id, filters, cursor)
+        self._feeds[telegram_user_id] = feed
+        self._feeds.move_to_end(telegram_user_id)
+        while len(self._feeds) > self._maxsize:
+            self._feeds.popitem(last=False)[1].close()
+        return feed
@@ -3,6 +3,8 @@ from __future__ import annotations
 from dataclasses import dataclass
 from typing import Any
 
+from hh_applicant_tool.vacancy_filters import FilterSpec
+
 
 @dataclass
 class VacancyFilters:
@@ -23,6 +25,29 @@ class VacancyFilters:
             exclude_text=pref.exclude_text or "ux ui",
         )
 
+    def to_spec(self) -> FilterSpec:
+        schedules = {name for name, on in (("remote", self.remote), ("flexible", self.flexible)) if on}
+        return FilterSpec(
+            exclude_terms=FilterSpec.split_terms(self.exclude_text),
+            schedules=frozenset(schedules) if schedules else None,
+        )
+
+    def search_params(self) -> dict[str, Any]:
+        """Server-side part of the filters as /vacancies search params."""
+        params: dict[str, Any] = {
+            "professional_role": sorted(self.professional_roles),
+            "salary": self.salary_from,
+            "order_by": "publication_time",
+        }
+        if schedules := self.to_spec().schedules:
+            params["schedule"] = sorted(schedules)
+        return params
+
+    def match_many(self, vacancies: list[dict]) -> list[bool]:
+        """Local checks that HH search can't do, for a whole page at once."""
+        # Compiled matchers are cached by spec, so this is cheap per button press
+        return self.to_spec().compile().match_many(vacancies)
+
 
 def vacancy_to_text(v: dict) -> str:
     name = v.get("name", "")
@@ -52,4 +77,18 @@ def vacancy_to_text(v: dict) -> str:
         if val:
             lines.append("")
             lines.append(val)
-    return "\n".join(filter(None, lines))
\ No newline at end of file
+    return "\n".join(filter(None, lines))
+
+def vacancy_to_line(v: dict) -> str:
+    """Short form of a vacancy for batched notifications."""
+    salary = v.get("salary") or {}
+    currency = salary.get("currency") or ""
+    if salary.get("from"):
+        s_text = f" — от {salary['from']} {currency}"
+    elif salary.get("to"):
+        s_text = f" — до {salary['to']} {currency}"
+    else:
+        s_text = ""
+    employer = (v.get("employer") or {}).get("name", "")
+    url = v.get("alternate_url") or v.get("url") or ""
+    return f"💼 {v.get('name', '')}{s_text.rstrip()}\n🏢 {employer}\n🔗 {url}"
@@ -4,10 +4,10 @@ from aiogram import Router, F
 from aiogram.filters import CommandStart
 from aiogram.types import Message, CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.utils.keyboard import InlineKeyboardBuilder
-from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from .db import get_or_create_user, User, UserPreference, HHTokens
+from .db import get_or_create_user, get_user_bundle, User, UserPreference, NotificationSetting
+from .feed import FeedRegistry
 from .filters import VacancyFilters, vacancy_to_text
 from .hh_async import AsyncHH
 
@@ -48,12 +48,10 @@ async def cmd_start(message: Message, session: AsyncSession):
 
 @router.callback_query(F.data == "role:design")
 async def set_role_design(callback: CallbackQuery, session: AsyncSession):
-    user = await get_or_create_user(session, callback.from_user.id)
-    res = await session.execute(select(UserPreference).where(UserPreference.user_id == user.id))
-    pref = res.scalar_one_or_none()
+    user = await get_user_bundle(session, callback.from_user.id)
+    pref = user.preferences
     if not pref:
-        pref = UserPreference(user_id=user.id)
-        session.add(pref)
+        pref = user.preferences = UserPreference()
     pref.professional_roles = "4,6,8,9,34"
     await session.commit()
     await callback.message.edit_text("Профиль обновлен. Теперь настройте фильтры или переходите в меню.")
@@ -80,14 +78,62 @@ async def setup_filters(callback: CallbackQuery):
     await callback.answer()
 
 
-async def _send_vacancy(callback: CallbackQuery, session: AsyncSession, hh: AsyncHH, reset_page: bool = False):
-    user = await get_or_create_user(session, callback.from_user.id)
+NOTIFY_INTERVALS = {
+    60: "Каждый час",
+    180: "Каждые 3 часа",
+    1440: "Раз в день",
+}
 
-    pref_res = await session.execute(select(UserPreference).where(UserPreference.user_id == user.id))
-    pref = pref_res.scalar_one()
 
-    tok_res = await session.execute(select(HHTokens).where(HHTokens.user_id == user.id))
-    tok = tok_res.scalar_one_or_none()
+def notify_kb(current: int) -> InlineKeyboardMarkup:
+    kb = InlineKeyboardBuilder()
+    for minutes, title in NOTIFY_INTERVALS.items():
+        kb.button(text=("✅ " if minutes == current else "") + title, callback_data=f"notify:{minutes}")
+    kb.button(text=("✅ " if not current else "") + "Выключить", callback_data="notify:0")
+    kb.button(text="🏠 В главное меню", callback_data="home")
+    kb.adjust(1)
+    return kb.as_markup()
+
+
+def _get_notification_setting(user: User) -> NotificationSetting:
+    if not user.notification:
+        user.notification = NotificationSetting(interval_minutes=0)
+    return user.notification
+
+
+@router.callback_query(F.data == "notify")
+async def setup_notifications(callback: CallbackQuery, session: AsyncSession):
+    user = await get_user_bundle(session, callback.from_user.id)
+    setting = _get_notification_setting(user)
+    await callback.message.edit_text(
+        "Как часто присылать новые вакансии по вашим фильтрам?",
+        reply_markup=notify_kb(setting.interval_minutes or 0),
+    )
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("notify:"))
+async def set_notifications(callback: CallbackQuery, session: AsyncSession):
+    minutes = int(callback.data.split(":", 1)[1])
+    if minutes and minutes not in NOTIFY_INTERVALS:
+        await callback.answer()
+        return
+    user = await get_user_bundle(session, callback.from_user.id)
+    setting = _get_notification_setting(user)
+    if minutes and not setting.interval_minutes:
+        # Start with a fresh seen set baseline
+        setting.last_checked_at = None
+    setting.interval_minutes = minutes
+    await session.commit()
+    text = f"🔔 Уведомления: {NOTIFY_INTERVALS[minutes].lower()}." if minutes else "🔕 Уведомления выключены."
+    await callback.message.edit_text(text, reply_markup=main_menu_kb())
+    await callback.answer()
+
+
+async def _send_vacancy(callback: CallbackQuery, session: AsyncSession, hh: AsyncHH, feeds: FeedRegistry, reset_page: bool = False):
+    user = await get_user_bundle(session, callback.from_user.id)
+    pref = user.preferences
+    tok = user.tokens
     if not tok or not tok.access_token:
         await callback.message.edit_text(
             "Сначала авторизуйтесь в HH через команду /auth (временно).",
@@ -102,69 +148,36 @@ async def _send_vacancy(callback: CallbackQuery, session: AsyncSession, hh: Asyn
 
     vf = VacancyFilters.from_pref_row(pref)
 
-    # Resolve resume
-    resumes = await hh.get("/resumes/mine")
-    items = resumes.get("items", [])
-    if not items:
+    feed = await feeds.get(callback.from_user.id, hh, vf, pref.browse_page)
+    if feed is None:
         await callback.message.edit_text("Не найдено ни одного резюме. Добавьте резюме на HH.", reply_markup=main_menu_kb())
         await callback.answer()
         return
-    resume_id = items[0]["id"]
-
-    page = pref.browse_page
-
-    while True:
-        res = await hh.get(
-            f"/resumes/{resume_id}/similar_vacancies",
-            order_by="publication_time",
-            professional_role=vf.professional_roles,
-            salary_from=vf.salary_from,
-            per_page=1,
-            page=page,
-        )
-        vac_items = res.get("items", [])
-        total_pages = res.get("pages", 0)
-        if not vac_items:
-            await callback.message.edit_text("Подходящих вакансий не найдено.", reply_markup=main_menu_kb())
-            await callback.answer()
-            return
-        v = vac_items[0]
-
-        # local exclude filter by text
-        exclude_terms = [t.strip().lower() for t in (vf.exclude_text or "").split() if t.strip()]
-        text_blobs = []
-        snippet = v.get("snippet") or {}
-        for k in ("responsibility", "requirement"):
-            val = snippet.get(k)
-            if val:
-                text_blobs.append(val.lower())
-        name = (v.get("name") or "").lower()
-        text_blobs.append(name)
-        if any(term in "\n".join(text_blobs) for term in exclude_terms):
-            page += 1
-            if total_pages and page >= total_pages:
-                await callback.message.edit_text("Больше вакансий нет.", reply_markup=main_menu_kb())
-                await callback.answer()
-                return
-            continue
-
-        # show vacancy
-        text = vacancy_to_text(v)
-        url = v.get("alternate_url") or v.get("url")
-        await callback.message.edit_text(text, reply_markup=browse_kb(url))
-
-        # update next page
-        pref.browse_page = page + 1
-        await session.commit()
+
+    item = await feed.next()
+    if item is None:
+        text = "Больше вакансий нет." if pref.browse_page else "Подходящих вакансий не найдено."
+        await callback.message.edit_text(text, reply_markup=main_menu_kb())
         await callback.answer()
         return
+    position, v = item
+
+    # show vacancy
+    text = vacancy_to_text(v)
+    url = v.get("alternate_url") or v.get("url")
+    await callback.message.edit_text(text, reply_markup=browse_kb(url))
+
+    # the cursor points right after the shown vacancy
+    pref.browse_page = position + 1
+    await session.commit()
+    await callback.answer()
 
 
 @router.callback_query(F.data == "browse")
-async def browse_vacancies(callback: CallbackQuery, session: AsyncSession, hh: AsyncHH):
-    await _send_vacancy(callback, session, hh, reset_page=True)
+async def browse_vacancies(callback: CallbackQuery, session: AsyncSession, hh: AsyncHH, feeds: FeedRegistry):
+    await _send_vacancy(callback, session, hh, feeds, reset_page=True)
 
 
 @router.callback_query(F.data == "next")
-async def next_vacancy(callback: CallbackQuery, session: AsyncSession, hh: AsyncHH):
-    await _send_vacancy(callback, session, hh, reset_page=False)
\ No newline at end of file
+async def next_vacancy(callback: CallbackQuery, session: AsyncSession, hh: AsyncHH, feeds: FeedRegistry):
+    await _send_vacancy(callback, session, hh, feeds, reset_page=False)
\ No newline at end of file
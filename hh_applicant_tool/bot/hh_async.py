@@ -1,38 +1,26 @@
 from __future__ import annotations
 
-import asyncio
-from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Any, Optional
+from typing import Any
 
-from hh_applicant_tool.api import ApiClient
+from hh_applicant_tool.api.async_client import AsyncApiClient
 
 
 @dataclass
 class AsyncHH:
-    client: ApiClient
-    _executor: Optional[ThreadPoolExecutor] = None
-
-    def _ensure_executor(self) -> ThreadPoolExecutor:
-        if self._executor is None:
-            self._executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="hh-client")
-        return self._executor
+    client: AsyncApiClient
 
     async def get(self, endpoint: str, **params: Any) -> dict:
-        loop = asyncio.get_running_loop()
-        return await loop.run_in_executor(self._ensure_executor(), lambda: self.client.get(endpoint, **params))
+        return await self.client.get(endpoint, **params)
 
     async def post(self, endpoint: str, params: dict | None = None, **kw: Any) -> dict:
-        loop = asyncio.get_running_loop()
-        return await loop.run_in_executor(self._ensure_executor(), lambda: self.client.post(endpoint, params or {}, **kw))
+        return await self.client.post(endpoint, params or {}, **kw)
 
     async def put(self, endpoint: str, **params: Any) -> dict:
-        loop = asyncio.get_running_loop()
-        return await loop.run_in_executor(self._ensure_executor(), lambda: self.client.put(endpoint, **params))
+        return await self.client.put(endpoint, **params)
 
     async def delete(self, endpoint: str, **params: Any) -> dict:
-        loop = asyncio.get_running_loop()
-        return await loop.run_in_executor(self._ensure_executor(), lambda: self.client.delete(endpoint, **params))
+        return await self.client.delete(endpoint, **params)
 
     async def get_me(self) -> dict:
         return await self.get("/me")
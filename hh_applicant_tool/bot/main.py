@@ -5,10 +5,17 @@ import logging
 
 from aiogram import Bot, Dispatcher
 
+from hh_applicant_tool.api.async_client import AsyncApiClient, close_shared_session
+from hh_applicant_tool.api.rate_limit import RateLimiter
+
+from .clients import ClientRegistry
 from .config import BotSettings
+from .feed import FeedRegistry
 from .db import create_database
 from .middlewares import DBSessionMiddleware, HHClientMiddleware
 from .handlers import router as main_router
+from .hh_async import AsyncHH
+from .notifications import Notifier
 from .oauth import router as oauth_router
 
 
@@ -18,16 +25,43 @@ async def run_bot() -> None:
 
     db = await create_database(settings.database_url)
 
-    dp = Dispatcher()
+    clients = ClientRegistry(settings, maxsize=settings.client_cache_size)
+    feeds = FeedRegistry(maxsize=settings.client_cache_size)
+
+    # settings, clients and feeds are passed to handlers as keyword arguments
+    dp = Dispatcher(settings=settings, clients=clients, feeds=feeds)
     dp.message.middleware(DBSessionMiddleware(db.session_factory))
     dp.callback_query.middleware(DBSessionMiddleware(db.session_factory))
-    dp.message.middleware(HHClientMiddleware())
-    dp.callback_query.middleware(HHClientMiddleware())
+    dp.message.middleware(HHClientMiddleware(clients))
+    dp.callback_query.middleware(HHClientMiddleware(clients))
 
     dp.include_router(oauth_router)
     dp.include_router(main_router)
+    dp.shutdown.register(close_shared_session)
 
     bot = Bot(settings.telegram_token, parse_mode=None)
+
+    # Vacancy search is public, one client with a bot-wide rate limit serves all users
+    notifier_client = AsyncApiClient(
+        client_id=settings.hh_client_id,
+        client_secret=settings.hh_client_secret,
+        rate_limiter=RateLimiter.from_delay(settings.notify_delay),
+    )
+    notifier = Notifier(
+        bot, db.session_factory, AsyncHH(notifier_client), tick=settings.notify_tick
+    )
+    notifier_task: asyncio.Task | None = None
+
+    async def start_notifier() -> None:
+        nonlocal notifier_task
+        notifier_task = asyncio.create_task(notifier.run_forever())
+
+    async def stop_notifier() -> None:
+        if notifier_task:
+            notifier_task.cancel()
+
+    dp.startup.register(start_notifier)
+    dp.shutdown.register(stop_notifier)
     await dp.start_polling(bot)
 
 
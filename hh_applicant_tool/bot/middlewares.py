@@ -5,11 +5,7 @@ from aiogram.types import TelegramObject
 from typing import Callable, Awaitable, Dict, Any
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from hh_applicant_tool.api import ApiClient
-
-from .db import HHTokens
-from .hh_async import AsyncHH
-from .config import BotSettings
+from .clients import ClientRegistry
 
 
 class DBSessionMiddleware(BaseMiddleware):
@@ -24,6 +20,10 @@ class DBSessionMiddleware(BaseMiddleware):
 
 
 class HHClientMiddleware(BaseMiddleware):
+    def __init__(self, clients: ClientRegistry):
+        super().__init__()
+        self._clients = clients
+
     async def __call__(self, handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]], event: TelegramObject, data: Dict[str, Any]) -> Any:
         session: AsyncSession = data.get("session")
         user_id = None
@@ -32,26 +32,16 @@ class HHClientMiddleware(BaseMiddleware):
         elif hasattr(event, "message") and event.message and event.message.from_user:
             user_id = event.message.from_user.id
 
-        hh_client = None
-        if user_id is not None:
-            # Load tokens for user if present
-            result = await session.execute(
-                # noqa: E501
-                "SELECT access_token, refresh_token, access_expires_at FROM hh_tokens ht JOIN users u ON u.id = ht.user_id WHERE u.telegram_user_id = :uid",
-                {"uid": user_id},
-            )
-            row = result.first()
-            if row:
-                access_token, refresh_token, access_expires_at = row
-                settings = BotSettings.from_env()
-                client = ApiClient(
-                    access_token=access_token,
-                    refresh_token=refresh_token,
-                    access_expires_at=access_expires_at,
-                    client_id=settings.hh_client_id,
-                    client_secret=settings.hh_client_secret,
-                )
-                hh_client = AsyncHH(client)
-        if hh_client:
-            data["hh"] = hh_client
-        return await handler(event, data)
\ No newline at end of file
+        if user_id is None:
+            return await handler(event, data)
+        hh_client = await self._clients.get(session, user_id)
+        if not hh_client:
+            return await handler(event, data)
+        data["hh"] = hh_client
+        token = hh_client.client.get_access_token()
+        try:
+            return await handler(event, data)
+        finally:
+            # The client may have refreshed tokens while handling the event
+            if hh_client.client.get_access_token() != token:
+                await self._clients.save_tokens(session, user_id, hh_client)
@@ -0,0 +1,313 @@
+"""New vacancy notifications.
+
+Due subscribers are grouped by the server-side part of their filters, so
+users with the same roles/salary/schedule share one /vacancies search per
+round. Each user then gets the group results filtered locally by their
+exclude terms and diffed against their seen set.
+
+Similar vacancies of a resume can't be shared between users, that is why
+notifications use the public search instead of get_similar_vacancies.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Any
+
+import aiohttp
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramAPIError,
+    TelegramForbiddenError,
+    TelegramRetryAfter,
+)
+from sqlalchemy import delete, or_, select, update
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from hh_applicant_tool.api import ApiError
+from hh_applicant_tool.api.rate_limit import RateLimiter
+
+from .db import NotificationSetting, SeenVacancy, User, UserPreference
+from .filters import VacancyFilters, vacancy_to_line
+from .hh_async import AsyncHH
+
+logger = logging.getLogger(__name__)
+
+PAGE_SIZE = 100
+# Pages per query group in one round, older vacancies are skipped
+MAX_PAGES = 5
+# Vacancies per Telegram message and messages per user in one round
+BATCH_SIZE = 10
+MAX_MESSAGES = 3
+# Overlap of search windows to not miss vacancies published late
+WINDOW_OVERLAP = 600
+# A new subscriber's seen set is filled from this period without notifying
+BASELINE_PERIOD = 86400
+SEEN_TTL = 30 * 86400
+
+
+@dataclass
+class Subscriber:
+    user_id: int
+    telegram_user_id: int
+    filters: VacancyFilters
+    last_checked_at: int | None
+
+
+@dataclass
+class QueryGroup:
+    params: dict[str, Any]
+    subscribers: list[Subscriber] = field(default_factory=list)
+    vacancies: list[dict] = field(default_factory=list)
+    failed: bool = False
+
+
+def group_subscribers(subscribers: list[Subscriber], now: int) -> list[QueryGroup]:
+    groups: dict[tuple, QueryGroup] = {}
+    for sub in subscribers:
+        params = sub.filters.search_params()
+        key = tuple(
+            (k, tuple(v) if isinstance(v, list) else v)
+            for k, v in sorted(params.items())
+        )
+        groups.setdefault(key, QueryGroup(params)).subscribers.append(sub)
+    for group in groups.values():
+        # The widest window among the group members
+        since = min(
+            (sub.last_checked_at or now - BASELINE_PERIOD) for sub in group.subscribers
+        )
+        group.params["date_from"] = datetime.fromtimestamp(
+            since - WINDOW_OVERLAP, timezone.utc
+        ).strftime("%Y-%m-%dT%H:%M:%S%z")
+    return list(groups.values())
+
+
+class FairShareScheduler:
+    """Runs page requests of many query groups under one HH rate limit.
+
+    Requests are served round-robin: every group gets its first page before
+    any group gets its second one, so a query with lots of new vacancies
+    can't starve the others. The rate limit itself is the limiter of the
+    shared client.
+    """
+
+    def __init__(
+        self, hh: AsyncHH, workers: int = 4, max_pages: int = MAX_PAGES
+    ) -> None:
+        self.hh = hh
+        self.workers = workers
+        self.max_pages = max_pages
+
+    async def run(self, groups: list[QueryGroup]) -> None:
+        queue: asyncio.Queue[tuple[QueryGroup, int]] = asyncio.Queue()
+        for group in groups:
+            queue.put_nowait((group, 0))
+
+        async def worker() -> None:
+            # Workers stay until everything is done, the queue may be empty
+            # while another worker is about to add the next page
+            while True:
+                group, page = await queue.get()
+                try:
+                    res = await self.hh.get(
+                        "/vacancies", **group.params, page=page, per_page=PAGE_SIZE
+                    )
+                    items = res.get("items", [])
+                    group.vacancies.extend(items)
+                    if len(items) == PAGE_SIZE and page + 1 < min(
+                        res.get("pages", 0), self.max_pages
+                    ):
+                        queue.put_nowait((group, page + 1))
+                except (ApiError, aiohttp.ClientError) as ex:
+                    logger.warning("vacancy search failed: %s", ex)
+                    group.failed = True
+                except Exception:
+                    logger.exception("vacancy search failed")
+                    group.failed = True
+                finally:
+                    queue.task_done()
+
+        tasks = [asyncio.create_task(worker()) for _ in range(self.workers)]
+        try:
+            await queue.join()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+
+class Notifier:
+    def __init__(
+        self,
+        bot: Bot,
+        session_factory: async_sessionmaker[AsyncSession],
+        hh: AsyncHH,
+        tick: float = 60.0,
+        workers: int = 4,
+        telegram_delay: float = 0.04,
+    ) -> None:
+        self.bot = bot
+        self.session_factory = session_factory
+        self.scheduler = FairShareScheduler(hh, workers)
+        self.tick = tick
+        # Telegram allows about 30 messages per second to different chats
+        self.telegram_limiter = RateLimiter.from_delay(telegram_delay)
+        self._pruned_at = 0.0
+
+    async def run_forever(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("notification round failed")
+            await asyncio.sleep(self.tick)
+
+    async def run_once(self) -> None:
+        now = int(time.time())
+        async with self.session_factory() as session:
+            subscribers = await self._load_due(session, now)
+            if now - self._pruned_at > 86400:
+                await session.execute(
+                    delete(SeenVacancy).where(SeenVacancy.seen_at < now - SEEN_TTL)
+                )
+                await session.commit()
+                self._pruned_at = now
+        if not subscribers:
+            return
+        groups = group_subscribers(subscribers, now)
+        logger.info(
+            "notifications: %d users, %d queries", len(subscribers), len(groups)
+        )
+        await self.scheduler.run(groups)
+        for group in groups:
+            # Failed groups are retried on the next round
+            if group.failed:
+                continue
+            for sub in group.subscribers:
+                await self._notify(sub, group.vacancies, now)
+
+    async def _load_due(self, session: AsyncSession, now: int) -> list[Subscriber]:
+        res = await session.execute(
+            select(NotificationSetting, UserPreference, User.telegram_user_id)
+            .join(User, User.id == NotificationSetting.user_id)
+            .join(UserPreference, UserPreference.user_id == NotificationSetting.user_id)
+            .where(
+                NotificationSetting.interval_minutes > 0,
+                or_(
+                    NotificationSetting.last_checked_at.is_(None),
+                    NotificationSetting.last_checked_at
+                    + NotificationSetting.interval_minutes * 60
+                    <= now,
+                ),
+            )
+        )
+        return [
+            Subscriber(
+                user_id=setting.user_id,
+                telegram_user_id=telegram_user_id,
+                filters=VacancyFilters.from_pref_row(pref),
+                last_checked_at=setting.last_checked_at,
+            )
+            for setting, pref, telegram_user_id in res.all()
+        ]
+
+    async def _notify(self, sub: Subscriber, vacancies: list[dict], now: int) -> None:
+        accepted = {
+            int(v["id"]): v for v in sub.filters.to_spec().compile().filter(vacancies)
+        }
+        async with self.session_factory() as session:
+            seen = set()
+            ids = list(accepted)
+            # Stay below the SQLite variables limit
+            for i in range(0, len(ids), 500):
+                res = await session.execute(
+                    select(SeenVacancy.vacancy_id).where(
+                        SeenVacancy.user_id == sub.user_id,
+                        SeenVacancy.vacancy_id.in_(ids[i : i + 500]),
+                    )
+                )
+                seen.update(res.scalars())
+        new = [v for vid, v in accepted.items() if vid not in seen]
+        # The first round only fills the seen set
+        if new and sub.last_checked_at is not None:
+            delivered = await self._send(sub, new)
+        else:
+            delivered = new
+        # Undelivered vacancies stay unseen and are sent on the next round
+        async with self.session_factory() as session:
+            if delivered:
+                await session.execute(
+                    insert(SeenVacancy)
+                    .values(
+                        [
+                            {
+                                "user_id": sub.user_id,
+                                "vacancy_id": int(v["id"]),
+                                "seen_at": now,
+                            }
+                            for v in delivered
+                        ]
+                    )
+                    .on_conflict_do_nothing()
+                )
+            if len(delivered) == len(new):
+                await session.execute(
+                    update(NotificationSetting)
+                    .where(NotificationSetting.user_id == sub.user_id)
+                    .values(last_checked_at=now)
+                )
+            await session.commit()
+
+    async def _send(self, sub: Subscriber, vacancies: list[dict]) -> list[dict]:
+        """Returns the vacancies the user was notified about."""
+        batches = [
+            vacancies[i : i + BATCH_SIZE] for i in range(0, len(vacancies), BATCH_SIZE)
+        ]
+        for n, batch in enumerate(batches[:MAX_MESSAGES]):
+            text = "\n\n".join(vacancy_to_line(v) for v in batch)
+            if n == 0:
+                text = f"🔔 Новые вакансии: {len(vacancies)}\n\n{text}"
+            if n == MAX_MESSAGES - 1 and len(batches) > MAX_MESSAGES:
+                text += f"\n\n…и еще {len(vacancies) - MAX_MESSAGES * BATCH_SIZE}"
+            if not await self._send_message(sub, text):
+                return vacancies[: n * BATCH_SIZE]
+        # The rest was mentioned in the last message
+        return vacancies
+
+    async def _send_message(self, sub: Subscriber, text: str) -> bool:
+        for attempt in range(2):
+            await self.telegram_limiter.acquire_async("POST", "sendMessage")
+            try:
+                await self.bot.send_message(
+                    sub.telegram_user_id, text, disable_web_page_preview=True
+                )
+                return True
+            except TelegramRetryAfter as ex:
+                if attempt:
+                    logger.warning("can't notify %s: %s", sub.telegram_user_id, ex)
+                    return False
+                await asyncio.sleep(ex.retry_after)
+            except TelegramForbiddenError:
+                # The user blocked the bot
+                await self._disable(sub)
+                return False
+            except TelegramAPIError as ex:
+                logger.warning("can't notify %s: %s", sub.telegram_user_id, ex)
+                return False
+        return False
+
+    async def _disable(self, sub: Subscriber) -> None:
+        async with self.session_factory() as session:
+            await session.execute(
+                update(NotificationSetting)
+                .where(NotificationSetting.user_id == sub.user_id)
+                .values(interval_minutes=0)
+            )
+            await session.commit()
@@ -9,13 +9,13 @@ from aiohttp import web
 from aiogram import Router
 from aiogram.filters import Command
 from aiogram.types import Message
-from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from hh_applicant_tool.api import ApiClient
+from hh_applicant_tool.api.async_client import AsyncApiClient
 
+from .clients import ClientRegistry
 from .config import BotSettings
-from .db import get_or_create_user, HHTokens
+from .db import get_user_bundle, HHTokens
 
 
 @dataclass
@@ -58,9 +58,7 @@ router = Router()
 
 
 @router.message(Command("auth"))
-async def cmd_auth(message: Message, session: AsyncSession):
-    settings = BotSettings.from_env()
-
+async def cmd_auth(message: Message, session: AsyncSession, settings: BotSettings, clients: ClientRegistry):
     user_id = message.from_user.id
     state = secrets.token_urlsafe(24)
     _PENDING_STATES[state] = user_id
@@ -69,7 +67,7 @@ async def cmd_auth(message: Message, session: AsyncSession):
     server = await start_oauth_server(settings)
 
     # Build authorize URL using custom client
-    client = ApiClient(client_id=settings.hh_client_id, client_secret=settings.hh_client_secret)
+    client = AsyncApiClient(client_id=settings.hh_client_id, client_secret=settings.hh_client_secret)
     client.oauth_client.redirect_uri = f"{settings.public_base_url}/oauth/callback"
     client.oauth_client.scope = settings.hh_scope
     client.oauth_client.state = state
@@ -99,22 +97,22 @@ async def cmd_auth(message: Message, session: AsyncSession):
         pass
 
     # Exchange code
-    client = ApiClient(client_id=settings.hh_client_id, client_secret=settings.hh_client_secret)
+    client = AsyncApiClient(client_id=settings.hh_client_id, client_secret=settings.hh_client_secret)
     client.oauth_client.redirect_uri = f"{settings.public_base_url}/oauth/callback"
-    token = client.oauth_client.authenticate(code)
+    token = await client.oauth_client.authenticate(code)
     client.handle_access_token(token)
 
     # Save tokens
-    user = await get_or_create_user(session, user_id)
-    res = await session.execute(select(HHTokens).where(HHTokens.user_id == user.id))
-    row = res.scalar_one_or_none()
+    user = await get_user_bundle(session, user_id)
+    row = user.tokens
     if not row:
-        row = HHTokens(user_id=user.id)
-        session.add(row)
+        row = user.tokens = HHTokens()
     row.access_token = client.access_token
     row.refresh_token = client.refresh_token
     row.access_expires_at = client.access_expires_at
     await session.commit()
+    # Drop the cached client with the old tokens
+    clients.invalidate(user_id)
 
     _PENDING_STATES.pop(state, None)
     await server.runner.cleanup()
@@ -0,0 +1,162 @@
+"""Локальная копия контактов работодателей с полнотекстовым поиском
+
+Контакты с сервера телеметрии синхронизируются в data.sqlite, после чего
+поиск и листание страниц работают без сети. Индекс — SQLite FTS5.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+import time
+from typing import Iterable
+
+from .storage import SQLiteStorage
+from .utils import make_hash
+
+__all__ = ("ContactIndex",)
+
+TOKEN_RE = re.compile(r"\w+", re.U)
+
+
+def get_contact_key(contact: dict) -> str:
+    if contact.get("id") is not None:
+        return str(contact["id"])
+    return make_hash(f"{contact.get('email')}\n{contact.get('name')}")
+
+
+def get_search_fields(contact: dict) -> tuple[str, ...]:
+    employer = contact.get("employer") or {}
+    return (
+        contact.get("name") or "",
+        contact.get("email") or "",
+        employer.get("name") or "",
+        employer.get("site_url") or "",
+        " ".join(
+            pn["phone_number"]
+            for pn in contact.get("phone_numbers", [])
+            if "phone_number" in pn
+        ),
+        " ".join(
+            tu["username"]
+            for tu in contact.get("telegram_usernames", [])
+            if "username" in tu
+        ),
+    )
+
+
+def make_fts_query(search: str) -> str:
+    # Каждое слово ищем по префиксу, кавычки защищают от синтаксиса FTS5
+    return " ".join(f'"{token}"*' for token in TOKEN_RE.findall(search))
+
+
+class ContactIndex(SQLiteStorage):
+    schema = """
+    CREATE TABLE IF NOT EXISTS contacts (
+        id INTEGER PRIMARY KEY,
+        key TEXT NOT NULL UNIQUE,
+        hash TEXT NOT NULL,
+        data TEXT NOT NULL,
+        synced_at REAL NOT NULL
+    );
+    CREATE VIRTUAL TABLE IF NOT EXISTS contacts_fts USING fts5(
+        name, email, employer_name, site_url, phones, telegram,
+        content='', tokenize='unicode61'
+    );
+    """
+
+    def sync(self, contacts: Iterable[dict]) -> dict[str, int]:
+        """Обновляет только изменившиеся контакты, удаленные на сервере удаляет."""
+        stats = {"added": 0, "updated": 0, "deleted": 0, "total": 0}
+        started_at = time.time()
+        for contact in contacts:
+            stats["total"] += 1
+            key = get_contact_key(contact)
+            data = json.dumps(contact, ensure_ascii=False, sort_keys=True)
+            hash_ = make_hash(data)
+            with self.lock:
+                row = self.conn.execute(
+                    "SELECT id, hash FROM contacts WHERE key = ?", (key,)
+                ).fetchone()
+                if row and row["hash"] == hash_:
+                    self.conn.execute(
+                        "UPDATE contacts SET synced_at = ? WHERE id = ?",
+                        (started_at, row["id"]),
+                    )
+                    continue
+                if row:
+                    self._delete_fts(row["id"])
+                    self.conn.execute(
+                        "UPDATE contacts SET hash = ?, data = ?, synced_at = ? WHERE id = ?",
+                        (hash_, data, started_at, row["id"]),
+                    )
+                    rowid = row["id"]
+                    stats["updated"] += 1
+                else:
+                    rowid = self.conn.execute(
+                        "INSERT INTO contacts (key, hash, data, synced_at) VALUES (?, ?, ?, ?)",
+                        (key, hash_, data, started_at),
+                    ).lastrowid
+                    stats["added"] += 1
+                self.conn.execute(
+                    "INSERT INTO contacts_fts (rowid, name, email, employer_name, site_url, phones, telegram) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (rowid, *get_search_fields(contact)),
+                )
+        with self.lock:
+            for row in self.conn.execute(
+                "SELECT id FROM contacts WHERE synced_at < ?", (started_at,)
+            ).fetchall():
+                self._delete_fts(row["id"])
+                stats["deleted"] += 1
+            self.conn.execute("DELETE FROM contacts WHERE synced_at < ?", (started_at,))
+            self.conn.commit()
+        return stats
+
+    def _delete_fts(self, rowid: int) -> None:
+        # Для contentless-таблицы удаляемые значения передаются явно
+        data = self.conn.execute(
+            "SELECT data FROM contacts WHERE id = ?", (rowid,)
+        ).fetchone()[0]
+        self.conn.execute(
+            "INSERT INTO contacts_fts (contacts_fts, rowid, name, email, employer_name, site_url, phones, telegram) VALUES ('delete', ?, ?, ?, ?, ?, ?, ?)",
+            (rowid, *get_search_fields(json.loads(data))),
+        )
+
+    def search(self, search: str = "", page: int = 1, per_page: int = 10) -> dict:
+        """Результат в том же формате, что отдает сервер телеметрии."""
+        offset = (max(1, page) - 1) * per_page
+        query = make_fts_query(search)
+        with self.lock:
+            if query:
+                total = self.conn.execute(
+                    "SELECT COUNT(*) FROM contacts_fts WHERE contacts_fts MATCH ?",
+                    (query,),
+                ).fetchone()[0]
+                rows = self.conn.execute(
+                    """
+                    SELECT c.data FROM contacts_fts f
+                    JOIN contacts c ON c.id = f.rowid
+                    WHERE contacts_fts MATCH ?
+                    ORDER BY bm25(contacts_fts), c.id DESC
+                    LIMIT ? OFFSET ?
+                    """,
+                    (query, per_page, offset),
+                ).fetchall()
+            else:
+                total = self.conn.execute("SELECT COUNT(*) FROM contacts").fetchone()[0]
+                rows = self.conn.execute(
+                    "SELECT data FROM contacts ORDER BY id DESC LIMIT ? OFFSET ?",
+                    (per_page, offset),
+                ).fetchall()
+        return {
+            "page": page,
+            "per_page": per_page,
+            "total": total,
+            "contact_persons": [json.loads(row[0]) for row in rows],
+        }
+
+    def iter_all(self, search: str = "", per_page: int = 500) -> Iterable[dict]:
+        page = 1
+        while items := self.search(search, page, per_page)["contact_persons"]:
+            yield from items
+            page += 1
@@ -0,0 +1,121 @@
+"""Разбор cron-выражений
+
+Поддерживается стандартный формат из пяти полей (минуты, часы, день месяца,
+месяц, день недели) со списками, диапазонами, шагами и названиями месяцев и
+дней недели, а также сокращения вида @daily. @reboot означает однократный
+запуск при старте.
+"""
+
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+
+__all__ = ("CronError", "CronExpression")
+
+ALIASES = {
+    "@yearly": "0 0 1 1 *",
+    "@annually": "0 0 1 1 *",
+    "@monthly": "0 0 1 * *",
+    "@weekly": "0 0 * * 0",
+    "@daily": "0 0 * * *",
+    "@midnight": "0 0 * * *",
+    "@hourly": "0 * * * *",
+}
+
+MONTHS = "jan feb mar apr may jun jul aug sep oct nov dec".split()
+DAYS = "sun mon tue wed thu fri sat".split()
+
+# (минимум, максимум, названия)
+FIELDS = (
+    (0, 59, None),
+    (0, 23, None),
+    (1, 31, None),
+    (1, 12, {name: i for i, name in enumerate(MONTHS, 1)}),
+    (0, 7, {name: i for i, name in enumerate(DAYS)}),
+)
+
+
+class CronError(ValueError):
+    pass
+
+
+def parse_value(value: str, names: dict[str, int] | None) -> int:
+    if names and value.lower() in names:
+        return names[value.lower()]
+    try:
+        return int(value)
+    except ValueError:
+        raise CronError(f"invalid value: {value!r}") from None
+
+
+def parse_field(field: str, lo: int, hi: int, names: dict[str, int] | None) -> set[int]:
+    values = set()
+    for part in field.split(","):
+        expr, _, step = part.partition("/")
+        step = parse_value(step, None) if step else 1
+        if step < 1:
+            raise CronError(f"invalid step: {part!r}")
+        if expr == "*":
+            start, end = lo, hi
+        elif "-" in expr:
+            start, end = (parse_value(v, names) for v in expr.split("-", 1))
+        else:
+            start = parse_value(expr, names)
+            # 5/15 — с 5 до конца с шагом 15
+            end = hi if step > 1 else start
+        if not lo <= start <= end <= hi:
+            raise CronError(f"value out of range: {part!r}")
+        values.update(range(start, end + 1, step))
+    return values
+
+
+class CronExpression:
+    def __init__(self, expr: str) -> None:
+        self.expr = expr.strip()
+        self.reboot = self.expr == "@reboot"
+        if self.reboot:
+            return
+        fields = ALIASES.get(self.expr, self.expr).split()
+        if len(fields) != 5:
+            raise CronError(f"expected 5 fields: {expr!r}")
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            parse_field(field, *spec) for field, spec in zip(fields, FIELDS)
+        )
+        # 0 и 7 — воскресенье
+        self.weekdays = {d % 7 for d in weekdays}
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}({self.expr!r})"
+
+    def match_day(self, dt: datetime) -> bool:
+        day = dt.day in self.days
+        # В cron воскресенье — 0, у isoweekday — 7
+        weekday = dt.isoweekday() % 7 in self.weekdays
+        # Если ограничены оба поля, достаточно совпадения любого
+        if self.any_day or self.any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def next_after(self, dt: datetime) -> datetime | None:
+        """Ближайшее время запуска строго после dt, для @reboot — None."""
+        if self.reboot:
+            return None
+        dt = dt.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        # Выражение вроде 0 0 30 2 * никогда не срабатывает
+        limit = dt + timedelta(days=366 * 5)
+        while dt < limit:
+            if dt.month not in self.months:
+                dt = (dt.replace(day=1) + timedelta(days=32)).replace(
+                    day=1, hour=0, minute=0
+                )
+            elif not self.match_day(dt):
+                dt = dt.replace(hour=0, minute=0) + timedelta(days=1)
+            elif dt.hour not in self.hours:
+                dt = dt.replace(minute=0) + timedelta(hours=1)
+            elif dt.minute not in self.minutes:
+                dt += timedelta(minutes=1)
+            else:
+                return dt
+        return None
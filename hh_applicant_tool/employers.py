@@ -0,0 +1,102 @@
+"""Информация о работодателях
+
+Работодатели сохраняются в data.sqlite и считаются актуальными ttl секунд.
+Недостающие запрашиваются параллельно, частоту запросов ограничивает
+RateLimiter клиента.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterable
+
+from .api import ApiClient, ApiError
+from .storage import SQLiteStorage
+
+__all__ = ("EmployerStore", "EmployerService")
+
+logger = logging.getLogger(__package__)
+
+
+class EmployerStore(SQLiteStorage):
+    schema = """
+    CREATE TABLE IF NOT EXISTS employers (
+        id INTEGER PRIMARY KEY,
+        data TEXT NOT NULL,
+        fetched_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS employers_fetched_at ON employers (fetched_at);
+    """
+
+    def get_many(self, ids: Iterable[str], ttl: float) -> dict[str, dict]:
+        ids = list(ids)
+        rv = {}
+        # У SQLite ограничение на количество параметров запроса
+        for i in range(0, len(ids), 500):
+            chunk = ids[i : i + 500]
+            with self.lock:
+                rows = self.conn.execute(
+                    f"SELECT id, data FROM employers WHERE fetched_at > ? AND id IN ({', '.join('?' * len(chunk))})",
+                    (time.time() - ttl, *map(int, chunk)),
+                ).fetchall()
+            rv.update((str(row[0]), json.loads(row[1])) for row in rows)
+        return rv
+
+    def set_many(self, employers: dict[str, dict]) -> None:
+        now = time.time()
+        with self.lock:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO employers VALUES (?, ?, ?)",
+                [
+                    (int(id_), json.dumps(data, ensure_ascii=False), now)
+                    for id_, data in employers.items()
+                ],
+            )
+            self.conn.commit()
+
+
+class EmployerService:
+    def __init__(
+        self,
+        api_client: ApiClient,
+        store: EmployerStore,
+        *,
+        ttl: float = 7 * 86400,
+        workers: int = 4,
+    ) -> None:
+        self.api_client = api_client
+        self.store = store
+        self.ttl = ttl
+        self.workers = max(1, workers)
+
+    def _fetch(self, employer_id: str) -> dict | None:
+        try:
+            return self.api_client.get(f"/employers/{employer_id}")
+        except ApiError as ex:
+            logger.error(ex)
+            return None
+
+    def get_many(self, ids: Iterable[str]) -> dict[str, dict]:
+        """Возвращает работодателей по ID, недоступные пропускаются."""
+        ids = list(dict.fromkeys(filter(None, ids)))
+        rv = self.store.get_many(ids, self.ttl)
+        misses = [x for x in ids if x not in rv]
+        logger.debug("employers: %d cached, %d to fetch", len(rv), len(misses))
+        if not misses:
+            return rv
+        with ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="employers"
+        ) as executor:
+            fetched = {
+                employer_id: employer
+                for employer_id, employer in zip(
+                    misses, executor.map(self._fetch, misses)
+                )
+                if employer is not None
+            }
+        self.store.set_many(fetched)
+        rv.update(fetched)
+        return rv
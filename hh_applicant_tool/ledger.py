@@ -0,0 +1,133 @@
+"""История вакансий, которые видели и на которые откликались"""
+
+from __future__ import annotations
+
+import time
+from typing import Iterator
+
+from .storage import SQLiteStorage
+from .utils import make_hash
+
+__all__ = ("APPLIED", "FINAL_OUTCOMES", "Ledger")
+
+APPLIED = "applied"
+HAS_TEST = "has_test"
+ARCHIVED = "archived"
+# На вакансию откликались не через утилиту либо пришел отказ/приглашение
+HAS_RELATIONS = "has_relations"
+ERROR = "error"
+
+# Вакансии с таким результатом при следующих запусках пропускаются без
+# обработки. После ошибки пробуем снова.
+FINAL_OUTCOMES = frozenset({APPLIED, HAS_TEST, ARCHIVED, HAS_RELATIONS})
+
+
+class Ledger(SQLiteStorage):
+    schema = """
+    CREATE TABLE IF NOT EXISTS vacancies (
+        resume_id TEXT NOT NULL,
+        vacancy_id INTEGER NOT NULL,
+        employer_id INTEGER,
+        name TEXT,
+        url TEXT,
+        outcome TEXT NOT NULL,
+        letter_hash TEXT,
+        seen_at REAL NOT NULL,
+        updated_at REAL NOT NULL,
+        PRIMARY KEY (resume_id, vacancy_id)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS vacancies_outcome ON vacancies (resume_id, outcome, updated_at);
+    CREATE INDEX IF NOT EXISTS vacancies_employer ON vacancies (employer_id);
+    CREATE INDEX IF NOT EXISTS vacancies_updated_at ON vacancies (updated_at);
+    """
+
+    def get_known_ids(self, resume_id: str) -> set[int]:
+        """Вакансии, которые можно не обрабатывать повторно.
+
+        Загружаются разом, чтобы проверка в цикле была O(1).
+        """
+        placeholders = ", ".join("?" * len(FINAL_OUTCOMES))
+        with self.lock:
+            rows = self.conn.execute(
+                f"SELECT vacancy_id FROM vacancies WHERE resume_id = ? AND outcome IN ({placeholders})",
+                (resume_id, *FINAL_OUTCOMES),
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def record(
+        self,
+        resume_id: str,
+        vacancy: dict,
+        outcome: str,
+        letter: str | None = None,
+    ) -> None:
+        employer_id = (vacancy.get("employer") or {}).get("id")
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                """
+                INSERT INTO vacancies VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (resume_id, vacancy_id) DO UPDATE SET
+                    outcome = excluded.outcome,
+                    letter_hash = COALESCE(excluded.letter_hash, letter_hash),
+                    updated_at = excluded.updated_at
+                """,
+                (
+                    resume_id,
+                    int(vacancy["id"]),
+                    int(employer_id) if employer_id else None,
+                    vacancy.get("name"),
+                    vacancy.get("alternate_url"),
+                    outcome,
+                    make_hash(letter) if letter else None,
+                    now,
+                    now,
+                ),
+            )
+            self.conn.commit()
+
+    def count_applied_since(self, resume_id: str | None, since: float) -> int:
+        query = "SELECT COUNT(*) FROM vacancies WHERE outcome = ? AND updated_at >= ?"
+        params: list = [APPLIED, since]
+        if resume_id:
+            query += " AND resume_id = ?"
+            params.append(resume_id)
+        with self.lock:
+            return self.conn.execute(query, params).fetchone()[0]
+
+    def first_applied_since(self, since: float) -> float | None:
+        with self.lock:
+            return self.conn.execute(
+                "SELECT MIN(updated_at) FROM vacancies WHERE outcome = ? AND updated_at >= ?",
+                (APPLIED, since),
+            ).fetchone()[0]
+
+    def history(
+        self,
+        resume_id: str | None = None,
+        outcome: str | None = None,
+        limit: int = 50,
+    ) -> Iterator[dict]:
+        query = "SELECT * FROM vacancies WHERE 1"
+        params: list = []
+        if resume_id:
+            query += " AND resume_id = ?"
+            params.append(resume_id)
+        if outcome:
+            query += " AND outcome = ?"
+            params.append(outcome)
+        query += " ORDER BY updated_at DESC LIMIT ?"
+        params.append(limit)
+        with self.lock:
+            rows = self.conn.execute(query, params).fetchall()
+        return map(dict, rows)
+
+    def summary(self, resume_id: str | None = None) -> dict[str, int]:
+        query = "SELECT outcome, COUNT(*) FROM vacancies"
+        params: list = []
+        if resume_id:
+            query += " WHERE resume_id = ?"
+            params.append(resume_id)
+        query += " GROUP BY outcome"
+        with self.lock:
+            return dict(self.conn.execute(query, params).fetchall())
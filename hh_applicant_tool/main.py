@@ -1,15 +1,21 @@
 from __future__ import annotations
 
 import argparse
+import ast
+import json
 import logging
 import sys
+from functools import partial
 from importlib import import_module
 from os import getenv
 from pathlib import Path
-from pkgutil import iter_modules
-from typing import Literal, Sequence
+from typing import Any, Literal, Sequence
 
 from .api import ApiClient
+from .api.cache import ResponseCache
+from .api.rate_limit import RateLimiter
+from .api.retry import RetryBudget, RetryPolicy
+from .api.throttle import AdaptiveThrottle
 from .color_log import ColorHandler
 from .telemetry_client import TelemetryClient
 from .utils import Config, get_config_path
@@ -30,11 +36,72 @@ class BaseOperation:
 
 OPERATIONS = "operations"
 
+MANIFEST_PATH = DEFAULT_CONFIG_PATH.parent / "operations.json"
+
+
+def get_operations_manifest(
+    package_dir: Path, cache_path: Path = MANIFEST_PATH
+) -> dict[str, str | None]:
+    """Имена модулей операций и их описания.
+
+    Описание берется из докстринга класса Operation через ast, без импорта
+    модуля. Результат кешируется, пока не изменятся файлы операций.
+    """
+    files = sorted(
+        p for p in package_dir.glob("*.py") if not p.name.startswith("_")
+    )
+    signature = [[p.name, p.stat().st_mtime_ns, p.stat().st_size] for p in files]
+    try:
+        cached = json.loads(cache_path.read_text())
+        if cached["signature"] == signature:
+            return cached["operations"]
+    except (OSError, ValueError, KeyError):
+        pass
+    operations = {}
+    for p in files:
+        tree = ast.parse(p.read_bytes(), str(p))
+        for node in tree.body:
+            if isinstance(node, ast.ClassDef) and node.name == "Operation":
+                operations[p.stem] = ast.get_docstring(node)
+                break
+    try:
+        cache_path.parent.mkdir(exist_ok=True, parents=True)
+        cache_path.write_text(
+            json.dumps({"signature": signature, "operations": operations})
+        )
+    except OSError as ex:
+        logger.debug("can't save operations manifest: %s", ex)
+    return operations
+
+
+class LazySubParsersAction(argparse._SubParsersAction):
+    """Модуль операции импортируется, только когда она выбрана."""
+
+    def __init__(self, *args: Any, **kwargs: Any) -> None:
+        super().__init__(*args, **kwargs)
+        self.loaders: dict[str, Any] = {}
+
+    def __call__(
+        self,
+        parser: argparse.ArgumentParser,
+        namespace: argparse.Namespace,
+        values: Any,
+        option_string: str | None = None,
+    ) -> None:
+        if loader := self.loaders.pop(values[0], None):
+            loader()
+        super().__call__(parser, namespace, values, option_string)
+
 
 class Namespace(argparse.Namespace):
     config: Config
     verbosity: int
-    delay: float
+    delay: float | None
+    burst: float
+    adaptive_delay: bool
+    max_retries: int
+    retry_budget: int
+    cache: bool
     user_agent: str
     proxy_url: str
     disable_telemetry: bool
@@ -47,19 +114,63 @@ def get_proxies(args: Namespace) -> dict[Literal["http", "https"], str | None]:
     }
 
 
-def get_api_client(args: Namespace) -> ApiClient:
+def get_rate_control(
+    args: Namespace,
+) -> tuple[RateLimiter, AdaptiveThrottle | None]:
+    rate_limiter = RateLimiter.from_config(
+        args.config,
+        ApiClient.delay if args.delay is None else args.delay,
+        args.burst,
+    )
+    throttle = None
+    if args.adaptive_delay:
+        # Частота, подобранная при прошлых запусках, но явно заданная задержка
+        # важнее
+        if args.delay is None and (learned_rate := args.config["adaptive_rate"]):
+            rate_limiter.set_rate(learned_rate)
+        throttle = AdaptiveThrottle(rate_limiter, **(args.config["throttle"] or {}))
+    return rate_limiter, throttle
+
+
+def get_api_client(
+    args: Namespace,
+    # Общие для нескольких клиентов, например, аккаунтов за одним прокси
+    rate_control: tuple[RateLimiter, AdaptiveThrottle | None] | None = None,
+) -> ApiClient:
     token = args.config.get("token", {})
+    rate_limiter, throttle = rate_control or get_rate_control(args)
     api = ApiClient(
         access_token=token.get("access_token"),
         refresh_token=token.get("refresh_token"),
         access_expires_at=token.get("access_expires_at"),
-        delay=args.delay,
+        rate_limiter=rate_limiter,
+        throttle=throttle,
+        retry_policy=RetryPolicy(
+            max_retries=args.max_retries,
+            budget=RetryBudget(args.retry_budget),
+        ),
+        cache=ResponseCache(
+            args.config.path.parent / "cache.sqlite",
+            namespace=str(args.config.path.resolve()),
+        )
+        if args.cache
+        else None,
         user_agent=args.config["user_agent"],
         proxies=get_proxies(args),
     )
     return api
 
 
+def save_client_state(config: Config, api_client: ApiClient) -> None:
+    """Сохраняет обновленный токен и подобранную частоту запросов."""
+    if (token := api_client.get_access_token()) != config["token"]:
+        config.save(token=token)
+    if api_client.throttle and (
+        rate := round(api_client.throttle.rate, 3)
+    ) != config["adaptive_rate"]:
+        config.save(adaptive_rate=rate)
+
+
 class HHApplicantTool:
     """Утилита для автоматизации действий соискателя на сайте hh.ru.
 
@@ -97,8 +208,37 @@ class HHApplicantTool:
             "-d",
             "--delay",
             type=float,
-            default=0.334,
-            help="Задержка между запросами к API HH",
+            help=f"Средняя задержка между запросами к API HH (задает устойчивую частоту запросов). По умолчанию: {ApiClient.delay}",
+        )
+        parser.add_argument(
+            "--burst",
+            type=float,
+            default=1.0,
+            help="Сколько запросов к API HH можно отправить одновременно без задержки",
+        )
+        parser.add_argument(
+            "--adaptive-delay",
+            default=True,
+            action=argparse.BooleanOptionalAction,
+            help="Подстраивать частоту запросов под ответы сервера и запоминать ее между запусками. Запомненная частота не используется, если задан --delay",
+        )
+        parser.add_argument(
+            "--max-retries",
+            type=int,
+            default=3,
+            help="Сколько раз повторять GET/PUT/DELETE запрос при временной ошибке сервера",
+        )
+        parser.add_argument(
+            "--retry-budget",
+            type=int,
+            default=100,
+            help="Максимальное количество повторов запросов за запуск",
+        )
+        parser.add_argument(
+            "--cache",
+            default=True,
+            action=argparse.BooleanOptionalAction,
+            help="Кешировать редко меняющиеся ответы API (/me, /resumes/mine, черный список) в cache.sqlite рядом с конфигом",
         )
         parser.add_argument("--user-agent", help="User-Agent для каждого запроса")
         parser.add_argument(
@@ -110,21 +250,30 @@ class HHApplicantTool:
             action=argparse.BooleanOptionalAction,
             help="Отключить телеметрию",
         )
-        subparsers = parser.add_subparsers(help="commands")
+        subparsers = parser.add_subparsers(
+            help="commands", action=LazySubParsersAction
+        )
         package_dir = Path(__file__).resolve().parent / OPERATIONS
-        for _, module_name, _ in iter_modules([str(package_dir)]):
-            mod = import_module(f"{__package__}.{OPERATIONS}.{module_name}")
-            op: BaseOperation = mod.Operation()
+        for module_name, doc in get_operations_manifest(package_dir).items():
+            op_name = module_name.replace("_", "-")
             op_parser = subparsers.add_parser(
-                module_name.replace("_", "-"),
-                description=op.__doc__,
+                op_name,
+                description=doc,
                 formatter_class=self.ArgumentFormatter,
             )
-            op_parser.set_defaults(run=op.run)
-            op.setup_parser(op_parser)
+            subparsers.loaders[op_name] = partial(
+                self._load_operation, module_name, op_parser
+            )
         parser.set_defaults(run=None)
         return parser
 
+    @staticmethod
+    def _load_operation(module_name: str, op_parser: argparse.ArgumentParser) -> None:
+        mod = import_module(f"{__package__}.{OPERATIONS}.{module_name}")
+        op: BaseOperation = mod.Operation()
+        op_parser.set_defaults(run=op.run)
+        op.setup_parser(op_parser)
+
     def run(self, argv: Sequence[str] | None) -> None | int:
         parser = self.create_parser()
         args = parser.parse_args(argv, namespace=Namespace())
@@ -136,20 +285,7 @@ class HHApplicantTool:
         logger.addHandler(handler)
         if args.run:
             try:
-                if not args.config["telemetry_client_id"]:
-                    import uuid
-
-                    args.config.save(telemetry_client_id=str(uuid.uuid4()))
-                api_client = get_api_client(args)
-                telemetry_client = TelemetryClient(
-                    telemetry_client_id=args.config["telemetry_client_id"],
-                    proxies=api_client.proxies.copy(),
-                )
-                # 0 or None = success
-                res = args.run(args, api_client, telemetry_client)
-                if (token := api_client.get_access_token()) != args.config["token"]:
-                    args.config.save(token=token)
-                return res
+                return self.run_operation(args)
             except KeyboardInterrupt:
                 logger.warning("Interrupted by user")
                 return 1
@@ -159,6 +295,38 @@ class HHApplicantTool:
         parser.print_help(file=sys.stderr)
         return 2
 
+    def parse_operation_args(self, args: Namespace, argv: Sequence[str]) -> Namespace:
+        """Разбирает аргументы операции, глобальные опции берет из args."""
+        parser = self.create_parser()
+        defaults = parser.parse_args([], namespace=Namespace())
+        child = parser.parse_args(argv, namespace=Namespace())
+        for key in vars(defaults).keys() - {"run"}:
+            setattr(child, key, getattr(args, key))
+        return child
+
+    def run_operation(
+        self,
+        args: Namespace,
+        rate_control: tuple[RateLimiter, AdaptiveThrottle | None] | None = None,
+    ) -> None | int:
+        if not args.config["telemetry_client_id"]:
+            import uuid
+
+            args.config.save(telemetry_client_id=str(uuid.uuid4()))
+        api_client = get_api_client(args, rate_control)
+        telemetry_client = TelemetryClient(
+            telemetry_client_id=args.config["telemetry_client_id"],
+            proxies=api_client.proxies.copy(),
+            # Телеметрия идет через тот же прокси, общий лимит не дает
+            # превысить частоту запросов
+            rate_limiter=api_client.rate_limiter,
+        )
+        # 0 or None = success
+        res = args.run(args, api_client, telemetry_client)
+        logger.debug("Rate limiter stats: %r", api_client.rate_limiter.stats())
+        save_client_state(args.config, api_client)
+        return res
+
 
 def main(argv: Sequence[str] | None = None) -> None | int:
     return HHApplicantTool().run(argv)
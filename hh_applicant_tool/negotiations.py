@@ -0,0 +1,103 @@
+"""Локальное состояние откликов для инкрементальной синхронизации
+
+Для каждого отклика запоминаются updated_at, количество сообщений и последние
+сообщения переписки. Сообщения запрашиваются заново только для изменившихся
+откликов, а обход списка прекращается на отметке предыдущего запуска.
+"""
+
+from __future__ import annotations
+
+import json
+import time
+from dataclasses import dataclass
+
+from .storage import SQLiteStorage
+from .utils import parse_invalid_datetime
+
+__all__ = ("NegotiationState", "NegotiationStore", "is_before")
+
+
+@dataclass
+class NegotiationState:
+    id: str
+    updated_at: str
+    messages_count: int | None
+    last_message_id: str | None
+    # employer либо applicant
+    last_author: str | None
+    # Первое и последние сообщения в формате "<- текст"/"-> текст"
+    history: list[str]
+
+    @staticmethod
+    def get_messages_count(negotiation: dict) -> int | None:
+        return (negotiation.get("counters") or {}).get("messages")
+
+    def is_changed(self, negotiation: dict) -> bool:
+        return (
+            self.updated_at != negotiation.get("updated_at")
+            or self.messages_count != self.get_messages_count(negotiation)
+        )
+
+
+class NegotiationStore(SQLiteStorage):
+    schema = """
+    CREATE TABLE IF NOT EXISTS negotiations (
+        id TEXT PRIMARY KEY,
+        updated_at TEXT NOT NULL,
+        messages_count INTEGER,
+        last_message_id TEXT,
+        last_author TEXT,
+        history TEXT NOT NULL,
+        synced_at REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS sync_state (
+        name TEXT PRIMARY KEY,
+        value TEXT NOT NULL
+    );
+    """
+
+    def get(self, nid: str) -> NegotiationState | None:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT id, updated_at, messages_count, last_message_id, last_author, history FROM negotiations WHERE id = ?",
+                (nid,),
+            ).fetchone()
+        if not row:
+            return None
+        return NegotiationState(*row[:-1], history=json.loads(row[-1]))
+
+    def save(self, state: NegotiationState) -> None:
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO negotiations VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (
+                    state.id,
+                    state.updated_at,
+                    state.messages_count,
+                    state.last_message_id,
+                    state.last_author,
+                    json.dumps(state.history, ensure_ascii=False),
+                    time.time(),
+                ),
+            )
+            self.conn.commit()
+
+    def get_high_water_mark(self, name: str) -> str | None:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value FROM sync_state WHERE name = ?", (name,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set_high_water_mark(self, name: str, value: str) -> None:
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO sync_state VALUES (?, ?)", (name, value)
+            )
+            self.conn.commit()
+
+
+def is_before(updated_at: str, mark: str | None) -> bool:
+    return mark is not None and parse_invalid_datetime(
+        updated_at
+    ) < parse_invalid_datetime(mark)
@@ -1,19 +1,30 @@
 import argparse
+import dataclasses
 import logging
 import random
 import time
 from collections import defaultdict
 from datetime import datetime, timedelta, timezone
-from typing import TextIO
+from itertools import islice
+from threading import Lock
+from typing import Iterator, TextIO
 
+from .. import ledger, vacancy_filters
 from ..api.errors import LimitExceeded
 from ..ai.blackbox import BlackboxChat, BlackboxError
 from ..api import ApiError, ApiClient
+from ..api.paginator import Paginator
+from ..ledger import Ledger
+from ..employers import EmployerService, EmployerStore
 from ..main import BaseOperation
 from ..main import Namespace as BaseNamespace
 from ..mixins import GetResumeIdMixin
-from ..telemetry_client import TelemetryClient, TelemetryError
-from ..types import ApiListResponse, VacancyItem
+from ..pipeline import Pipeline
+from ..quota import QuotaStore, get_max_salary, score_vacancy
+from ..storage import get_data_path, get_spool_path
+from ..telemetry_client import TelemetryClient
+from ..telemetry_uploader import TelemetryUploader
+from ..types import VacancyItem
 from ..utils import (
     fix_datetime,
     parse_interval,
@@ -21,9 +32,13 @@ from ..utils import (
     random_text,
     truncate_string,
 )
+from ..vacancy_filters import FilterSpec
 
 logger = logging.getLogger(__package__)
 
+# Сколько подходящих вакансий сортируется по score_vacancy за раз
+RANK_WINDOW = 100
+
 
 class Namespace(BaseNamespace):
     resume_id: str | None
@@ -36,6 +51,12 @@ class Namespace(BaseNamespace):
     order_by: str
     search: str
     dry_run: bool
+    retry_apply: bool
+    employer_workers: int
+    letter_workers: int
+    skip_known: bool
+    ignore_quota: bool
+    exclude: str | None
 
 
 class Operation(BaseOperation, GetResumeIdMixin):
@@ -78,7 +99,7 @@ class Operation(BaseOperation, GetResumeIdMixin):
         )
         parser.add_argument(
             "--page-interval",
-            help="Интервал перед получением следующей страницы рекомендованных вакансий в секундах (X, X-Y)",
+            help="Интервал перед получением следующей страницы рекомендованных вакансий в секундах (X, X-Y). Страницы скачиваются в несколько потоков, интервал выдерживается каждым из них.",
             default="1-3",
             type=parse_interval,
         )
@@ -100,12 +121,46 @@ class Operation(BaseOperation, GetResumeIdMixin):
             type=str,
             default=None,
         )
+        parser.add_argument(
+            "--exclude",
+            help="Пропускать вакансии, в названии или описании которых есть любое из этих слов, например, 'стажер 1с'",
+        )
         parser.add_argument(
             "--dry-run",
             help="Не отправлять отклики, а только выводить параметры запроса",
             default=False,
             action=argparse.BooleanOptionalAction,
         )
+        parser.add_argument(
+            "--employer-workers",
+            help="Количество потоков для получения информации о работодателях",
+            default=4,
+            type=int,
+        )
+        parser.add_argument(
+            "--letter-workers",
+            help="Количество потоков для генерации сопроводительных писем",
+            default=2,
+            type=int,
+        )
+        parser.add_argument(
+            "--skip-known",
+            help="Пропускать вакансии, которые уже обработаны при предыдущих запусках (см. операцию history). При сортировке по publication_time обход останавливается, как только пошли одни старые вакансии.",
+            default=True,
+            action=argparse.BooleanOptionalAction,
+        )
+        parser.add_argument(
+            "--ignore-quota",
+            help="Не учитывать суточный лимит откликов, вычисленный при предыдущих запусках",
+            default=False,
+            action=argparse.BooleanOptionalAction,
+        )
+        parser.add_argument(
+            "--retry-apply",
+            help="Повторять отклик при временной ошибке сервера. Перед повтором проверяется, не был ли отклик уже отправлен.",
+            default=False,
+            action=argparse.BooleanOptionalAction,
+        )
 
     def run(
         self, args: Namespace, api_client: ApiClient, telemetry_client: TelemetryClient
@@ -126,6 +181,11 @@ class Operation(BaseOperation, GetResumeIdMixin):
             #     logger.info("Спасибо за то что оставили телеметрию включенной!")
             self.enable_telemetry = False
 
+        if args.retry_apply and api_client.retry_policy:
+            api_client.retry_policy = dataclasses.replace(
+                api_client.retry_policy, retry_apply=True
+            )
+
         self.api_client = api_client
         self.telemetry_client = telemetry_client
         self.resume_id = args.resume_id or self._get_resume_id()
@@ -148,7 +208,48 @@ class Operation(BaseOperation, GetResumeIdMixin):
         self.order_by = args.order_by
         self.search = args.search
         self.dry_run = args.dry_run
-        self._apply_similar()
+        # Вакансии с откликом отсеиваются позже, они нужны для телеметрии
+        self.prefilter = FilterSpec(
+            exclude_terms=FilterSpec.split_terms(args.exclude),
+            skip_has_test=True,
+            skip_archived=True,
+        ).compile()
+        self.relations_filter = FilterSpec(skip_relations=True).compile()
+        self.letter_workers = args.letter_workers
+        self.ledger = Ledger(get_data_path(args.config))
+        self.known_ids = (
+            self.ledger.get_known_ids(self.resume_id) if args.skip_known else set()
+        )
+        logger.debug("Известных вакансий: %d", len(self.known_ids))
+        self.quota_store = QuotaStore(get_data_path(args.config), self.ledger)
+        self.employer_store = EmployerStore(get_data_path(args.config))
+        self.employer_service = EmployerService(
+            api_client, self.employer_store, workers=args.employer_workers
+        )
+        # Телеметрия отправляется в фоне по мере сбора
+        self.telemetry_uploader = (
+            TelemetryUploader(telemetry_client, get_spool_path(args.config))
+            if self.enable_telemetry and not self.dry_run
+            else None
+        )
+        try:
+            quota = self.quota_store.get()
+            if quota.is_exhausted and not args.ignore_quota:
+                print(
+                    "⚠️ Суточный лимит откликов исчерпан, сбросится",
+                    datetime.fromtimestamp(quota.reset_at or time.time()).strftime(
+                        "%Y-%m-%d %H:%M"
+                    ),
+                )
+                return
+            self.limit = None if args.ignore_quota else quota.remaining
+            self._apply_similar()
+        finally:
+            if self.telemetry_uploader:
+                self.telemetry_uploader.close()
+            self.employer_store.close()
+            self.quota_store.close()
+            self.ledger.close()
 
     def _get_application_messages(self, message_list: TextIO | None) -> list[str]:
         if message_list:
@@ -161,146 +262,36 @@ class Operation(BaseOperation, GetResumeIdMixin):
         return application_messages
 
     def _apply_similar(self) -> None:
-        telemetry_client = self.telemetry_client
-        telemetry_data = defaultdict(dict)
-
-        vacancies = self._get_vacancies()
-
-        if self.enable_telemetry:
-            for vacancy in vacancies:
-                vacancy_id = vacancy["id"]
-                telemetry_data["vacancies"][vacancy_id] = {
-                    "name": vacancy.get("name"),
-                    "type": vacancy.get("type", {}).get("id"),  # open/closed
-                    "area": vacancy.get("area", {}).get("name"),  # город
-                    "salary": vacancy.get("salary"),  # from, to, currency, gross
-                    "direct_url": vacancy.get("alternate_url"),  # ссылка на вакансию
-                    "created_at": fix_datetime(
-                        vacancy.get("created_at")
-                    ),  # будем вычислять говно-вакансии, которые по полгода висят
-                    "published_at": fix_datetime(vacancy.get("published_at")),
-                    "contacts": vacancy.get(
-                        "contacts"
-                    ),  # пиздорванки там телеграм для связи указывают
-                    # HH с точки зрения перфикциониста — кусок говна, где кривые
-                    # форматы даты, у вакансий может не быть работодателя...
-                    "employer_id": int(vacancy["employer"]["id"])
-                    if "employer" in vacancy and "id" in vacancy["employer"]
-                    else None,
-                    # "relations": vacancy.get("relations", []),
-                    # Остальное неинтересно
-                }
+        self.telemetry_data = defaultdict(dict)
+        self.telemetry_lock = Lock()
+        # Работодатели, по которым уже собрана телеметрия либо пришел отказ
+        self.processed_employers = set()
 
         me = self.api_client.get("/me")
 
-        basic_message_placeholders = {
+        self.basic_message_placeholders = {
             "first_name": me.get("first_name", ""),
             "last_name": me.get("last_name", ""),
             "email": me.get("email", ""),
             "phone": me.get("phone", ""),
         }
 
-        do_apply = True
-        complained_employers = set()
+        self.paginator = self._get_paginator()
+        # Сколько уже обработанных вакансий встретилось подряд
+        self.known_streak = 0
+        candidates = self._iter_candidates()
+        if self.limit is not None:
+            logger.info("Осталось откликов: %d", self.limit)
+            candidates = islice(candidates, self.limit)
+
+        # Медленная генерация письма не задерживает отправку уже готовых
+        # откликов. С задержкой отправляются только сами отклики.
+        pipeline = Pipeline(candidates).add_stage(
+            "letters", self._compose_application, self.letter_workers
+        )
 
-        for vacancy in vacancies:
+        for vacancy, params in pipeline:
             try:
-                message_placeholders = {
-                    "vacancy_name": vacancy.get("name", ""),
-                    "employer_name": vacancy.get("employer", {}).get("name", ""),
-                    **basic_message_placeholders,
-                }
-
-                logger.debug(
-                    "Вакансия %(vacancy_name)s от %(employer_name)s"
-                    % message_placeholders
-                )
-
-                if vacancy.get("has_test"):
-                    logger.debug(
-                        "Пропускаем вакансию с тестом: %s",
-                        vacancy["alternate_url"],
-                    )
-                    continue
-
-                if vacancy.get("archived"):
-                    logger.warning(
-                        "Пропускаем вакансию в архиве: %s",
-                        vacancy["alternate_url"],
-                    )
-                    continue
-
-                relations = vacancy.get("relations", [])
-                employer_id = vacancy.get("employer", {}).get("id")
-
-                if (
-                    self.enable_telemetry
-                    and employer_id
-                    and employer_id not in telemetry_data["employers"]
-                    and employer_id not in complained_employers
-                    and (
-                        not relations
-                        or parse_invalid_datetime(vacancy["created_at"])
-                        + timedelta(days=7)
-                        > datetime.now(tz=timezone.utc)
-                    )
-                ):
-                    employer = self.api_client.get(f"/employers/{employer_id}")
-
-                    employer_data = {
-                        "name": employer.get("name"),
-                        "type": employer.get("type"),
-                        "description": employer.get("description"),
-                        "site_url": employer.get("site_url"),
-                        "area": employer.get("area", {}).get("name"),  # город
-                    }
-                    if "got_rejection" in relations:
-                        print(
-                            "🚨 Вы получили отказ от https://hh.ru/employer/%s"
-                            % employer_id
-                        )
-
-                        complained_employers.add(employer_id)
-
-                    elif do_apply:
-                        telemetry_data["employers"][employer_id] = employer_data
-
-                if not do_apply:
-                    logger.debug("Останавливаем рассылку откликов, так как достигли лимита, попробуйте через сутки.")
-                    break
-
-                if relations:
-                    logger.debug(
-                        "Пропускаем вакансию с откликом: %s",
-                        vacancy["alternate_url"],
-                    )
-                    continue
-
-                params = {
-                    "resume_id": self.resume_id,
-                    "vacancy_id": vacancy["id"],
-                    "message": "",
-                }
-
-                if self.force_message or vacancy.get("response_letter_required"):
-                    if self.chat:
-                        try:
-                            msg = self.pre_prompt + "\n\n"
-                            msg += message_placeholders["vacancy_name"]
-                            logger.debug(msg)
-                            msg = self.chat.send_message(msg)
-                        except BlackboxError as ex:
-                            logger.error(ex)
-                            continue
-                    else:
-                        msg = (
-                            random_text(random.choice(self.application_messages))
-                            % message_placeholders
-                        )
-
-                    logger.debug(msg)
-                    params["message"] = msg
-
                 if self.dry_run:
                     logger.info(
                         "Dry Run: Отправка отклика на вакансию %s с параметрами: %s",
@@ -317,6 +308,7 @@ class Operation(BaseOperation, GetResumeIdMixin):
 
                 res = self.api_client.post("/negotiations", params)
                 assert res == {}
+                self._record(vacancy, ledger.APPLIED, params["message"])
                 print(
                     "📨 Отправили отклик",
                     vacancy["alternate_url"],
@@ -325,52 +317,236 @@ class Operation(BaseOperation, GetResumeIdMixin):
                     ")",
                 )
             except LimitExceeded:
-                print("⚠️ Достигли лимита рассылки")
-                do_apply = False
+                quota = self.quota_store.exhausted()
+                print("⚠️ Достигли лимита рассылки (%d в сутки)" % quota.daily_limit)
+                logger.debug(
+                    "Останавливаем рассылку откликов, так как достигли лимита, попробуйте через сутки."
+                )
+                pipeline.stop()
+                break
             except ApiError as ex:
                 logger.error(ex)
+                self._record(vacancy, ledger.ERROR)
 
         print("📝 Отклики на вакансии разосланы!")
 
+        if self.enable_telemetry and self.dry_run:
+            # С --dry-run можно посмотреть что отправляется
+            logger.info(
+                "Dry Run: Данные телеметрии для отправки на сервер: %r",
+                self.telemetry_data,
+            )
+
+    def _collect(self, kind: str, key: str, value: dict) -> None:
+        if self.telemetry_uploader:
+            self.telemetry_uploader.add("/collect", kind, value, key)
+        else:
+            with self.telemetry_lock:
+                self.telemetry_data[kind][key] = value
+
+    def _record(self, vacancy: VacancyItem, outcome: str, letter: str = "") -> None:
+        if not self.dry_run:
+            self.ledger.record(self.resume_id, vacancy, outcome, letter)
+
+    def _filter_vacancy(self, vacancy: VacancyItem) -> VacancyItem | None:
+        if int(vacancy["id"]) in self.known_ids:
+            self.known_streak += 1
+            # Новые вакансии идут первыми, значит дальше все уже видели
+            if (
+                self.order_by == "publication_time"
+                and self.known_streak >= self.paginator.params["per_page"]
+            ):
+                logger.debug("Дальше идут уже обработанные вакансии")
+                self.paginator.stop()
+            return None
+        self.known_streak = 0
+
         if self.enable_telemetry:
-            if self.dry_run:
-                # С --dry-run можно посмотреть что отправляется
-                logger.info(
-                    "Dry Run: Данные телеметрии для отправки на сервер: %r",
-                    telemetry_data,
-                )
-                return
+            self._collect(
+                "vacancies", vacancy["id"], self._get_vacancy_telemetry(vacancy)
+            )
 
-            try:
-                response = telemetry_client.send_telemetry(
-                    "/collect", dict(telemetry_data)
+        logger.debug(
+            "Вакансия %s от %s",
+            vacancy.get("name", ""),
+            vacancy.get("employer", {}).get("name", ""),
+        )
+
+        match self.prefilter.reject_reason(vacancy):
+            case None:
+                return vacancy
+            case vacancy_filters.HAS_TEST:
+                logger.debug(
+                    "Пропускаем вакансию с тестом: %s",
+                    vacancy["alternate_url"],
                 )
-                logger.debug(response)
-            except TelemetryError as ex:
-                logger.error(ex)
+                self._record(vacancy, ledger.HAS_TEST)
+            case vacancy_filters.ARCHIVED:
+                logger.warning(
+                    "Пропускаем вакансию в архиве: %s",
+                    vacancy["alternate_url"],
+                )
+                self._record(vacancy, ledger.ARCHIVED)
+            case vacancy_filters.EXCLUDED:
+                # Не записываем: с другими --exclude вакансия может подойти
+                logger.debug(
+                    "Пропускаем вакансию по исключенным словам: %s",
+                    vacancy["alternate_url"],
+                )
+        return None
+
+    def _needs_employer(self, vacancy: VacancyItem) -> bool:
+        relations = vacancy.get("relations", [])
+        return bool(
+            self.enable_telemetry
+            and vacancy.get("employer", {}).get("id")
+            and (
+                not relations
+                or parse_invalid_datetime(vacancy["created_at"]) + timedelta(days=7)
+                > datetime.now(tz=timezone.utc)
+            )
+        )
 
-    def _get_vacancies(self, per_page: int = 100) -> list[VacancyItem]:
+    def _iter_candidates(self) -> Iterator[VacancyItem]:
+        """Подходящие вакансии, лучшие раньше.
+
+        Сортируются окна по RANK_WINDOW вакансий, а не весь список: отклики
+        начинают отправляться после первой страницы, а в памяти не держатся
+        все 2000 вакансий. Когда лимит откликов исчерпан, чтение прекращается.
+        """
+        filtered = iter(
+            Pipeline(iter(self.paginator)).add_stage("filter", self._filter_vacancy)
+        )
+        try:
+            while window := list(islice(filtered, RANK_WINDOW)):
+                candidates = self._enrich_employers(window)
+                # Лимит тратим в первую очередь на лучшие вакансии
+                max_salary = get_max_salary(candidates)
+                candidates.sort(
+                    key=lambda v: score_vacancy(v, max_salary), reverse=True
+                )
+                yield from candidates
+        finally:
+            # Лимит исчерпан — останавливаем чтение страниц
+            filtered.close()
+
+    def _enrich_employers(self, vacancies: list[VacancyItem]) -> list[VacancyItem]:
+        # Каждый работодатель запрашивается один раз за запуск, а с учетом
+        # кеша — раз в несколько дней
+        employers = self.employer_service.get_many(
+            v["employer"]["id"] for v in vacancies if self._needs_employer(v)
+        )
         rv = []
-        for page in range(20):
-            params = {
-                "page": page,
-                "per_page": per_page,
-                "order_by": self.order_by,
-            }
-            if self.search:
-                params["text"] = self.search
-            res: ApiListResponse = self.api_client.get(
-                f"/resumes/{self.resume_id}/similar_vacancies", params
-            )
-            rv.extend(res["items"])
-            if page >= res["pages"] - 1:
-                break
+        reasons = self.relations_filter.evaluate_many(vacancies)
+        for vacancy, reason in zip(vacancies, reasons):
+            relations = vacancy.get("relations", [])
+            employer_id = vacancy.get("employer", {}).get("id")
+
+            if (
+                self._needs_employer(vacancy)
+                and employer_id not in self.processed_employers
+                and (employer := employers.get(employer_id)) is not None
+            ):
+                self.processed_employers.add(employer_id)
+                employer_data = {
+                    "name": employer.get("name"),
+                    "type": employer.get("type"),
+                    "description": employer.get("description"),
+                    "site_url": employer.get("site_url"),
+                    "area": employer.get("area", {}).get("name"),  # город
+                }
+                if "got_rejection" in relations:
+                    print(
+                        "🚨 Вы получили отказ от https://hh.ru/employer/%s"
+                        % employer_id
+                    )
+                else:
+                    self._collect("employers", employer_id, employer_data)
 
-            # Задержка перед получением следующей страницы
-            if page > 0:
-                interval = random.uniform(
-                    self.page_min_interval, self.page_max_interval
+            if reason == vacancy_filters.HAS_RELATIONS:
+                logger.debug(
+                    "Пропускаем вакансию с откликом: %s",
+                    vacancy["alternate_url"],
                 )
-                time.sleep(interval)
+                self._record(vacancy, ledger.HAS_RELATIONS)
+                continue
 
+            rv.append(vacancy)
         return rv
+
+    def _compose_application(
+        self, vacancy: VacancyItem
+    ) -> tuple[VacancyItem, dict] | None:
+        message_placeholders = {
+            "vacancy_name": vacancy.get("name", ""),
+            "employer_name": vacancy.get("employer", {}).get("name", ""),
+            **self.basic_message_placeholders,
+        }
+
+        params = {
+            "resume_id": self.resume_id,
+            "vacancy_id": vacancy["id"],
+            "message": "",
+        }
+
+        if self.force_message or vacancy.get("response_letter_required"):
+            if self.chat:
+                try:
+                    msg = self.pre_prompt + "\n\n"
+                    msg += message_placeholders["vacancy_name"]
+                    logger.debug(msg)
+                    msg = self.chat.send_message(msg)
+                except BlackboxError as ex:
+                    logger.error(ex)
+                    return None
+            else:
+                msg = (
+                    random_text(random.choice(self.application_messages))
+                    % message_placeholders
+                )
+
+            logger.debug(msg)
+            params["message"] = msg
+
+        return vacancy, params
+
+    def _get_vacancy_telemetry(self, vacancy: VacancyItem) -> dict:
+        return {
+            "name": vacancy.get("name"),
+            "type": vacancy.get("type", {}).get("id"),  # open/closed
+            "area": vacancy.get("area", {}).get("name"),  # город
+            "salary": vacancy.get("salary"),  # from, to, currency, gross
+            "direct_url": vacancy.get("alternate_url"),  # ссылка на вакансию
+            "created_at": fix_datetime(
+                vacancy.get("created_at")
+            ),  # будем вычислять говно-вакансии, которые по полгода висят
+            "published_at": fix_datetime(vacancy.get("published_at")),
+            "contacts": vacancy.get(
+                "contacts"
+            ),  # пиздорванки там телеграм для связи указывают
+            # HH с точки зрения перфикциониста — кусок говна, где кривые
+            # форматы даты, у вакансий может не быть работодателя...
+            "employer_id": int(vacancy["employer"]["id"])
+            if "employer" in vacancy and "id" in vacancy["employer"]
+            else None,
+            # "relations": vacancy.get("relations", []),
+            # Остальное неинтересно
+        }
+
+    def _get_paginator(self, per_page: int = 100) -> Paginator:
+        params = {
+            "per_page": per_page,
+            "order_by": self.order_by,
+        }
+        if self.search:
+            params["text"] = self.search
+        # Больше 2000 вакансий (20 страниц) API не отдает
+        return Paginator(
+            self.api_client,
+            f"/resumes/{self.resume_id}/similar_vacancies",
+            params,
+            max_pages=20,
+            page_delay=lambda: random.uniform(
+                self.page_min_interval, self.page_max_interval
+            ),
+        )
@@ -74,6 +74,9 @@ class WebViewWindow(QMainWindow):
         if code:
             token = self.api_client.oauth_client.authenticate(code)
             self.api_client.handle_access_token(token)
+            # Ответы прежнего аккаунта больше не нужны
+            if self.api_client.cache:
+                self.api_client.cache.clear()
             print("🔓 Авторизация прошла успешно!")
             self.close()
 
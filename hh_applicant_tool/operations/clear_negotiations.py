@@ -1,13 +1,22 @@
 # Этот модуль можно использовать как образец для других
 import argparse
+import json
 import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
 from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from threading import Lock
 
-from ..api import ApiClient, ClientError
+from ..api import ApiClient
+from ..api.errors import ResourceNotFound
+from ..api.paginator import Paginator
+from ..api.retry import RetryPolicy
 from ..constants import INVALID_ISO8601_FORMAT
 from ..main import BaseOperation
 from ..main import Namespace as BaseNamespace
-from ..types import ApiListResponse
 from ..utils import print_err, truncate_string
 
 logger = logging.getLogger(__package__)
@@ -17,6 +26,87 @@ class Namespace(BaseNamespace):
     older_than: int
     blacklist_discard: bool
     all: bool
+    dry_run: bool
+    export_plan: Path | None
+    workers: int
+    item_retries: int
+    checkpoint: Path | None
+    resume: bool
+
+
+@dataclass
+class PlanItem:
+    # delete либо blacklist
+    action: str
+    # ID отклика либо работодателя
+    id: str
+    name: str
+    url: str | None
+    state: str | None = None
+    decline_allowed: bool = False
+
+    @property
+    def key(self) -> str:
+        return f"{self.action}:{self.id}"
+
+
+class Checkpoint:
+    """Журнал выполнения плана, позволяет продолжить прерванную чистку.
+
+    В JSONL-файл сначала пишутся параметры, с которыми составлен план, и сам
+    план, а потом ключи выполненных пунктов.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.lock = Lock()
+        self.fp = None
+
+    def load(self) -> tuple[dict | None, list[PlanItem], set[str]]:
+        options, plan, done = None, [], set()
+        with self.path.open(encoding="utf-8") as fp:
+            for line in fp:
+                # Последняя строка может быть недописана при аварийном завершении
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                kind = record.pop("type")
+                if kind == "options":
+                    options = record
+                elif kind == "plan":
+                    plan.append(PlanItem(**record))
+                elif kind == "done":
+                    done.add(record["key"])
+        return options, plan, done
+
+    def open(
+        self, plan: list[PlanItem] | None = None, options: dict | None = None
+    ) -> None:
+        if plan is not None:
+            with self.path.open("w", encoding="utf-8") as fp:
+                fp.write(json.dumps({"type": "options", **(options or {})}) + "\n")
+                for item in plan:
+                    fp.write(json.dumps({"type": "plan", **asdict(item)}) + "\n")
+        self.fp = self.path.open("a", encoding="utf-8")
+
+    def mark_done(self, item: PlanItem) -> None:
+        self._write({"type": "done", "key": item.key})
+
+    def mark_failed(self, item: PlanItem, ex: Exception) -> None:
+        # Такие пункты при продолжении выполняются снова
+        self._write({"type": "failed", "key": item.key, "error": repr(ex)})
+
+    def _write(self, record: dict) -> None:
+        with self.lock:
+            self.fp.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self.fp.flush()
+
+    def close(self, remove: bool = False) -> None:
+        if self.fp:
+            self.fp.close()
+        if remove:
+            self.path.unlink(missing_ok=True)
 
 
 class Operation(BaseOperation):
@@ -43,31 +133,69 @@ class Operation(BaseOperation):
             default=False,
             action=argparse.BooleanOptionalAction,
         )
+        parser.add_argument(
+            "--dry-run",
+            help="Только вывести, что будет удалено и заблокировано",
+            default=False,
+            action=argparse.BooleanOptionalAction,
+        )
+        parser.add_argument(
+            "--export-plan",
+            help="Сохранить план чистки в JSONL-файл",
+            type=Path,
+        )
+        parser.add_argument(
+            "-w",
+            "--workers",
+            help="Количество параллельных запросов. По умолчанию: %(default)d",
+            default=4,
+            type=int,
+        )
+        parser.add_argument(
+            "--item-retries",
+            help="Сколько раз повторять пункт плана при временной ошибке. По умолчанию: %(default)d",
+            default=2,
+            type=int,
+        )
+        parser.add_argument(
+            "--checkpoint",
+            help="Файл для продолжения прерванной чистки. По умолчанию рядом с конфигом",
+            type=Path,
+        )
+        parser.add_argument(
+            "--resume",
+            help="Продолжить прерванную чистку, если она была запущена с теми же параметрами",
+            default=True,
+            action=argparse.BooleanOptionalAction,
+        )
+
+    def _get_plan_options(self, args: Namespace) -> dict:
+        # Параметры, от которых зависит состав плана
+        return {
+            "older_than": args.older_than,
+            "all": args.all,
+            "blacklist_discard": args.blacklist_discard,
+        }
 
     def _get_active_negotiations(self, api_client: ApiClient) -> list[dict]:
-        rv = []
-        page = 0
-        per_page = 100
-        while True:
-            r: ApiListResponse = api_client.get(
-                "/negotiations", page=page, per_page=per_page, status="active"
+        # Список скачиваем целиком до удаления, иначе страницы поедут
+        return list(
+            Paginator(
+                api_client,
+                "/negotiations",
+                {"per_page": 100, "status": "active"},
             )
-            rv.extend(r["items"])
-            page += 1
-            if page >= r["pages"]:
-                break
-        return rv
+        )
 
-    def run(self, args: Namespace, api_client: ApiClient, *_) -> None:
-        negotiations = self._get_active_negotiations(api_client)
-        print("Всего активных:", len(negotiations))
+    def _make_plan(self, args: Namespace, negotiations: list[dict]) -> list[PlanItem]:
+        plan = []
         for item in negotiations:
             state = item["state"]
             # messaging_status archived
             # decline_allowed False
             # hidden True
             is_discard = state["id"] == "discard"
-            if not item["hidden"] and (
+            if item["hidden"] or not (
                 args.all
                 or is_discard
                 or (
@@ -78,36 +206,164 @@ class Operation(BaseOperation):
                     > datetime.strptime(item["updated_at"], INVALID_ISO8601_FORMAT)
                 )
             ):
-                decline_allowed = item.get("decline_allowed") or False
+                continue
+            vacancy = item["vacancy"]
+            plan.append(
+                PlanItem(
+                    action="delete",
+                    id=item["id"],
+                    name=vacancy["name"],
+                    url=vacancy["alternate_url"],
+                    state=state["name"].lower(),
+                    decline_allowed=item.get("decline_allowed") or False,
+                )
+            )
+            employer = vacancy.get("employer", {})
+            # Работодатель может быть удален или скрыт
+            if is_discard and args.blacklist_discard and employer and "id" in employer:
+                plan.append(
+                    PlanItem(
+                        action="blacklist",
+                        id=employer["id"],
+                        name=employer["name"],
+                        url=employer.get("alternate_url"),
+                    )
+                )
+        # Один работодатель мог отказать несколько раз
+        return list({item.key: item for item in plan}.values())
+
+    def _execute_item(self, api_client: ApiClient, item: PlanItem) -> bool:
+        """False — если пункт уже выполнили раньше."""
+        try:
+            if item.action == "delete":
                 r = api_client.delete(
-                    f"/negotiations/active/{item['id']}",
-                    with_decline_message=decline_allowed,
+                    f"/negotiations/active/{item.id}",
+                    with_decline_message=item.decline_allowed,
                 )
                 assert {} == r
-                vacancy = item["vacancy"]
+            else:
+                r = api_client.put(f"/employers/blacklisted/{item.id}")
+                assert not r
+        except ResourceNotFound:
+            # Уже удалили в прошлый раз или на сайте
+            logger.debug("already processed: %s", item.key)
+            print("☑️ Уже обработано", item.url, "(", truncate_string(item.name), ")")
+            return False
+        if item.action == "delete":
+            print(
+                "❌ Удалили",
+                item.state,
+                item.url,
+                "(",
+                truncate_string(item.name),
+                ")",
+            )
+        else:
+            print("🚫 Заблокировали", item.url, "(", truncate_string(item.name), ")")
+        return True
+
+    def _run_item(
+        self,
+        api_client: ApiClient,
+        item: PlanItem,
+        retries: int,
+        checkpoint: Checkpoint,
+    ) -> Exception | bool:
+        """Ошибка либо результат _execute_item."""
+        attempt = 0
+        while True:
+            try:
+                executed = self._execute_item(api_client, item)
+                checkpoint.mark_done(item)
+                return executed
+            except Exception as ex:
+                # Ошибка одного пункта, в тч сетевая или неожиданный ответ, не
+                # должна прерывать всю чистку. Повторы отдельных запросов клиент
+                # уже сделал, здесь повторяем пункт целиком после паузы подольше
+                if attempt >= retries or not RetryPolicy.is_transient(ex):
+                    print_err("❗ Ошибка:", item.url, ex)
+                    checkpoint.mark_failed(item, ex)
+                    return ex
+                attempt += 1
+                time.sleep(random.uniform(0, 5 * 2**attempt))
+
+    def run(self, args: Namespace, api_client: ApiClient, *_) -> None:
+        checkpoint = Checkpoint(
+            args.checkpoint
+            or args.config.path.parent / "clear_negotiations.checkpoint.jsonl"
+        )
+        options = self._get_plan_options(args)
+        plan: list[PlanItem] | None = None
+        done: set[str] = set()
+        if args.resume and checkpoint.path.exists():
+            saved_options, plan, done = checkpoint.load()
+            if saved_options == options:
+                print("⏯️ Продолжаем прерванную чистку")
+            else:
+                # План прерванной чистки составлен с другими параметрами
+                logger.debug("checkpoint options %s != %s", saved_options, options)
+                print("⚠️ Параметры чистки изменились, план составлен заново")
+                plan, done = None, set()
+        if plan is None:
+            negotiations = self._get_active_negotiations(api_client)
+            print("Всего активных:", len(negotiations))
+            plan = self._make_plan(args, negotiations)
+
+        if args.export_plan:
+            with args.export_plan.open("w", encoding="utf-8") as fp:
+                for item in plan:
+                    fp.write(json.dumps(asdict(item), ensure_ascii=False) + "\n")
+
+        pending = [item for item in plan if item.key not in done]
+        print("Запланировано:", len(plan), "осталось:", len(pending))
+
+        if args.dry_run:
+            for item in pending:
                 print(
-                    "❌ Удалили",
-                    state["name"].lower(),
-                    vacancy["alternate_url"],
+                    "❌" if item.action == "delete" else "🚫",
+                    item.state or item.action,
+                    item.url,
                     "(",
-                    truncate_string(vacancy["name"]),
+                    truncate_string(item.name),
                     ")",
                 )
-                if is_discard and args.blacklist_discard:
-                    employer = vacancy.get("employer", {})
-                    if not employer or 'id' not in employer:
-                        # Работодатель удален или скрыт
-                        continue
-                    try:
-                        r = api_client.put(f"/employers/blacklisted/{employer['id']}")
-                        assert not r
-                        print(
-                            "🚫 Заблокировали",
-                            employer["alternate_url"],
-                            "(",
-                            truncate_string(employer["name"]),
-                            ")",
-                        )
-                    except ClientError as ex:
-                        print_err("❗ Ошибка:", ex)
+            return
+
+        checkpoint.open(None if done else plan, options)
+        started_at = time.monotonic()
+        completed = False
+        executor = ThreadPoolExecutor(
+            max_workers=max(1, args.workers), thread_name_prefix="clear"
+        )
+        try:
+            results = list(
+                executor.map(
+                    lambda item: self._run_item(
+                        api_client, item, args.item_retries, checkpoint
+                    ),
+                    pending,
+                )
+            )
+            # Пункты с ошибками выполнятся при продолжении
+            completed = not any(isinstance(rv, Exception) for rv in results)
+        finally:
+            # При прерывании дожидаемся только уже начатых запросов
+            executor.shutdown(wait=True, cancel_futures=True)
+            # После прерывания журнал оставляем, чтобы продолжить
+            checkpoint.close(remove=completed)
+
+        elapsed = time.monotonic() - started_at
+        failed = [
+            (item, ex)
+            for item, ex in zip(pending, results)
+            if isinstance(ex, Exception)
+        ]
+        executed = sum(1 for rv in results if rv is True)
+        print(
+            f"📊 Выполнено: {executed}, уже обработано ранее:"
+            f" {len(pending) - executed - len(failed)}, ошибок: {len(failed)},"
+            f" {elapsed:.1f} с ({executed / elapsed if elapsed else 0:.1f} в секунду)"
+        )
+        for item, ex in failed:
+            logger.debug("failed %s: %s", item.key, ex)
         print("🧹 Чистка заявок завершена!")
@@ -44,7 +44,7 @@ class Operation(BaseOperation):
         if args.key:
             print(get_value(args.config, args.key))
             return
-        config_path = str(args.config._config_path)
+        config_path = str(args.config.path)
         if args.show_path:
             print(config_path)
         else:
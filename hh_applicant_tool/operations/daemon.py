@@ -0,0 +1,289 @@
+import argparse
+import dataclasses
+import json
+import logging
+import os
+import signal
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from threading import Event
+from typing import Any
+
+from prettytable import PrettyTable
+
+from ..api import ApiClient, ApiError
+from ..api.retry import RetryBudget
+from ..cron import CronExpression
+from ..main import BaseOperation, HHApplicantTool, save_client_state
+from ..main import Namespace as BaseNamespace
+from ..telemetry_client import TelemetryClient
+from ..utils import print_err
+
+logger = logging.getLogger(__package__)
+
+# Аналог docker/crontab
+DEFAULT_JOBS = [
+    {"schedule": "@reboot", "command": "apply-similar"},
+    {"schedule": "0 13,21 * * *", "command": "apply-similar"},
+]
+
+# Не спим дольше, чтобы замечать перевод часов и изменения конфига
+MAX_SLEEP = 60.0
+# Пауза перед повторным обновлением токена после ошибки
+REFRESH_RETRY_DELAY = 300.0
+
+
+class Namespace(BaseNamespace):
+    status: bool
+    status_file: Path | None
+
+
+@dataclass
+class Job:
+    name: str
+    schedule: CronExpression
+    argv: list[str]
+    next_run_at: datetime | None = None
+    runs: int = 0
+    failures: int = 0
+    last_started_at: datetime | None = None
+    last_duration: float | None = None
+    last_status: str | None = None
+    last_error: str | None = None
+    # @reboot-задачи запускаются один раз при старте
+    pending: bool = field(default=False, repr=False)
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "name": self.name,
+            "schedule": self.schedule.expr,
+            "argv": self.argv,
+            "next_run_at": self.next_run_at and self.next_run_at.isoformat(),
+            "runs": self.runs,
+            "failures": self.failures,
+            "last_started_at": self.last_started_at
+            and self.last_started_at.isoformat(),
+            "last_duration": self.last_duration,
+            "last_status": self.last_status,
+            "last_error": self.last_error,
+        }
+
+
+def load_jobs(config: dict) -> list[Job]:
+    jobs = []
+    for i, item in enumerate((config["daemon"] or {}).get("jobs") or DEFAULT_JOBS):
+        argv = [item["command"], *item.get("args", [])]
+        jobs.append(
+            Job(
+                name=item.get("name") or f"{i + 1}. {' '.join(argv)}",
+                schedule=CronExpression(item["schedule"]),
+                argv=argv,
+            )
+        )
+    return jobs
+
+
+def write_status(path: Path, status: dict) -> None:
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(status, ensure_ascii=False, indent=2))
+    os.replace(tmp, path)
+
+
+class Operation(BaseOperation):
+    """Запускает команды по расписанию из конфига, не завершаясь"""
+
+    def setup_parser(self, parser: argparse.ArgumentParser) -> None:
+        parser.add_argument(
+            "--status",
+            default=False,
+            action=argparse.BooleanOptionalAction,
+            help="Вывести состояние задач запущенного демона и выйти",
+        )
+        parser.add_argument(
+            "--status-file",
+            type=Path,
+            help="Файл с состоянием задач. По умолчанию рядом с конфигом",
+        )
+        parser.epilog = (
+            "Расписание задается в конфиге:\n"
+            '  "daemon": {"jobs": [{"schedule": "0 13,21 * * *",'
+            ' "command": "apply-similar", "args": ["--force-message"]}]}'
+        )
+
+    def run(
+        self,
+        args: Namespace,
+        api_client: ApiClient,
+        telemetry_client: TelemetryClient,
+    ) -> None | int:
+        status_path = args.status_file or args.config.path.with_suffix(
+            ".status.json"
+        )
+        if args.status:
+            return self._print_status(status_path)
+        self.args = args
+        self.api_client = api_client
+        # Задачи могут менять политику повторов клиента (apply-similar --retry-apply)
+        self.retry_policy = api_client.retry_policy
+        self.telemetry_client = telemetry_client
+        self.tool = HHApplicantTool()
+        self.status_path = status_path
+        self.started_at = datetime.now()
+        self.refresh_failed_at = 0.0
+        self.jobs = load_jobs(args.config)
+        now = datetime.now()
+        for job in self.jobs:
+            job.pending = job.schedule.reboot
+            job.next_run_at = job.schedule.next_after(now)
+        self.stopped = Event()
+        # docker stop посылает SIGTERM
+        signal.signal(signal.SIGTERM, lambda *_: self.stopped.set())
+        print(f"⏰ Демон запущен, задач: {len(self.jobs)}")
+        try:
+            self._loop()
+        finally:
+            self._save_status()
+        print("👋 Демон остановлен")
+
+    def _loop(self) -> None:
+        while not self.stopped.is_set():
+            self._sync_token()
+            now = datetime.now()
+            for job in self.jobs:
+                if self.stopped.is_set():
+                    break
+                if job.pending or (job.next_run_at and job.next_run_at <= now):
+                    job.pending = False
+                    self._run_job(job)
+                    # Пропущенные за время выполнения запуски не догоняем
+                    job.next_run_at = job.schedule.next_after(datetime.now())
+            self._save_status()
+            self.stopped.wait(self._get_sleep_time())
+
+    def _get_sleep_time(self) -> float:
+        now = datetime.now()
+        wakeups = [job.next_run_at for job in self.jobs if job.next_run_at]
+        if self.api_client.refresh_token:
+            wakeups.append(self._get_refresh_at())
+        if not wakeups:
+            return MAX_SLEEP
+        return min(MAX_SLEEP, max(0.0, (min(wakeups) - now).total_seconds()))
+
+    def _get_refresh_at(self) -> datetime:
+        # HH обновляет токен только после истечения срока действия access_token,
+        # поэтому обновляем сразу по истечении, до того как он понадобится задаче
+        refresh_at = datetime.fromtimestamp(self.api_client.access_expires_at + 1)
+        if self.refresh_failed_at:
+            refresh_at = max(
+                refresh_at,
+                datetime.fromtimestamp(self.refresh_failed_at + REFRESH_RETRY_DELAY),
+            )
+        return refresh_at
+
+    def _sync_token(self) -> None:
+        config = self.args.config
+        # Токен мог обновить другой процесс, например, authorize
+        if config.reload() and config["token"] and (
+            config["token"] != self.api_client.get_access_token()
+        ):
+            logger.info("token changed in config")
+            self.api_client.handle_access_token(config["token"])
+            # Возможно, это уже другой аккаунт
+            if self.api_client.cache:
+                self.api_client.cache.clear()
+        if not self.api_client.refresh_token or datetime.now() < self._get_refresh_at():
+            return
+        try:
+            self.api_client.refresh_access_token()
+            self.refresh_failed_at = 0.0
+            save_client_state(config, self.api_client)
+            print("✅ Токен обновлен")
+        except (ApiError, OSError) as ex:
+            # OSError — в тч сетевые ошибки requests
+            self.refresh_failed_at = time.time()
+            print_err("❗ Не удалось обновить токен:", ex)
+
+    def _run_job(self, job: Job) -> None:
+        print(f"▶️ {job.name}")
+        job.runs += 1
+        job.last_started_at = datetime.now()
+        started_at = time.monotonic()
+        try:
+            child = self.tool.parse_operation_args(self.args, job.argv)
+            # Своя политика повторов на каждый запуск, в тч лимит повторов
+            self.api_client.retry_policy = self.retry_policy and dataclasses.replace(
+                self.retry_policy, budget=RetryBudget(self.args.retry_budget)
+            )
+            res = child.run(child, self.api_client, self.telemetry_client)
+            job.last_status = "ok" if not res else f"exit {res}"
+            job.last_error = None
+        except SystemExit:
+            # Ошибка в аргументах задачи
+            job.last_status, job.last_error = "error", "invalid arguments"
+        except Exception as ex:
+            # Ошибка одной задачи не должна останавливать демон
+            logger.exception(ex)
+            job.last_status, job.last_error = "error", str(ex)
+        finally:
+            job.last_duration = time.monotonic() - started_at
+        if job.last_status != "ok":
+            job.failures += 1
+        save_client_state(self.args.config, self.api_client)
+        print(f"⏹️ {job.name}: {job.last_status} ({job.last_duration:.1f} с)")
+
+    def _save_status(self) -> None:
+        try:
+            write_status(
+                self.status_path,
+                {
+                    "pid": os.getpid(),
+                    "started_at": self.started_at.isoformat(),
+                    "updated_at": datetime.now().isoformat(),
+                    "access_expires_at": datetime.fromtimestamp(
+                        self.api_client.access_expires_at
+                    ).isoformat(),
+                    "jobs": [job.to_dict() for job in self.jobs],
+                },
+            )
+        except OSError as ex:
+            logger.warning("Не удалось сохранить состояние демона: %s", ex)
+
+    def _print_status(self, path: Path) -> int | None:
+        try:
+            status = json.loads(path.read_text())
+        except FileNotFoundError:
+            print_err("❗ Демон еще не запускался:", path)
+            return 1
+        print("PID:", status["pid"], "запущен:", status["started_at"])
+        print("Обновлено:", status["updated_at"])
+        print("Токен действует до:", status["access_expires_at"])
+        t = PrettyTable(
+            field_names=[
+                "Задача",
+                "Расписание",
+                "Запусков",
+                "Ошибок",
+                "Последний запуск",
+                "Длительность, с",
+                "Статус",
+                "Следующий запуск",
+            ],
+            align="l",
+        )
+        for job in status["jobs"]:
+            t.add_row(
+                [
+                    job["name"],
+                    job["schedule"],
+                    job["runs"],
+                    job["failures"],
+                    job["last_started_at"] or "",
+                    f"{job['last_duration']:.1f}" if job["last_duration"] else "",
+                    (job["last_status"] or "")
+                    + (f": {job['last_error']}" if job["last_error"] else ""),
+                    job["next_run_at"] or "",
+                ]
+            )
+        print(t)
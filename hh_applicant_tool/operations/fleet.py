@@ -0,0 +1,130 @@
+import argparse
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+from threading import Lock
+from typing import Any
+
+from prettytable import PrettyTable
+
+from ..api.rate_limit import RateLimiter
+from ..api.throttle import AdaptiveThrottle
+from ..main import BaseOperation, HHApplicantTool, get_proxies, get_rate_control
+from ..main import Namespace as BaseNamespace
+from ..utils import Config, print_err
+
+logger = logging.getLogger(__package__)
+
+COMMANDS = ("apply-similar", "reply-employers", "update-resumes", "refresh-token")
+
+
+class Namespace(BaseNamespace):
+    directory: Path
+    command: str
+    command_args: list[str]
+    workers: int
+
+
+@dataclass
+class AccountResult:
+    name: str
+    status: str
+    elapsed: float = 0.0
+    error: str | None = None
+
+
+def find_configs(directory: Path) -> list[Path]:
+    """Конфиги аккаунтов: *.json и */config.json.
+
+    Файлы без токена (например, кеш списка операций) пропускаются.
+    """
+    paths = sorted({*directory.glob("*.json"), *directory.glob("*/config.json")})
+    return [path for path in paths if Config(path)["token"]]
+
+
+class Operation(BaseOperation):
+    """Выполнить команду для всех аккаунтов из каталога с конфигами"""
+
+    def setup_parser(self, parser: argparse.ArgumentParser) -> None:
+        parser.add_argument(
+            "directory",
+            type=Path,
+            help="Каталог с конфигами аккаунтов: <имя>.json или <имя>/config.json",
+        )
+        parser.add_argument("command", choices=COMMANDS, help="Команда")
+        parser.add_argument(
+            "command_args",
+            nargs=argparse.REMAINDER,
+            help="Аргументы команды. Для reply-employers нужно указать --reply-message, иначе он будет ждать ввода",
+        )
+        parser.add_argument(
+            "-w",
+            "--workers",
+            type=int,
+            default=4,
+            help="Сколько аккаунтов обрабатывать одновременно",
+        )
+
+    def run(self, args: Namespace, *_: Any) -> int | None:
+        configs = find_configs(args.directory)
+        if not configs:
+            print_err("❗ В каталоге нет конфигов с токеном:", args.directory)
+            return 1
+        tool = HHApplicantTool()
+        # Аккаунты за одним прокси делят его частоту запросов
+        rate_controls: dict[str, tuple[RateLimiter, AdaptiveThrottle | None]] = {}
+        lock = Lock()
+
+        def run_account(path: Path) -> AccountResult:
+            name = path.parent.name if path.name == "config.json" else path.stem
+            started_at = time.monotonic()
+            try:
+                # Глобальные опции (задержка, кеш и тп) берем из командной строки fleet
+                child = tool.parse_operation_args(
+                    args, [args.command, *args.command_args]
+                )
+                child.config = Config(path)
+                proxy = get_proxies(child)["https"] or "direct"
+                with lock:
+                    if proxy not in rate_controls:
+                        rate_controls[proxy] = get_rate_control(child)
+                res = tool.run_operation(child, rate_controls[proxy])
+                status = "ok" if not res else f"exit {res}"
+                return AccountResult(name, status, time.monotonic() - started_at)
+            except Exception as ex:
+                # Ошибка одного аккаунта не должна останавливать остальные
+                logger.error(
+                    "%s: %s", name, ex, exc_info=logger.isEnabledFor(logging.DEBUG)
+                )
+                return AccountResult(
+                    name, "error", time.monotonic() - started_at, str(ex)
+                )
+
+        print(f"🚀 {args.command} для {len(configs)} аккаунтов")
+        results: list[AccountResult] = []
+        with ThreadPoolExecutor(
+            max_workers=max(1, args.workers), thread_name_prefix="fleet"
+        ) as executor:
+            futures = [executor.submit(run_account, path) for path in configs]
+            for future in as_completed(futures):
+                result = future.result()
+                results.append(result)
+                print(
+                    f"[{len(results)}/{len(configs)}]",
+                    "✅" if result.status == "ok" else "❗",
+                    result.name,
+                    f"({result.elapsed:.1f} с)",
+                    result.error or "",
+                )
+
+        t = PrettyTable(field_names=["Аккаунт", "Статус", "Время, с", "Ошибка"], align="l")
+        for result in sorted(results, key=lambda r: r.name):
+            t.add_row(
+                [result.name, result.status, f"{result.elapsed:.1f}", result.error or ""]
+            )
+        print(t)
+        failed = sum(result.status != "ok" for result in results)
+        print(f"📊 Успешно: {len(results) - failed}, с ошибками: {failed}")
+        return 1 if failed else None
@@ -1,9 +1,17 @@
 import argparse
+import io
+import json
 import logging
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from os import getenv
 import pathlib
+from typing import Iterable, Iterator, TextIO
+
+from ..contacts import ContactIndex
 from ..main import BaseOperation
 from ..main import Namespace as BaseNamespace
+from ..storage import get_data_path
 from ..telemetry_client import TelemetryClient
 
 logger = logging.getLogger(__package__)
@@ -14,6 +22,10 @@ class Namespace(BaseNamespace):
     password: str | None
     search: str | None
     export: bool
+    format: str
+    output: TextIO
+    sync: bool
+    local: bool
 
 
 class Operation(BaseOperation):
@@ -60,31 +72,39 @@ class Operation(BaseOperation):
             choices=["html", "jsonl"],
             help="Формат вывода",
         )
+        parser.add_argument(
+            "--sync",
+            action=argparse.BooleanOptionalAction,
+            default=False,
+            help="Скачать контакты в локальную базу для поиска без сети. Повторная синхронизация обновляет только изменившиеся контакты.",
+        )
+        parser.add_argument(
+            "-l",
+            "--local",
+            action=argparse.BooleanOptionalAction,
+            default=False,
+            help="Искать и экспортировать контакты из локальной базы (см. --sync)",
+        )
+        parser.add_argument(
+            "-o",
+            "--output",
+            type=argparse.FileType("w", encoding="utf-8"),
+            default=sys.stdout,
+            help="Файл для экспорта. По умолчанию выводится в stdout",
+        )
 
     def run(self, args: Namespace, _, telemetry_client: TelemetryClient) -> None:
+        if args.sync or args.local:
+            index = ContactIndex(get_data_path(args.config))
+            try:
+                return self._run_local(args, telemetry_client, index)
+            finally:
+                index.close()
+
         if args.export:
-            contact_persons = []
-            page = 1
-            per_page = 100
-            while True:
-                res = telemetry_client.get_telemetry(
-                    "/contact/persons",
-                    {"search": args.search, "per_page": per_page, "page": page},
-                )
-                assert "contact_persons" in res
-                contact_persons += res["contact_persons"]
-                if per_page * page >= res["total"]:
-                    break
-                page += 1
-            if args.format == "jsonl":
-                import json, sys
-
-                for contact in contact_persons:
-                    json.dump(contact, sys.stdout, ensure_ascii=False)
-                    sys.stdout.write("\n")
-                    sys.stdout.flush()
-            else:
-                print(generate_html_report(contact_persons))
+            # Контакты пишутся по мере получения страниц, целиком в памяти
+            # список не держим
+            self._export(iter_contacts(telemetry_client, args.search), args)
             return
 
         res = telemetry_client.get_telemetry(
@@ -102,12 +122,38 @@ class Operation(BaseOperation):
 
         print_contacts(res)
 
+    def _run_local(
+        self, args: Namespace, telemetry_client: TelemetryClient, index: ContactIndex
+    ) -> None:
+        if args.sync:
+            stats = index.sync(iter_contacts(telemetry_client))
+            print(
+                "🔄 Контакты синхронизированы: всего {total}, новых {added}, изменено {updated}, удалено {deleted}".format(
+                    **stats
+                )
+            )
+            if not args.local:
+                return
 
-def generate_html_report(data: list[dict]) -> str:
-    """
-    Генерирует HTML-отчет на основе предоставленных данных.
-    """
-    html_content = """\
+        if args.export:
+            self._export(index.iter_all(args.search), args)
+            return
+
+        print_contacts(index.search(args.search, int(args.page)))
+
+    def _export(self, contacts: Iterable[dict], args: Namespace) -> None:
+        if args.format == "jsonl":
+            for contact in contacts:
+                json.dump(contact, args.output, ensure_ascii=False)
+                args.output.write("\n")
+                args.output.flush()
+        else:
+            write_html_report(contacts, args.output)
+            args.output.write("\n")
+            args.output.flush()
+
+
+HTML_HEADER = """\
 <!DOCTYPE html>
 <html lang="ru">
 <head>
@@ -199,73 +245,130 @@ def generate_html_report(data: list[dict]) -> str:
         <h1>Полученные контакты</h1>
 """
 
-    for item in data:
-        name = item.get("name", "N/A")
-        email = item.get("email", "N/A")
-        employer = item.get("employer") or {}
-
-        employer_name = employer.get("name", "N/A")
-        employer_area = employer.get("area", "N/A")
-        employer_site_url = employer.get("site_url", "")
-
-        phone_numbers = [
-            pn["phone_number"]
-            for pn in item.get("phone_numbers", [])
-            if "phone_number" in pn
-        ]
-        telegram_usernames = [
-            tu["username"]
-            for tu in item.get("telegram_usernames", [])
-            if "username" in tu
-        ]
-
-        html_content += f"""\
+HTML_FOOTER = """\
+    </div>
+</body>
+</html>"""
+
+
+def iter_contact_pages(
+    telemetry_client: TelemetryClient, search: str = "", per_page: int = 100
+) -> Iterator[dict]:
+    """Страницы контактов, следующая запрашивается пока обрабатывается текущая."""
+
+    def fetch(page: int) -> dict:
+        res = telemetry_client.get_telemetry(
+            "/contact/persons",
+            {"search": search, "per_page": per_page, "page": page},
+        )
+        assert "contact_persons" in res
+        return res
+
+    with ThreadPoolExecutor(max_workers=1, thread_name_prefix="contacts") as executor:
+        page = 1
+        future = executor.submit(fetch, page)
+        while future:
+            res = future.result()
+            future = (
+                executor.submit(fetch, page + 1)
+                if per_page * page < res["total"]
+                else None
+            )
+            yield res
+            page += 1
+
+
+def iter_contacts(telemetry_client: TelemetryClient, search: str = "") -> Iterator[dict]:
+    for res in iter_contact_pages(telemetry_client, search):
+        yield from res["contact_persons"]
+
+
+def render_contact_html(item: dict) -> str:
+    name = item.get("name", "N/A")
+    email = item.get("email", "N/A")
+    employer = item.get("employer") or {}
+
+    employer_name = employer.get("name", "N/A")
+    employer_area = employer.get("area", "N/A")
+    employer_site_url = employer.get("site_url", "")
+
+    phone_numbers = [
+        pn["phone_number"]
+        for pn in item.get("phone_numbers", [])
+        if "phone_number" in pn
+    ]
+    telegram_usernames = [
+        tu["username"]
+        for tu in item.get("telegram_usernames", [])
+        if "username" in tu
+    ]
+
+    parts = [
+        f"""\
         <div class="person-card">
             <h2>{name}</h2>
             <p><strong>Email:</strong> <a href="mailto:{email}">{email}</a></p>
         """
+    ]
 
-        if employer_name != "N/A":
-            html_content += f"""\
+    if employer_name != "N/A":
+        parts.append(
+            f"""\
             <div class="employer-info">
                 <h3>Работодатель: {employer_name}</h3>
                 <p><strong>Город:</strong> {employer_area}</p>
             """
-            if employer_site_url:
-                html_content += f"""\
+        )
+        if employer_site_url:
+            parts.append(
+                f"""\
                 <p><strong>Сайт:</strong> <a href="{employer_site_url}" target="_blank">{employer_site_url}</a></p>
                 """
-            html_content += "</div>"  # Закрываем employer-info
-        else:
-            html_content += (
-                '<p class="no-data">Информация о работодателе отсутствует.</p>'
             )
+        parts.append("</div>")  # Закрываем employer-info
+    else:
+        parts.append('<p class="no-data">Информация о работодателе отсутствует.</p>')
 
-        if phone_numbers:
-            html_content += "<p><strong>Номера телефонов:</strong></p><ul>"
-            for phone in phone_numbers:
-                html_content += f"<li><a href='tel:{phone}'>{phone}</a></li>"
-            html_content += "</ul>"
-        else:
-            html_content += '<p class="no-data">Номера телефонов отсутствуют.</p>'
+    if phone_numbers:
+        parts.append("<p><strong>Номера телефонов:</strong></p><ul>")
+        parts.extend(
+            f"<li><a href='tel:{phone}'>{phone}</a></li>" for phone in phone_numbers
+        )
+        parts.append("</ul>")
+    else:
+        parts.append('<p class="no-data">Номера телефонов отсутствуют.</p>')
 
-        if telegram_usernames:
-            html_content += "<p><strong>Имена пользователей Telegram:</strong></p><ul>"
-            for username in telegram_usernames:
-                html_content += f"<li><a href='https://t.me/{username}' target='_blank'>@{username}</a></li>"
-            html_content += "</ul>"
-        else:
-            html_content += (
-                '<p class="no-data">Имена пользователей Telegram отсутствуют.</p>'
-            )
+    if telegram_usernames:
+        parts.append("<p><strong>Имена пользователей Telegram:</strong></p><ul>")
+        parts.extend(
+            f"<li><a href='https://t.me/{username}' target='_blank'>@{username}</a></li>"
+            for username in telegram_usernames
+        )
+        parts.append("</ul>")
+    else:
+        parts.append('<p class="no-data">Имена пользователей Telegram отсутствуют.</p>')
 
-        html_content += "</div>"  # Закрываем person-card
+    parts.append("</div>")  # Закрываем person-card
+    return "".join(parts)
 
-    html_content += """\
-    </div>
-</body>
-</html>"""
-    return html_content
+
+def write_html_report(data: Iterable[dict], fp: TextIO) -> None:
+    """
+    Записывает HTML-отчет в файл по одному контакту.
+    """
+    fp.write(HTML_HEADER)
+    for item in data:
+        fp.write(render_contact_html(item))
+    fp.write(HTML_FOOTER)
+
+
+def generate_html_report(data: Iterable[dict]) -> str:
+    """
+    Генерирует HTML-отчет на основе предоставленных данных.
+    """
+    buf = io.StringIO()
+    write_html_report(data, buf)
+    return buf.getvalue()
 
 
 def print_contacts(data: dict) -> None:
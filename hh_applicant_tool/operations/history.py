@@ -0,0 +1,61 @@
+import argparse
+import logging
+from datetime import datetime
+
+from prettytable import PrettyTable
+
+from ..api import ApiClient
+from ..ledger import Ledger
+from ..main import BaseOperation
+from ..main import Namespace as BaseNamespace
+from ..storage import get_data_path
+from ..utils import truncate_string
+
+logger = logging.getLogger(__package__)
+
+
+class Namespace(BaseNamespace):
+    resume_id: str | None
+    outcome: str | None
+    limit: int
+
+
+class Operation(BaseOperation):
+    """История обработанных вакансий и откликов"""
+
+    def setup_parser(self, parser: argparse.ArgumentParser) -> None:
+        parser.add_argument("--resume-id", help="Идентефикатор резюме")
+        parser.add_argument(
+            "--outcome",
+            help="Результат: applied, has_test, archived, has_relations, error",
+        )
+        parser.add_argument(
+            "-n", "--limit", help="Количество записей", default=50, type=int
+        )
+
+    def run(self, args: Namespace, api_client: ApiClient, *_) -> None:
+        ledger = Ledger(get_data_path(args.config))
+        try:
+            t = PrettyTable(
+                field_names=["Дата", "Вакансия", "Ссылка", "Результат"],
+                align="l",
+                valign="t",
+            )
+            t.add_rows(
+                [
+                    (
+                        datetime.fromtimestamp(x["updated_at"]).strftime(
+                            "%Y-%m-%d %H:%M"
+                        ),
+                        truncate_string(x["name"] or ""),
+                        x["url"],
+                        x["outcome"],
+                    )
+                    for x in ledger.history(args.resume_id, args.outcome, args.limit)
+                ]
+            )
+            print(t)
+            for outcome, count in sorted(ledger.summary(args.resume_id).items()):
+                print(f"{outcome}: {count}")
+        finally:
+            ledger.close()
@@ -4,16 +4,21 @@ import argparse
 import logging
 import random
 import time
-from typing import Tuple
+from dataclasses import dataclass, field
+from typing import Iterator, Tuple
 
 from ..api import ApiError, ApiClient
+from ..api.paginator import Paginator
 from ..main import BaseOperation
 from ..main import Namespace as BaseNamespace
 from ..mixins import GetResumeIdMixin
+from ..pipeline import Pipeline
+from ..negotiations import NegotiationState, NegotiationStore, is_before
+from ..storage import get_data_path, get_spool_path
 from ..utils import parse_interval, random_text
-from ..telemetry_client import TelemetryClient, TelemetryError
+from ..telemetry_client import TelemetryClient
+from ..telemetry_uploader import TelemetryUploader
 import re
-from itertools import count
 
 try:
     import readline
@@ -33,12 +38,24 @@ GOOGLE_DOCS_RE = re.compile(
 logger = logging.getLogger(__package__)
 
 
+@dataclass
+class PreparedChat:
+    negotiation: dict
+    # None — если работодатель заблокирован или произошла ошибка
+    state: NegotiationState | None = None
+    # Новые сообщения, ссылки из старых уже собраны
+    history: list[str] = field(default_factory=list)
+    error: ApiError | None = None
+
+
 class Namespace(BaseNamespace):
     reply_message: str
     reply_interval: Tuple[float, float]
     max_pages: int
     only_invitations: bool
     dry_run: bool
+    full_sync: bool
+    prefetch: int
 
 
 class Operation(BaseOperation, GetResumeIdMixin):
@@ -77,7 +94,18 @@ class Operation(BaseOperation, GetResumeIdMixin):
             default=False,
             action=argparse.BooleanOptionalAction,
         )
-
+        parser.add_argument(
+            "--full-sync",
+            help="Проверить все отклики, а не только изменившиеся с прошлого запуска",
+            default=False,
+            action=argparse.BooleanOptionalAction,
+        )
+        parser.add_argument(
+            "--prefetch",
+            help="Сколько переписок загружать заранее (и количество потоков для этого)",
+            default=4,
+            type=int,
+        )
         parser.add_argument(
             "--dry-run",
             "--dry",
@@ -99,26 +127,33 @@ class Operation(BaseOperation, GetResumeIdMixin):
         self.max_pages = args.max_pages
         self.dry_run = args.dry_run
         self.only_invitations = args.only_invitations
+        self.full_sync = args.full_sync
+        self.prefetch = max(1, args.prefetch)
         logger.debug(f"{self.reply_message = }")
-        self._reply_chats()
+        self.store = NegotiationStore(get_data_path(args.config))
+        self.telemetry_uploader = (
+            TelemetryUploader(telemetry_client, get_spool_path(args.config))
+            if self.enable_telemetry
+            else None
+        )
+        try:
+            self._reply_chats()
+        finally:
+            if self.telemetry_uploader:
+                self.telemetry_uploader.close()
+            self.store.close()
 
     def _get_blacklisted(self) -> list[str]:
-        rv = []
-        # В этом методе API страницы с 0 начинаются
-        for page in count(0):
-            r = self.api_client.get("/employers/blacklisted", page=page)
-            rv += [item["id"] for item in r["items"]]
-            if page + 1 >= r["pages"]:
-                break
-        return rv
+        return [
+            item["id"]
+            for item in Paginator(self.api_client, "/employers/blacklisted")
+        ]
 
     def _reply_chats(self) -> None:
-        blacklisted = self._get_blacklisted()
+        blacklisted = self.blacklisted = self._get_blacklisted()
         logger.debug(f"{blacklisted = }")
         me = self.me = self.api_client.get("/me")
 
-        telemetry_data = {"links": []}
-
         basic_message_placeholders = {
             "first_name": me.get("first_name", ""),
             "last_name": me.get("last_name", ""),
@@ -126,199 +161,284 @@ class Operation(BaseOperation, GetResumeIdMixin):
             "phone": me.get("phone", ""),
         }
 
-        for negotiation in self._get_negotiations():
+        # Переписки для следующих чатов загружаются, пока обрабатывается
+        # текущий, так что при ручных ответах не приходится ждать сети
+        pipeline = Pipeline(self._iter_negotiations(), maxsize=self.prefetch).add_stage(
+            "messages", self._prepare_chat, self.prefetch
+        )
+        for chat in pipeline:
             try:
-                # Пропускаем другие резюме
-                if self.resume_id != negotiation["resume"]["id"]:
-                    continue
-
-                state_id = negotiation["state"]["id"]
-
-                # Пропускаем отказ
-                if state_id == "discard":
-                    continue
+                if self._reply_chat(chat, basic_message_placeholders):
+                    self.unhandled.pop(chat.negotiation["id"], None)
+            except ApiError as ex:
+                logger.error(ex)
 
-                if self.only_invitations and not state_id.startswith("inv"):
-                    continue
+        if not self.dry_run and (mark := self._get_new_high_water_mark()):
+            self.store.set_high_water_mark(self.high_water_mark_name, mark)
 
-                logger.debug(negotiation)
-                nid = negotiation["id"]
-                vacancy = negotiation["vacancy"]
-                employer = vacancy.get("employer") or {}
-                salary = vacancy.get("salary") or {}
-
-                if employer.get("id") in blacklisted:
-                    print(
-                        "🚫 Пропускаем заблокированного работодателя",
-                        employer.get("alternate_url"),
-                    )
-                    continue
+        print("📝 Сообщения разосланы!")
 
-                message_placeholders = {
-                    "vacancy_name": vacancy.get("name", ""),
-                    "employer_name": employer.get("name", ""),
-                    **basic_message_placeholders,
-                }
+    def _reply_chat(self, chat: PreparedChat, basic_message_placeholders: dict) -> bool:
+        """False — если чат не обработан и его нужно проверить в следующий раз."""
+        negotiation, state = chat.negotiation, chat.state
+        nid = negotiation["id"]
+        vacancy = negotiation["vacancy"]
+        employer = vacancy.get("employer") or {}
+        salary = vacancy.get("salary") or {}
+
+        # Могли заблокировать, пока переписка загружалась
+        if employer.get("id") in self.blacklisted:
+            print(
+                "🚫 Пропускаем заблокированного работодателя",
+                employer.get("alternate_url"),
+            )
+            return True
+
+        # Ошибки из потоков загрузки выводим здесь, чтобы не разорвать ввод
+        if chat.error:
+            logger.error(chat.error)
+            return False
+
+        message_placeholders = {
+            "vacancy_name": vacancy.get("name", ""),
+            "employer_name": employer.get("name", ""),
+            **basic_message_placeholders,
+        }
 
-                logger.debug(
-                    "Вакансия %(vacancy_name)s от %(employer_name)s"
-                    % message_placeholders
-                )
+        logger.debug(
+            "Вакансия %(vacancy_name)s от %(employer_name)s" % message_placeholders
+        )
 
-                page: int = 0
-                last_message: dict | None = None
-                message_history: list[str] = []
-                while True:
-                    messages_res = self.api_client.get(
-                        f"/negotiations/{nid}/messages", page=page
-                    )
-
-                    last_message = messages_res["items"][-1]
-                    message_history.extend(
-                        (
-                            "<-"
-                            if item["author"]["participant_type"] == "employer"
-                            else "->"
-                        )
-                        + " "
-                        + item["text"]
-                        for item in messages_res["items"]
-                        if item.get("text")
-                    )
-                    if page + 1 >= messages_res["pages"]:
-                        break
-
-                    page = messages_res["pages"] - 1
-
-                if self.enable_telemetry:
-                    # Собираем ссылки на тестовые задания
-                    for message in message_history:
-                        if message.startswith("-> "):
-                            continue
-                        # Тестовые задания и тп
-                        for link in GOOGLE_DOCS_RE.findall(message):
-                            document_data = {
-                                "vacancy_url": vacancy.get("alternate_url"),
-                                "vacancy_name": vacancy.get("name"),
-                                "salary": (
-                                    f"{salary.get('from', '...')}-{salary.get('to', '...')} {salary.get('currency', 'RUR')}"  # noqa: E501
-                                    if salary
-                                    else None
-                                ),
-                                "employer_url": vacancy.get("employer", {}).get(
-                                    "alternate_url"
-                                ),
-                                "link": link,
-                            }
-
-                            telemetry_data["links"].append(document_data)
-
-                if os.getenv("TEST_SEND_TELEMETRY") in ["1", "y", "Y"]:
+        if self.enable_telemetry:
+            # Собираем ссылки на тестовые задания
+            for message in chat.history:
+                if message.startswith("-> "):
                     continue
-
-                logger.debug(last_message)
-
-                is_employer_message = (
-                    last_message["author"]["participant_type"] == "employer"
-                )
-
-                if is_employer_message or not negotiation.get("viewed_by_opponent"):
-                    if self.reply_message:
-                        send_message = (
-                            random_text(self.reply_message) % message_placeholders
-                        )
-                        logger.debug(send_message)
-                    else:
-                        print("🏢", message_placeholders["employer_name"])
-                        print("💼", message_placeholders["vacancy_name"])
-                        print("📅", vacancy["created_at"])
-                        if salary:
-                            salary_from = salary.get("from") or "-"
-                            salary_to = salary.get("to") or "-"
-                            salary_currency = salary.get("currency")
-                            print(
-                                "💵 от", salary_from, "до", salary_to, salary_currency
-                            )
-                        print("")
-                        print("Последние сообщения:")
-                        for msg in (
-                            message_history[:1] + ["..."] + message_history[-3:]
-                            if len(message_history) > 5
-                            else message_history
-                        ):
-                            print(msg)
-                        try:
-                            print("-" * 10)
-                            print()
-                            print(
-                                "Отмена отклика: /cancel <необязательное сообщение для отказа>"
-                            )
-                            print("Заблокировать работодателя: /ban")
-                            print()
-                            send_message = input("Ваше сообщение: ").strip()
-                        except EOFError:
-                            continue
-                        if not send_message:
-                            print("🚶 Пропускаем чат")
-                            continue
-
-                    if self.dry_run:
-                        logger.info(
-                            "Dry Run: Отправка сообщения в чат по вакансии %s: %s",
-                            vacancy["alternate_url"],
-                            send_message,
-                        )
-                        continue
-
-                    time.sleep(
-                        random.uniform(
-                            self.reply_min_interval,
-                            self.reply_max_interval,
-                        )
-                    )
-
-                    if send_message.startswith("/ban"):
-                        self.api_client.put(f"/employers/blacklisted/{employer['id']}")
-                        blacklisted.append(employer["id"])
-                        print(
-                            "🚫 Работодатель добавлен в черный список",
-                            employer.get("alternate_url"),
-                        )
-                    elif send_message.startswith("/cancel"):
-                        _, decline_allowed = send_message.split("/cancel", 1)
-                        self.api_client.delete(
-                            f"/negotiations/active/{negotiation['id']}",
-                            with_decline_message=decline_allowed.strip(),
-                        )
-                        print("❌ Отменили заявку", vacancy["alternate_url"])
-                    else:
-                        self.api_client.post(
-                            f"/negotiations/{nid}/messages",
-                            message=send_message,
-                        )
-                        print(
-                            "📨 Отправили сообщение для",
-                            vacancy["alternate_url"],
-                        )
-            except ApiError as ex:
-                logger.error(ex)
-
-        if self.enable_telemetry and len(telemetry_data["links"]) > 0:
-            logger.debug(telemetry_data)
+                # Тестовые задания и тп
+                for link in GOOGLE_DOCS_RE.findall(message):
+                    document_data = {
+                        "vacancy_url": vacancy.get("alternate_url"),
+                        "vacancy_name": vacancy.get("name"),
+                        "salary": (
+                            f"{salary.get('from', '...')}-{salary.get('to', '...')} {salary.get('currency', 'RUR')}"  # noqa: E501
+                            if salary
+                            else None
+                        ),
+                        "employer_url": vacancy.get("employer", {}).get(
+                            "alternate_url"
+                        ),
+                        "link": link,
+                    }
+
+                    self.telemetry_uploader.add("/docs", "links", document_data)
+
+        if os.getenv("TEST_SEND_TELEMETRY") in ["1", "y", "Y"]:
+            return True
+
+        is_employer_message = state.last_author == "employer"
+
+        if not is_employer_message and negotiation.get("viewed_by_opponent"):
+            # Отвечать не нужно
+            return True
+
+        if self.reply_message:
+            send_message = random_text(self.reply_message) % message_placeholders
+            logger.debug(send_message)
+        else:
+            print("🏢", message_placeholders["employer_name"])
+            print("💼", message_placeholders["vacancy_name"])
+            print("📅", vacancy["created_at"])
+            if salary:
+                salary_from = salary.get("from") or "-"
+                salary_to = salary.get("to") or "-"
+                salary_currency = salary.get("currency")
+                print("💵 от", salary_from, "до", salary_to, salary_currency)
+            print("")
+            print("Последние сообщения:")
+            for msg in state.history:
+                print(msg)
             try:
-                self.telemetry_client.send_telemetry("/docs", telemetry_data)
-            except TelemetryError as ex:
-                logger.warning(ex, exc_info=True)
-
-        print("📝 Сообщения разосланы!")
+                print("-" * 10)
+                print()
+                print("Отмена отклика: /cancel <необязательное сообщение для отказа>")
+                print("Заблокировать работодателя: /ban")
+                print()
+                send_message = input("Ваше сообщение: ").strip()
+            except EOFError:
+                return False
+            if not send_message:
+                print("🚶 Пропускаем чат")
+                return False
+
+        if self.dry_run:
+            logger.info(
+                "Dry Run: Отправка сообщения в чат по вакансии %s: %s",
+                vacancy["alternate_url"],
+                send_message,
+            )
+            return False
+
+        time.sleep(
+            random.uniform(
+                self.reply_min_interval,
+                self.reply_max_interval,
+            )
+        )
 
-    def _get_negotiations(self) -> list[dict]:
-        rv = []
-        for page in range(self.max_pages):
-            res = self.api_client.get("/negotiations", page=page, status="active")
-            rv.extend(res["items"])
-            if page >= res["pages"] - 1:
+        if send_message.startswith("/ban"):
+            self.api_client.put(f"/employers/blacklisted/{employer['id']}")
+            self.blacklisted.append(employer["id"])
+            print(
+                "🚫 Работодатель добавлен в черный список",
+                employer.get("alternate_url"),
+            )
+        elif send_message.startswith("/cancel"):
+            _, decline_allowed = send_message.split("/cancel", 1)
+            self.api_client.delete(
+                f"/negotiations/active/{negotiation['id']}",
+                with_decline_message=decline_allowed.strip(),
+            )
+            print("❌ Отменили заявку", vacancy["alternate_url"])
+        else:
+            self.api_client.post(
+                f"/negotiations/{nid}/messages",
+                message=send_message,
+            )
+            print(
+                "📨 Отправили сообщение для",
+                vacancy["alternate_url"],
+            )
+            # Если отклик попадет в следующий запуск, не отвечаем повторно
+            state.last_author = "applicant"
+            self.store.save(state)
+        return True
+
+    def _iter_negotiations(self) -> Iterator[dict]:
+        # Отметка своя для резюме и фильтров: отклики, отброшенные одним
+        # запуском, могут понадобиться запуску с другими параметрами
+        self.high_water_mark_name = "negotiations:%s:%s" % (
+            self.resume_id,
+            "invitations" if self.only_invitations else "all",
+        )
+        self.high_water_mark = (
+            None
+            if self.full_sync
+            else self.store.get_high_water_mark(self.high_water_mark_name)
+        )
+        self.newest_updated_at: str | None = None
+        # Отклики, которые еще не обработаны полностью: id -> updated_at
+        self.unhandled: dict[str, str] = {}
+        self.listed_all = False
+        paginator = self._get_negotiations()
+        count = 0
+        for negotiation in paginator:
+            # Отклики отсортированы по дате изменения, остальные не менялись
+            # с прошлого запуска
+            if is_before(negotiation["updated_at"], self.high_water_mark):
+                paginator.stop()
+                self.listed_all = True
+                return
+            count += 1
+            if self.newest_updated_at is None:
+                self.newest_updated_at = negotiation["updated_at"]
+            self.unhandled[negotiation["id"]] = negotiation["updated_at"]
+            yield negotiation
+        # Упирались в --max-pages, не дойдя до отметки
+        self.listed_all = count >= (paginator.found or 0)
+
+    def _get_new_high_water_mark(self) -> str | None:
+        if not self.listed_all or self.newest_updated_at is None:
+            # Часть откликов не просмотрена, старая отметка остается
+            return None
+        # Необработанные отклики должны попасть в следующий запуск
+        mark = self.newest_updated_at
+        for updated_at in self.unhandled.values():
+            if is_before(updated_at, mark):
+                mark = updated_at
+        return mark
+
+    def _prepare_chat(self, negotiation: dict) -> PreparedChat | None:
+        # Выполняется в потоках загрузки: ничего не выводим, пока основной
+        # поток может ждать ввода
+        nid = negotiation["id"]
+        state_id = negotiation["state"]["id"]
+
+        if (
+            # Пропускаем другие резюме
+            self.resume_id != negotiation["resume"]["id"]
+            # Пропускаем отказ
+            or state_id == "discard"
+            or (self.only_invitations and not state_id.startswith("inv"))
+        ):
+            self.unhandled.pop(nid, None)
+            return None
+
+        logger.debug(negotiation)
+        employer = negotiation["vacancy"].get("employer") or {}
+
+        if employer.get("id") in self.blacklisted:
+            return PreparedChat(negotiation)
+
+        state = self.store.get(nid)
+        if state is None or state.is_changed(negotiation):
+            try:
+                state = self._sync_messages(negotiation)
+            except ApiError as ex:
+                return PreparedChat(negotiation, error=ex)
+            self.store.save(state)
+            return PreparedChat(negotiation, state, state.history)
+
+        logger.debug("Переписка не изменилась: %s", nid)
+        # Ссылки из старых сообщений уже собраны
+        return PreparedChat(negotiation, state)
+
+    def _sync_messages(self, negotiation: dict) -> NegotiationState:
+        nid = negotiation["id"]
+        page: int = 0
+        last_message: dict | None = None
+        message_history: list[str] = []
+        while True:
+            messages_res = self.api_client.get(
+                f"/negotiations/{nid}/messages", page=page
+            )
+
+            last_message = messages_res["items"][-1]
+            message_history.extend(
+                (
+                    "<-"
+                    if item["author"]["participant_type"] == "employer"
+                    else "->"
+                )
+                + " "
+                + item["text"]
+                for item in messages_res["items"]
+                if item.get("text")
+            )
+            if page + 1 >= messages_res["pages"]:
                 break
-            page += 1
 
-        return rv
+            page = messages_res["pages"] - 1
+
+        logger.debug(last_message)
+        return NegotiationState(
+            id=nid,
+            updated_at=negotiation["updated_at"],
+            messages_count=NegotiationState.get_messages_count(negotiation),
+            last_message_id=last_message.get("id"),
+            last_author=last_message["author"]["participant_type"],
+            history=(
+                message_history[:1] + ["..."] + message_history[-3:]
+                if len(message_history) > 5
+                else message_history
+            ),
+        )
+
+    def _get_negotiations(self) -> Paginator:
+        # Сначала недавно измененные, чтобы остановиться на отметке прошлого
+        # запуска
+        return Paginator(
+            self.api_client,
+            "/negotiations",
+            {"status": "active", "order_by": "updated_at", "order": "desc"},
+            max_pages=self.max_pages,
+        )
@@ -0,0 +1,140 @@
+"""Конвейер из стадий, соединенных ограниченными очередями
+
+У каждой стадии свое количество потоков. Медленная стадия заполняет свою
+входную очередь и притормаживает предыдущие, но не блокирует обработку уже
+прошедших ее элементов. Результаты последней стадии забирает вызывающий поток
+через итерацию по Pipeline.
+"""
+
+from __future__ import annotations
+
+import logging
+import queue
+from dataclasses import dataclass
+from threading import Event, Lock, Thread
+from typing import Any, Callable, Iterable, Iterator
+
+__all__ = ("Pipeline",)
+
+logger = logging.getLogger(__package__)
+
+# Маркер конца потока элементов
+_DONE = object()
+
+
+@dataclass
+class Stage:
+    name: str
+    # Возвращает обработанный элемент либо None, чтобы его отбросить
+    func: Callable[[Any], Any]
+    workers: int
+    input: queue.Queue
+    output: queue.Queue
+    running: int = 0
+
+    def __post_init__(self) -> None:
+        self.lock = Lock()
+
+
+class Pipeline:
+    def __init__(self, source: Iterable, maxsize: int = 100) -> None:
+        self.source = source
+        self.maxsize = maxsize
+        self.stages: list[Stage] = []
+        self.stopped = Event()
+        self.error: BaseException | None = None
+        self.threads: list[Thread] = []
+        self.head: queue.Queue = queue.Queue(maxsize)
+        self.tail = self.head
+
+    def add_stage(
+        self,
+        name: str,
+        func: Callable[[Any], Any],
+        workers: int = 1,
+        maxsize: int | None = None,
+    ) -> Pipeline:
+        output: queue.Queue = queue.Queue(maxsize or self.maxsize)
+        self.stages.append(Stage(name, func, max(1, workers), self.tail, output))
+        self.tail = output
+        return self
+
+    def stop(self) -> None:
+        """Останавливает все стадии, необработанные элементы отбрасываются."""
+        self.stopped.set()
+
+    def _put(self, q: queue.Queue, item: Any) -> bool:
+        while not self.stopped.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _get(self, q: queue.Queue) -> Any:
+        while not self.stopped.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        return _DONE
+
+    def _fail(self, ex: BaseException) -> None:
+        if self.error is None:
+            self.error = ex
+        self.stop()
+
+    def _produce(self) -> None:
+        try:
+            for item in self.source:
+                if not self._put(self.head, item):
+                    break
+        except BaseException as ex:
+            self._fail(ex)
+        finally:
+            self._put(self.head, _DONE)
+            # Закрываем генератор, чтобы он освободил свои ресурсы
+            if close := getattr(self.source, "close", None):
+                close()
+
+    def _work(self, stage: Stage) -> None:
+        try:
+            while (item := self._get(stage.input)) is not _DONE:
+                if (result := stage.func(item)) is not None:
+                    if not self._put(stage.output, result):
+                        break
+        except BaseException as ex:
+            logger.debug("stage %s failed", stage.name)
+            self._fail(ex)
+        finally:
+            # Соседним потокам стадии тоже нужно завершиться
+            self._put(stage.input, _DONE)
+            with stage.lock:
+                stage.running -= 1
+                last = stage.running == 0
+            if last:
+                self._put(stage.output, _DONE)
+
+    def _start(self) -> None:
+        self.threads.append(Thread(target=self._produce, name="source", daemon=True))
+        for stage in self.stages:
+            stage.running = stage.workers
+            self.threads.extend(
+                Thread(target=self._work, args=(stage,), name=stage.name, daemon=True)
+                for _ in range(stage.workers)
+            )
+        for thread in self.threads:
+            thread.start()
+
+    def __iter__(self) -> Iterator[Any]:
+        self._start()
+        try:
+            while (item := self._get(self.tail)) is not _DONE:
+                yield item
+        finally:
+            self.stop()
+            for thread in self.threads:
+                thread.join()
+        if self.error is not None:
+            raise self.error
@@ -0,0 +1,154 @@
+"""Суточный лимит откликов
+
+Лимит API не сообщает, поэтому он вычисляется по событиям LimitExceeded:
+сколько откликов было отправлено за последние сутки до получения ошибки.
+Лимитом считается наибольшее такое значение за последнюю неделю: одно
+заниженное (часть откликов отправлена не утилитой) перекрывается остальными,
+а уменьшение лимита становится известно, когда старые значения устареют.
+Остаток и время сброса сохраняются, так что следующий запуск по cron, пока
+лимит не сбросился, завершается сразу, не делая запросов.
+"""
+
+from __future__ import annotations
+
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from .ledger import Ledger
+from .storage import SQLiteStorage
+from .types import VacancyItem
+from .utils import parse_invalid_datetime
+
+__all__ = ("DAY", "Quota", "QuotaStore", "get_max_salary", "score_vacancy")
+
+logger = logging.getLogger(__package__)
+
+DAY = 86400
+
+# Лимит откликов hh.ru, пока не удалось вычислить настоящий
+DEFAULT_DAILY_LIMIT = 200
+# Сверх вычисленного лимита пробуем отправить еще несколько откликов: лимит
+# мог вырасти, а узнать об этом можно только получив LimitExceeded позже
+PROBE = 5
+# Сколько хранятся значения лимита, вычисленные при LimitExceeded
+OBSERVATION_TTL = 7 * DAY
+
+
+@dataclass
+class Quota:
+    daily_limit: int
+    # Отправлено откликов за последние сутки
+    used: int
+    # До этого времени отклики отправлять бессмысленно
+    reset_at: float | None
+
+    @property
+    def remaining(self) -> int:
+        return max(0, self.daily_limit + PROBE - self.used)
+
+    @property
+    def is_exhausted(self) -> bool:
+        if self.reset_at is not None and time.time() < self.reset_at:
+            return True
+        return self.remaining == 0
+
+
+class QuotaStore(SQLiteStorage):
+    schema = """
+    CREATE TABLE IF NOT EXISTS quota (
+        name TEXT PRIMARY KEY,
+        daily_limit INTEGER NOT NULL,
+        exhausted_at REAL,
+        reset_at REAL
+    );
+    CREATE TABLE IF NOT EXISTS quota_observations (
+        name TEXT NOT NULL,
+        observed_at REAL NOT NULL,
+        used INTEGER NOT NULL
+    );
+    """
+
+    def __init__(self, db_path, ledger: Ledger, name: str = "negotiations") -> None:
+        super().__init__(db_path)
+        self.ledger = ledger
+        self.name = name
+
+    def _get_row(self) -> tuple[int, float | None]:
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT daily_limit, reset_at FROM quota WHERE name = ?", (self.name,)
+            ).fetchone()
+        return tuple(row) if row else (DEFAULT_DAILY_LIMIT, None)
+
+    def get(self) -> Quota:
+        daily_limit, reset_at = self._get_row()
+        now = time.time()
+        if reset_at is not None and reset_at <= now:
+            reset_at = None
+        # Лимит общий для всех резюме аккаунта
+        used = self.ledger.count_applied_since(None, now - DAY)
+        if reset_at is None and used >= daily_limit + PROBE:
+            reset_at = (self.ledger.first_applied_since(now - DAY) or now) + DAY
+        return Quota(daily_limit, used, reset_at)
+
+    def exhausted(self) -> Quota:
+        """Запоминает лимит и время его сброса после LimitExceeded."""
+        now = time.time()
+        used = self.ledger.count_applied_since(None, now - DAY)
+        with self.lock:
+            # Без истории (например, отклики отправлялись не утилитой) лимит не
+            # вычислить
+            if used:
+                self.conn.execute(
+                    "INSERT INTO quota_observations VALUES (?, ?, ?)",
+                    (self.name, now, used),
+                )
+            self.conn.execute(
+                "DELETE FROM quota_observations WHERE observed_at < ?",
+                (now - OBSERVATION_TTL,),
+            )
+            (learned,) = self.conn.execute(
+                "SELECT MAX(used) FROM quota_observations WHERE name = ?",
+                (self.name,),
+            ).fetchone()
+        daily_limit = learned or self._get_row()[0]
+        # Первый из учтенных откликов освободит место через сутки после отправки
+        reset_at = (self.ledger.first_applied_since(now - DAY) or now) + DAY
+        logger.debug("quota exhausted: limit=%d, reset_at=%s", daily_limit, reset_at)
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO quota VALUES (?, ?, ?, ?)",
+                (self.name, daily_limit, now, reset_at),
+            )
+            self.conn.commit()
+        return Quota(daily_limit, used, reset_at)
+
+
+def score_vacancy(vacancy: VacancyItem, max_salary: float) -> float:
+    """Чем больше, тем раньше на вакансию стоит откликнуться."""
+    # Свежие вакансии работодатели еще просматривают
+    published_at = vacancy.get("published_at") or vacancy.get("created_at")
+    if published_at:
+        age = datetime.now(timezone.utc) - parse_invalid_datetime(published_at)
+        freshness = 1 / (1 + max(0.0, age.total_seconds()) / DAY)
+    else:
+        freshness = 0.0
+    salary = 0.0
+    if max_salary and (s := vacancy.get("salary")) and s.get("currency") == "RUR":
+        salary = (s.get("to") or s.get("from") or 0) / max_salary
+    # Шаблонное сопроводительное письмо там, где оно обязательно, работает хуже
+    letter_penalty = 0.25 if vacancy.get("response_letter_required") else 0.0
+    return freshness + salary - letter_penalty
+
+
+def get_max_salary(vacancies: list[VacancyItem]) -> float:
+    return max(
+        (
+            s.get("to") or s.get("from") or 0
+            for v in vacancies
+            if (s := v.get("salary")) and s.get("currency") == "RUR"
+        ),
+        default=0,
+    )
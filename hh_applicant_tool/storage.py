@@ -0,0 +1,52 @@
+"""Локальные SQLite-хранилища
+
+Все данные, которые должны переживать перезапуски (история откликов, кеши и
+тп), лежат рядом с config.json, поэтому в docker они сохраняются вместе с ним.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+from pathlib import Path
+from threading import Lock
+
+from .utils import Config
+
+__all__ = ("SQLiteStorage", "get_data_path", "get_spool_path")
+
+
+def get_data_path(config: Config) -> Path:
+    # Несколько конфигов в одном каталоге (fleet) не должны делить состояние
+    if config.path.name == "config.json":
+        return config.path.parent / "data.sqlite"
+    return config.path.with_name(f"{config.path.stem}.data.sqlite")
+
+
+def get_spool_path(config: Config) -> Path:
+    """Каталог неотправленной телеметрии аккаунта."""
+    if config.path.name == "config.json":
+        return config.path.parent / "telemetry_spool"
+    return config.path.with_name(f"{config.path.stem}.telemetry_spool")
+
+
+class SQLiteStorage:
+    # Выполняется при открытии, должна быть идемпотентной (IF NOT EXISTS)
+    schema: str = ""
+
+    def __init__(self, db_path: str | Path) -> None:
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(exist_ok=True, parents=True)
+        self.lock = Lock()
+        # Соединение используется из потоков конвейера, доступ через self.lock
+        self.conn = sqlite3.connect(
+            self.db_path, check_same_thread=False, timeout=30
+        )
+        self.conn.row_factory = sqlite3.Row
+        # Файл может одновременно использовать несколько процессов (cron)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        with self.lock:
+            self.conn.executescript(self.schema)
+
+    def close(self) -> None:
+        self.conn.close()
@@ -1,14 +1,16 @@
 from __future__ import annotations
 
+import gzip
 import json
 import logging
 import os
-import time
 import warnings
 from functools import partialmethod
 from typing import Any, Dict, Optional
 from urllib.parse import urljoin
 import requests
+
+from .api.rate_limit import RateLimiter
 from .utils import Config
 
 # Сертификат на сервере давно истек, но его обновлять мне лень...
@@ -20,7 +22,10 @@ logger = logging.getLogger(__package__)
 class TelemetryError(Exception):
     """Исключение, возникающее при ошибках в работе TelemetryClient."""
 
-    pass
+    def __init__(self, *args: Any, status_code: int | None = None) -> None:
+        super().__init__(*args)
+        # None — ответ не получен (таймаут, ошибка соединения)
+        self.status_code = status_code
 
 
 class TelemetryClient:
@@ -38,6 +43,7 @@ class TelemetryClient:
         user_agent: str = "Mozilla/5.0 (HHApplicantTelemetry/1.0)",
         proxies: dict | None = None,
         delay: Optional[float] = None,
+        rate_limiter: Optional[RateLimiter] = None,
     ) -> None:
         self.send_telemetry_id = telemetry_client_id
         self.server_address = os.getenv(
@@ -47,7 +53,9 @@ class TelemetryClient:
         self.user_agent = user_agent
         self.proxies = proxies
         self.delay = delay if delay is not None else self.default_delay
-        self.last_request_time = time.monotonic()  # Время последнего запроса
+        self.rate_limiter = rate_limiter or RateLimiter.from_delay(
+            self.delay, rules=()
+        )
 
     def request(
         self,
@@ -60,13 +68,7 @@ class TelemetryClient:
         url = urljoin(self.server_address, endpoint)
         has_body = method in ["POST", "PUT", "PATCH"]
 
-        # Вычисляем время, прошедшее с последнего запроса
-        current_time = time.monotonic()
-        time_since_last_request = current_time - self.last_request_time
-
-        # Если прошло меньше времени, чем задержка, ждем оставшееся время
-        if time_since_last_request < self.delay:
-            time.sleep(self.delay - time_since_last_request)
+        self.rate_limiter.acquire(method, url)
 
         try:
             response = self.session.request(
@@ -93,9 +95,42 @@ class TelemetryClient:
             json.JSONDecodeError,
         ) as ex:
             raise TelemetryError(str(ex)) from ex
-        finally:
-            # Обновляем время последнего запроса
-            self.last_request_time = time.monotonic()
+
+    def send_batch(
+        self, endpoint: str, data: Dict[str, Any], compress: bool = True
+    ) -> Dict[str, Any]:
+        """Отправляет пачку данных, при ответе не 2xx бросает исключение."""
+        url = urljoin(self.server_address, endpoint)
+        headers = {
+            "User-Agent": self.user_agent,
+            "X-Telemetry-Client-ID": self.send_telemetry_id,
+            "Content-Type": "application/json",
+        }
+        body = json.dumps(data, ensure_ascii=False).encode()
+        if compress:
+            headers["Content-Encoding"] = "gzip"
+            body = gzip.compress(body)
+        self.rate_limiter.acquire("POST", url)
+        try:
+            response = self.session.post(
+                url,
+                headers=headers,
+                proxies=self.proxies,
+                data=body,
+                verify=False,
+            )
+        except requests.exceptions.RequestException as ex:
+            raise TelemetryError(str(ex)) from ex
+        try:
+            result = response.json()
+        except json.JSONDecodeError as ex:
+            # Ошибки прокси и веб-сервера приходят не в JSON
+            result = response.text if response.status_code >= 300 else None
+            if result is None:
+                raise TelemetryError(str(ex)) from ex
+        if not 200 <= response.status_code < 300:
+            raise TelemetryError(result, status_code=response.status_code)
+        return result
 
     get_telemetry = partialmethod(request, "GET")
     send_telemetry = partialmethod(request, "POST")
@@ -0,0 +1,224 @@
+"""Фоновая отправка телеметрии пачками
+
+Записи добавляются по мере появления и отправляются отдельным потоком, когда
+набирается batch_size записей или проходит flush_interval секунд. Поток сразу
+дописывает каждую запись в файл текущей пачки в спуле, файл удаляется только
+после успешной отправки, так что при падении процесса или недоступности
+сервера записи будут отправлены при следующем запуске.
+
+Файлы спула:
+
+* ``*.open`` — пачка, которую сейчас наполняет поток;
+* ``*.jsonl`` — пачка, готовая к отправке;
+* ``*.sending`` — пачка, которую отправляет один из процессов.
+
+Переименование файла атомарно, поэтому одну пачку не отправят два процесса.
+Брошенные упавшими процессами ``*.open`` и ``*.sending`` снова становятся
+``*.jsonl``, когда давно не изменялись.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import queue
+import time
+import uuid
+from collections import defaultdict
+from pathlib import Path
+from threading import Event, Thread
+from typing import Any, TextIO
+
+from .telemetry_client import TelemetryClient, TelemetryError
+
+__all__ = ("TelemetryUploader",)
+
+logger = logging.getLogger(__package__)
+
+# Маркер завершения работы потока
+_CLOSE = object()
+
+OPEN_SUFFIX = ".open"
+READY_SUFFIX = ".jsonl"
+SENDING_SUFFIX = ".sending"
+
+
+def group_records(records: list[list]) -> dict[str, dict]:
+    payloads: dict[str, dict] = defaultdict(dict)
+    for endpoint, kind, key, value in records:
+        payload = payloads[endpoint]
+        if key is None:
+            payload.setdefault(kind, []).append(value)
+        else:
+            payload.setdefault(kind, {})[key] = value
+    return payloads
+
+
+def is_encoding_rejected(ex: TelemetryError) -> bool:
+    # Сервер явно не принимает сжатые данные, а не просто недоступен
+    return ex.status_code == 415 or (
+        ex.status_code == 400 and "content-encoding" in str(ex).lower()
+    )
+
+
+class TelemetryUploader:
+    def __init__(
+        self,
+        client: TelemetryClient,
+        spool_dir: str | Path,
+        *,
+        batch_size: int = 100,
+        flush_interval: float = 30.0,
+        max_queue: int = 10000,
+        compress: bool = True,
+    ) -> None:
+        self.client = client
+        self.spool_dir = Path(spool_dir)
+        self.spool_dir.mkdir(exist_ok=True, parents=True)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # Файл, не изменявшийся дольше, считается брошенным
+        self.stale_after = max(600.0, 3 * flush_interval)
+        self.compress = compress
+        self.queue: queue.Queue = queue.Queue(max_queue)
+        self.closed = Event()
+        self.sent = self.failed = 0
+        self.thread = Thread(target=self._run, name="telemetry", daemon=True)
+        self.thread.start()
+
+    def __enter__(self) -> TelemetryUploader:
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def add(self, endpoint: str, kind: str, value: Any, key: Any = None) -> None:
+        """Добавляет запись в очередь, никогда не блокирует вызывающий поток.
+
+        Записи с ключом отправляются как {kind: {key: value}}, без ключа — как
+        {kind: [value]}.
+        """
+        if self.closed.is_set():
+            return
+        try:
+            self.queue.put_nowait((endpoint, kind, key, value))
+        except queue.Full:
+            logger.warning("Очередь телеметрии переполнена, запись отброшена")
+
+    def close(self, timeout: float | None = 60.0) -> None:
+        """Отправляет оставшиеся записи и останавливает поток."""
+        if self.closed.is_set():
+            return
+        self.closed.set()
+        self.queue.put(_CLOSE)
+        self.thread.join(timeout)
+        logger.debug("telemetry: sent %d batches, failed %d", self.sent, self.failed)
+
+    def _run(self) -> None:
+        # Сначала то, что не удалось отправить в прошлый раз
+        self._replay()
+        batch_path: Path | None = None
+        fp: TextIO | None = None
+        count = 0
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                record = self.queue.get(
+                    timeout=max(0.0, deadline - time.monotonic())
+                )
+            except queue.Empty:
+                record = None
+            if record is not None and record is not _CLOSE:
+                if fp is None:
+                    batch_path = self.spool_dir / (
+                        f"{time.time_ns()}-{uuid.uuid4().hex}{OPEN_SUFFIX}"
+                    )
+                    fp = batch_path.open("a", encoding="utf-8")
+                fp.write(json.dumps(record, ensure_ascii=False) + "\n")
+                # Запись должна пережить падение процесса
+                fp.flush()
+                count += 1
+            elif fp is not None:
+                # Живая пачка не должна выглядеть брошенной
+                os.utime(batch_path)
+            if (
+                record is _CLOSE
+                or count >= self.batch_size
+                or time.monotonic() >= deadline
+            ):
+                if fp is not None:
+                    fp.close()
+                    ready = batch_path.with_suffix(READY_SUFFIX)
+                    os.replace(batch_path, ready)
+                    if self._send_file(ready):
+                        # Сервер снова доступен — досылаем старое
+                        self._replay()
+                    fp, count = None, 0
+                if record is _CLOSE:
+                    return
+                deadline = time.monotonic() + self.flush_interval
+
+    def _send_file(self, path: Path) -> bool:
+        """Отправляет пачку из спула, False — если сервер недоступен."""
+        sending = path.with_suffix(SENDING_SUFFIX)
+        try:
+            os.rename(path, sending)
+        except FileNotFoundError:
+            # Забрал другой процесс
+            return True
+        os.utime(sending)
+        records = []
+        with sending.open(encoding="utf-8") as fp:
+            for line in fp:
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    # Строка, недописанная при падении
+                    logger.warning("Поврежденная запись телеметрии в %s", path)
+        payloads = group_records(records)
+        for endpoint, payload in list(payloads.items()):
+            if not self._send(endpoint, payload):
+                # Неотправленное вернется в спул, отправленное второй раз не уйдет
+                with sending.open("w", encoding="utf-8") as fp:
+                    for record in records:
+                        if record[0] in payloads:
+                            fp.write(json.dumps(record, ensure_ascii=False) + "\n")
+                os.replace(sending, path)
+                return False
+            del payloads[endpoint]
+        sending.unlink(missing_ok=True)
+        return True
+
+    def _send(self, endpoint: str, payload: dict) -> bool:
+        try:
+            self.client.send_batch(endpoint, payload, compress=self.compress)
+        except TelemetryError as ex:
+            if not self.compress or not is_encoding_rejected(ex):
+                logger.debug("telemetry batch failed: %s", ex)
+                self.failed += 1
+                return False
+            logger.debug("compressed telemetry rejected, retry without gzip: %s", ex)
+            try:
+                self.client.send_batch(endpoint, payload, compress=False)
+            except TelemetryError as ex:
+                logger.debug("telemetry batch failed: %s", ex)
+                self.failed += 1
+                return False
+            self.compress = False
+        self.sent += 1
+        return True
+
+    def _replay(self) -> None:
+        now = time.time()
+        for suffix in (OPEN_SUFFIX, SENDING_SUFFIX):
+            for path in self.spool_dir.glob(f"*{suffix}"):
+                try:
+                    if now - path.stat().st_mtime > self.stale_after:
+                        os.rename(path, path.with_suffix(READY_SUFFIX))
+                except FileNotFoundError:
+                    pass
+        for path in sorted(self.spool_dir.glob(f"*{READY_SUFFIX}")):
+            if not self._send_file(path):
+                # Сервер недоступен, попробуем в следующий раз
+                return
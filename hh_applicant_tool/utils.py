@@ -2,16 +2,26 @@ from __future__ import annotations
 
 import hashlib
 import json
+import os
 import platform
 import random
 import re
 import sys
+import tempfile
+import time
+from contextlib import contextmanager
 from datetime import datetime
 from functools import partial
 from os import getenv
 from pathlib import Path
-from threading import Lock
-from typing import Any
+from threading import RLock
+from typing import Any, Iterator
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
 
 from .constants import INVALID_ISO8601_FORMAT
 from .jsonc import parse_jsonc
@@ -35,31 +45,112 @@ class AttrDict(dict):
     __delattr__ = dict.__delitem__
 
 
+@contextmanager
+def file_lock(path: Path, timeout: float = 30.0) -> Iterator[None]:
+    """Межпроцессная блокировка через отдельный lock-файл."""
+    path.parent.mkdir(exist_ok=True, parents=True)
+    with path.open("a+b") as fp:
+        if fcntl:
+            fcntl.flock(fp, fcntl.LOCK_EX)
+        else:
+            # msvcrt.locking сам ждет ~10 секунд, потом бросает OSError
+            deadline = time.monotonic() + timeout
+            while True:
+                try:
+                    fp.seek(0)
+                    msvcrt.locking(fp.fileno(), msvcrt.LK_NBLCK, 1)
+                    break
+                except OSError:
+                    if time.monotonic() > deadline:
+                        raise
+                    time.sleep(0.05)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(fp, fcntl.LOCK_UN)
+            else:
+                fp.seek(0)
+                msvcrt.locking(fp.fileno(), msvcrt.LK_UNLCK, 1)
+
+
 # TODO: добавить defaults
 class Config(dict):
+    """Конфиг, который безопасно сохранять из нескольких процессов.
+
+    Файл записывается атомарно через переименование временного файла, а при
+    сохранении перечитывается под блокировкой и обновляются только
+    переданные ключи. Так токен, обновленный одним процессом (например,
+    refresh-token по cron), не затирается другим.
+    """
+
     def __init__(self, config_path: str | Path | None = None):
         self._config_path = Path(config_path or get_config_path())
-        self._lock = Lock()
+        self._lock = RLock()
+        self._mtime_ns: int | None = None
         self.load()
 
+    @property
+    def path(self) -> Path:
+        return self._config_path
+
+    @property
+    def _lock_path(self) -> Path:
+        return self._config_path.with_name(self._config_path.name + ".lock")
+
+    def _read(self) -> tuple[dict, int | None]:
+        try:
+            with self._config_path.open("r", encoding="utf-8", errors="replace") as f:
+                mtime_ns = os.fstat(f.fileno()).st_mtime_ns
+                return json.load(f), mtime_ns
+        except FileNotFoundError:
+            return {}, None
+
     def load(self) -> None:
-        if self._config_path.exists():
-            with self._lock:
-                with self._config_path.open("r", encoding="utf-8", errors="replace") as f:
-                    self.update(json.load(f))
+        with self._lock:
+            data, self._mtime_ns = self._read()
+            self.update(data)
+
+    def reload(self) -> bool:
+        """Перечитывает файл, если его изменили после загрузки."""
+        try:
+            mtime_ns = self._config_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return False
+        if mtime_ns == self._mtime_ns:
+            return False
+        self.load()
+        return True
 
     def save(self, *args: Any, **kwargs: Any) -> None:
-        self.update(*args, **kwargs)
-        self._config_path.parent.mkdir(exist_ok=True, parents=True)
-        with self._lock:
-            with self._config_path.open("w+", encoding="utf-8", errors="replace") as fp:
-                json.dump(
-                    self,
-                    fp,
-                    ensure_ascii=True,
-                    indent=2,
-                    sort_keys=True,
-                )
+        changes = dict(*args, **kwargs)
+        with self._lock, file_lock(self._lock_path):
+            # Файл мог изменить другой процесс
+            data, _ = self._read()
+            data.update(changes)
+            fd, tmp = tempfile.mkstemp(
+                dir=self._config_path.parent, prefix=".config-", suffix=".tmp"
+            )
+            try:
+                # mkstemp создает файл с правами 0600, сохраняем прежние
+                if self._config_path.exists():
+                    os.chmod(tmp, self._config_path.stat().st_mode & 0o777)
+                with os.fdopen(fd, "w", encoding="utf-8") as fp:
+                    json.dump(
+                        data,
+                        fp,
+                        ensure_ascii=True,
+                        indent=2,
+                        sort_keys=True,
+                    )
+                    fp.flush()
+                    os.fsync(fp.fileno())
+                os.replace(tmp, self._config_path)
+            except BaseException:
+                Path(tmp).unlink(missing_ok=True)
+                raise
+            self._mtime_ns = self._config_path.stat().st_mtime_ns
+            self.update(data)
 
     __getitem__ = dict.get
 
@@ -0,0 +1,205 @@
+"""Фильтрация вакансий
+
+Описание фильтра (FilterSpec) один раз компилируется в VacancyMatcher: все
+исключающие слова объединяются в одно регулярное выражение для проверки
+отдельных вакансий, остальные условия — в список предикатов. Страница
+вакансий проверяется целиком: тексты всех вакансий склеиваются в одну строку,
+по которой идет поиск.
+
+Используется и утилитой (apply-similar), и ботом.
+"""
+
+from __future__ import annotations
+
+import re
+from bisect import bisect_right
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Callable, Iterable, Sequence
+
+from .types import VacancyItem
+
+__all__ = (
+    "AREA",
+    "ARCHIVED",
+    "EXCLUDED",
+    "FilterSpec",
+    "HAS_RELATIONS",
+    "HAS_TEST",
+    "SALARY",
+    "SCHEDULE",
+    "VacancyMatcher",
+)
+
+# Причины отказа. Первые три совпадают с результатами в ledger
+HAS_TEST = "has_test"
+ARCHIVED = "archived"
+HAS_RELATIONS = "has_relations"
+EXCLUDED = "excluded"
+SALARY = "salary"
+AREA = "area"
+SCHEDULE = "schedule"
+
+# Пока слов немного, несколько str.find по странице быстрее одной регулярки
+FIND_MAX_TERMS = 8
+
+# Не встречается в текстах вакансий, разделяет их при проверке страницы
+SEPARATOR = "\0"
+
+
+@dataclass(frozen=True)
+class FilterSpec:
+    # Вакансии, в названии или описании которых есть любое из слов (подстрок)
+    exclude_terms: tuple[str, ...] = ()
+    # Вакансии без зарплаты или в другой валюте проходят
+    salary_from: int | None = None
+    salary_currency: str = "RUR"
+    # ID регионов и графиков работы, None — любые
+    areas: frozenset[str] | None = None
+    schedules: frozenset[str] | None = None
+    skip_has_test: bool = False
+    skip_archived: bool = False
+    skip_relations: bool = False
+
+    @staticmethod
+    def split_terms(text: str | None) -> tuple[str, ...]:
+        return tuple(dict.fromkeys(t.lower() for t in (text or "").split()))
+
+    def compile(self) -> VacancyMatcher:
+        return compile_spec(self)
+
+
+def get_vacancy_text(vacancy: VacancyItem) -> str:
+    snippet = vacancy.get("snippet") or {}
+    return "\n".join(
+        filter(
+            None,
+            (
+                vacancy.get("name"),
+                snippet.get("requirement"),
+                snippet.get("responsibility"),
+            ),
+        )
+    )
+
+
+def get_id(vacancy: VacancyItem, field: str) -> str | None:
+    return (vacancy.get(field) or {}).get("id")
+
+
+def get_salary(vacancy: VacancyItem) -> tuple[int | None, str | None]:
+    salary = vacancy.get("salary") or {}
+    return salary.get("to") or salary.get("from"), salary.get("currency")
+
+
+@lru_cache(maxsize=1024)
+def compile_spec(spec: FilterSpec) -> VacancyMatcher:
+    # У бота фильтры пользователя создаются на каждое нажатие кнопки
+    return VacancyMatcher(spec)
+
+
+class VacancyMatcher:
+    def __init__(self, spec: FilterSpec) -> None:
+        self.spec = spec
+        self.terms = sorted(
+            {t.lower() for t in spec.exclude_terms if t}, key=len, reverse=True
+        )
+        self.exclude_re = (
+            re.compile("|".join(map(re.escape, self.terms))) if self.terms else None
+        )
+        # Порядок важен: причиной отказа считается первое сработавшее правило
+        self.rules: list[tuple[str, Callable[[VacancyItem], bool]]] = []
+        if spec.skip_has_test:
+            self.rules.append((HAS_TEST, lambda v: bool(v.get("has_test"))))
+        if spec.skip_archived:
+            self.rules.append((ARCHIVED, lambda v: bool(v.get("archived"))))
+        if spec.skip_relations:
+            self.rules.append((HAS_RELATIONS, lambda v: bool(v.get("relations"))))
+        if spec.salary_from:
+            self.rules.append((SALARY, self._is_low_salary))
+        # Если поля в ответе нет, вакансию не отбрасываем
+        if spec.areas is not None:
+            areas = {None, *spec.areas}
+            self.rules.append((AREA, lambda v: get_id(v, "area") not in areas))
+        if spec.schedules is not None:
+            schedules = {None, *spec.schedules}
+            self.rules.append(
+                (SCHEDULE, lambda v: get_id(v, "schedule") not in schedules)
+            )
+
+    def _is_low_salary(self, vacancy: VacancyItem) -> bool:
+        amount, currency = get_salary(vacancy)
+        return bool(
+            amount
+            and currency in (None, self.spec.salary_currency)
+            and amount < self.spec.salary_from
+        )
+
+    def reject_reason(self, vacancy: VacancyItem) -> str | None:
+        """Причина отказа либо None, если вакансия подходит."""
+        for reason, rule in self.rules:
+            if rule(vacancy):
+                return reason
+        if self.exclude_re and self.exclude_re.search(
+            get_vacancy_text(vacancy).lower()
+        ):
+            return EXCLUDED
+        return None
+
+    def match(self, vacancy: VacancyItem) -> bool:
+        return self.reject_reason(vacancy) is None
+
+    def evaluate_many(self, vacancies: Sequence[VacancyItem]) -> list[str | None]:
+        """reject_reason для целой страницы вакансий."""
+        reasons: list[str | None] = [None] * len(vacancies)
+        for i, vacancy in enumerate(vacancies):
+            for reason, rule in self.rules:
+                if rule(vacancy):
+                    reasons[i] = reason
+                    break
+        if self.terms:
+            pending = [i for i, reason in enumerate(reasons) if reason is None]
+            texts = [get_vacancy_text(vacancies[i]) for i in pending]
+            blob = SEPARATOR.join(texts).lower()
+            # lower() может изменить длину строки, тогда смещения поедут
+            if len(blob) != sum(map(len, texts)) + len(SEPARATOR) * (len(texts) - 1):
+                texts = [text.lower() for text in texts]
+                blob = SEPARATOR.join(texts)
+            starts, pos = [], 0
+            for text in texts:
+                starts.append(pos)
+                pos += len(text) + len(SEPARATOR)
+            for k in self._find_terms(blob, starts):
+                reasons[pending[k]] = EXCLUDED
+        return reasons
+
+    def _find_terms(self, blob: str, starts: list[int]) -> set[int]:
+        found = set()
+        if len(self.terms) > FIND_MAX_TERMS:
+            pos = 0
+            while m := self.exclude_re.search(blob, pos):
+                k = bisect_right(starts, m.start()) - 1
+                found.add(k)
+                # Остаток текста этой вакансии проверять незачем
+                if k + 1 == len(starts):
+                    break
+                pos = starts[k + 1]
+            return found
+        # Поиск подстроки идет в C, в Python — только переходы к следующей
+        # вакансии после совпадения
+        for term in self.terms:
+            pos = blob.find(term)
+            while pos != -1:
+                k = bisect_right(starts, pos) - 1
+                found.add(k)
+                if k + 1 == len(starts):
+                    break
+                pos = blob.find(term, starts[k + 1])
+        return found
+
+    def match_many(self, vacancies: Sequence[VacancyItem]) -> list[bool]:
+        return [reason is None for reason in self.evaluate_many(vacancies)]
+
+    def filter(self, vacancies: Iterable[VacancyItem]) -> list[VacancyItem]:
+        vacancies = list(vacancies)
+        return [v for v, ok in zip(vacancies, self.match_many(vacancies)) if ok]
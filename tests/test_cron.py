@@ -0,0 +1,83 @@
+from datetime import datetime
+
+import pytest
+
+from hh_applicant_tool.cron import CronError, CronExpression
+
+
+def test_step() -> None:
+    cron = CronExpression("*/15 * * * *")
+    assert cron.minutes == {0, 15, 30, 45}
+    assert cron.next_after(datetime(2024, 1, 1, 10, 7)) == datetime(2024, 1, 1, 10, 15)
+    assert cron.next_after(datetime(2024, 1, 1, 10, 45)) == datetime(2024, 1, 1, 11, 0)
+
+
+def test_weekday_names_range() -> None:
+    cron = CronExpression("0 9 * * mon-fri")
+    assert cron.weekdays == {1, 2, 3, 4, 5}
+    # 2024-01-05 — пятница, следующий запуск в понедельник
+    assert cron.next_after(datetime(2024, 1, 5, 9, 0)) == datetime(2024, 1, 8, 9, 0)
+
+
+def test_seven_is_sunday() -> None:
+    assert CronExpression("0 0 * * 7").weekdays == {0}
+    # 2024-01-07 — воскресенье
+    assert CronExpression("0 0 * * 7").next_after(
+        datetime(2024, 1, 3)
+    ) == datetime(2024, 1, 7)
+    assert CronExpression("0 0 * * sun").next_after(
+        datetime(2024, 1, 3)
+    ) == datetime(2024, 1, 7)
+
+
+def test_day_of_month_or_weekday() -> None:
+    # Ограничены оба поля: первое число месяца или любой понедельник
+    cron = CronExpression("0 0 1 * mon")
+    # 2024-01-01 — понедельник, следующий — 8-е
+    assert cron.next_after(datetime(2024, 1, 1)) == datetime(2024, 1, 8)
+    # После последнего понедельника января (29-е) — 1 февраля, четверг
+    assert cron.next_after(datetime(2024, 1, 29)) == datetime(2024, 2, 1)
+
+
+def test_day_of_month_and_any_weekday() -> None:
+    cron = CronExpression("30 12 15 * *")
+    assert cron.next_after(datetime(2024, 1, 15, 12, 30)) == datetime(
+        2024, 2, 15, 12, 30
+    )
+
+
+def test_month_rollover() -> None:
+    cron = CronExpression("0 0 31 * *")
+    # В феврале, апреле 31-го нет
+    assert cron.next_after(datetime(2024, 1, 31)) == datetime(2024, 3, 31)
+    assert cron.next_after(datetime(2024, 3, 31)) == datetime(2024, 5, 31)
+
+
+def test_year_rollover() -> None:
+    assert CronExpression("@yearly").next_after(
+        datetime(2024, 12, 31, 23, 59)
+    ) == datetime(2025, 1, 1)
+    assert CronExpression("59 23 * * *").next_after(
+        datetime(2024, 12, 31, 23, 59)
+    ) == datetime(2025, 1, 1, 23, 59)
+    assert CronExpression("0 0 29 feb *").next_after(
+        datetime(2024, 3, 1)
+    ) == datetime(2028, 2, 29)
+
+
+def test_never_matches() -> None:
+    assert CronExpression("0 0 30 2 *").next_after(datetime(2024, 1, 1)) is None
+
+
+def test_reboot() -> None:
+    cron = CronExpression("@reboot")
+    assert cron.reboot
+    assert cron.next_after(datetime(2024, 1, 1)) is None
+
+
+@pytest.mark.parametrize(
+    "expr", ["* * * *", "60 * * * *", "*/0 * * * *", "0 0 * * funday", "5-1 * * * *"]
+)
+def test_invalid(expr: str) -> None:
+    with pytest.raises(CronError):
+        CronExpression(expr)